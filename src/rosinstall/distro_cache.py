@@ -0,0 +1,348 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Persistent on-disk cache for the rosdistro index, distribution and
+distribution cache files, shared by rosinstall.locate and
+rosinstall.distro_locate.
+
+Cached files are used without contacting the server for a time to live
+(ROSINSTALL_CACHE_TTL seconds), after that they are revalidated using
+ETag / Last-Modified headers. When the server cannot be reached, or in
+offline mode (ROSINSTALL_OFFLINE=1), stale copies are used. The cache
+directory (ROSINSTALL_CACHE_DIR) is kept below
+ROSINSTALL_CACHE_MAX_SIZE bytes by removing the least recently used
+files.
+
+Parsed yaml documents are kept next to the responses as pickles, which
+preserve yaml types, and are used as long as the response they were
+parsed from did not change.
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import socket
+import hashlib
+import tempfile
+from io import BytesIO
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError, URLError
+    from urllib.parse import urlsplit
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError, URLError
+    from urlparse import urlsplit
+
+import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+import rosdistro
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_TIMEOUT = 30
+
+
+def get_default_cache_dir():
+    """
+    :returns: ROSINSTALL_CACHE_DIR, or rosinstall in the user cache dir
+    """
+    cache_dir = os.environ.get('ROSINSTALL_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'rosinstall')
+
+
+def _write_atomic(path, data):
+    """writes bytes to a temporary file and renames it to path"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fhand:
+            fhand.write(data)
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class UrlCache(object):
+    """
+    Caches the content of http(s) urls in a directory, other urls
+    (e.g. file://) are read directly.
+    """
+
+    def __init__(self, cache_dir=None, ttl=None, max_size=None,
+                 offline=None, timeout=DEFAULT_TIMEOUT):
+        """
+        :param cache_dir: directory for cached files, see get_default_cache_dir
+        :param ttl: seconds during which cached files are used without revalidation
+        :param max_size: maximum total size of the cache directory in bytes
+        :param offline: if True, never contact servers, use stale entries
+        :param timeout: socket timeout in seconds for downloads
+        """
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        if ttl is None:
+            ttl = float(os.environ.get('ROSINSTALL_CACHE_TTL', DEFAULT_TTL))
+        self.ttl = ttl
+        if max_size is None:
+            max_size = int(os.environ.get('ROSINSTALL_CACHE_MAX_SIZE',
+                                          DEFAULT_MAX_SIZE))
+        self.max_size = max_size
+        if offline is None:
+            offline = os.environ.get('ROSINSTALL_OFFLINE', '') not in ['', '0']
+        self.offline = offline
+        self.timeout = timeout
+
+    def _get_path(self, url, suffix):
+        key = hashlib.sha1(url.encode('UTF-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read_meta(self, url):
+        try:
+            with open(self._get_path(url, '.meta'), 'r') as fhand:
+                return json.load(fhand)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_meta(self, url, meta):
+        _write_atomic(self._get_path(url, '.meta'),
+                      json.dumps(meta).encode('UTF-8'))
+
+    def _read_data(self, url):
+        data_path = self._get_path(url, '.data')
+        with open(data_path, 'rb') as fhand:
+            data = fhand.read()
+        # mtime of data files is the last use, for eviction
+        os.utime(data_path, None)
+        return data
+
+    def load_url(self, url):
+        """
+        :returns: content of url as bytes
+        :raises IOError: if url cannot be loaded and is not cached
+        """
+        if not url.startswith('http://') and not url.startswith('https://'):
+            return urlopen(url, timeout=self.timeout).read()
+        meta = self._read_meta(url)
+        cached = (meta is not None and
+                  os.path.isfile(self._get_path(url, '.data')))
+        if cached and (self.offline or
+                       time.time() - meta.get('fetched', 0) < self.ttl):
+            return self._read_data(url)
+        if self.offline:
+            raise IOError('Offline mode and no cached copy of %s' % url)
+
+        request = Request(url)
+        if cached:
+            if meta.get('etag'):
+                request.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                request.add_header('If-Modified-Since', meta['last_modified'])
+        try:
+            response = urlopen(request, timeout=self.timeout)
+            data = response.read()
+            headers = response.info()
+        except HTTPError as http_error:
+            if cached and http_error.code == 304:
+                meta['fetched'] = time.time()
+                self._write_meta(url, meta)
+                return self._read_data(url)
+            if cached and http_error.code >= 500:
+                sys.stderr.write('Warning: %s for %s, using cached copy\n' %
+                                 (http_error, url))
+                return self._read_data(url)
+            raise
+        except (URLError, socket.error, socket.timeout) as url_error:
+            if cached:
+                sys.stderr.write('Warning: cannot reach %s (%s), using cached copy\n' %
+                                 (url, url_error))
+                return self._read_data(url)
+            raise
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        _write_atomic(self._get_path(url, '.data'), data)
+        self._write_meta(url, {'url': url,
+                               'etag': headers.get('ETag'),
+                               'last_modified': headers.get('Last-Modified'),
+                               'fetched': time.time()})
+        self.evict(keep=url)
+        return data
+
+    def _read_parsed(self, url, digest):
+        """:returns: pickled document of url parsed from digest, None if missing"""
+        try:
+            with open(self._get_path(url, '.pickle'), 'rb') as fhand:
+                parsed_digest, document = pickle.load(fhand)
+        except Exception:
+            # missing, truncated, or written by another python version
+            return None
+        if parsed_digest != digest:
+            return None
+        return document
+
+    def load_yaml(self, url):
+        """
+        Loads and parses a yaml file, a url whose path ends with .gz is
+        decompressed first. The parsed documents of http(s) urls are
+        cached until the response changes.
+        """
+        data = self.load_url(url)
+        cached = url.startswith('http://') or url.startswith('https://')
+        if cached:
+            digest = hashlib.sha1(data).hexdigest()
+            document = self._read_parsed(url, digest)
+            if document is not None:
+                return document
+        if urlsplit(url).path.endswith('.gz'):
+            data = gzip.GzipFile(fileobj=BytesIO(data), mode='rb').read()
+        document = yaml.load(data.decode('UTF-8'), Loader=SafeLoader)
+        if cached and os.path.isdir(self.cache_dir):
+            _write_atomic(self._get_path(url, '.pickle'),
+                          pickle.dumps((digest, document), pickle.HIGHEST_PROTOCOL))
+        return document
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used entries until the cache is below
+        max_size.
+
+        :param keep: url of an entry never to remove
+        """
+        keep_key = None
+        if keep is not None:
+            keep_key = os.path.basename(self._get_path(keep, ''))
+        entries = {}
+        for filename in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(filename)
+            # .json files are parsed documents of earlier versions
+            if ext not in ['.data', '.meta', '.pickle', '.json']:
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                size = os.path.getsize(path)
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            entry = entries.setdefault(key, [0, 0])
+            entry[0] += size
+            if ext == '.data':
+                entry[1] = mtime
+        total = sum([entry[0] for entry in entries.values()])
+        for key in sorted(entries.keys(), key=lambda k: entries[k][1]):
+            if total <= self.max_size:
+                break
+            if key == keep_key:
+                continue
+            for ext in ['.data', '.meta', '.pickle', '.json']:
+                path = os.path.join(self.cache_dir, key + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= entries[key][0]
+
+
+_URL_CACHE = None
+
+
+def get_url_cache():
+    """
+    :returns: the UrlCache instance shared within this process
+    """
+    global _URL_CACHE
+    if _URL_CACHE is None:
+        _URL_CACHE = UrlCache()
+    return _URL_CACHE
+
+
+def get_index(url):
+    """
+    Like rosdistro.get_index, but using the url cache
+    """
+    data = get_url_cache().load_yaml(url)
+    # like rosdistro, the query is passed on to the urls of the index
+    return rosdistro.Index(data, os.path.dirname(url),
+                           url_query=urlsplit(url).query)
+
+
+def get_distribution_cache(index, dist_name):
+    """
+    Like rosdistro.get_distribution_cache, but using the url cache
+    """
+    if dist_name not in index.distributions.keys():
+        raise RuntimeError("Unknown release: '%s'. Valid release names are: %s" %
+                           (dist_name, ', '.join(sorted(index.distributions.keys()))))
+    dist = index.distributions[dist_name]
+    if 'distribution_cache' not in dist.keys():
+        raise RuntimeError("Distribution has no cache: '%s'" % dist_name)
+    url = dist['distribution_cache']
+    path = urlsplit(url).path
+    if not path.endswith('.yaml') and not path.endswith('.yaml.gz'):
+        raise NotImplementedError(
+            'The url of the cache must end with either ".yaml" or ".yaml.gz"')
+    data = get_url_cache().load_yaml(url)
+    return rosdistro.DistributionCache(dist_name, data)
+
+
+def get_cached_distribution(index, dist_name):
+    """
+    Like rosdistro.get_cached_distribution, but using the url cache
+    """
+    cache = get_distribution_cache(index, dist_name)
+    return rosdistro.get_cached_distribution(index, dist_name, cache=cache)
+
+
+def get_distribution_file(index, dist_name):
+    """
+    Like rosdistro.get_distribution_file, but using the url cache
+    """
+    if dist_name not in index.distributions.keys():
+        raise RuntimeError("Unknown release: '%s'. Valid release names are: %s" %
+                           (dist_name, ', '.join(sorted(index.distributions.keys()))))
+    url = index.distributions[dist_name]['distribution']
+    if isinstance(url, list):
+        data = [get_url_cache().load_yaml(u) for u in url]
+    else:
+        data = get_url_cache().load_yaml(url)
+    return rosdistro.create_distribution_file(dist_name, data)
@@ -32,6 +32,10 @@
 
 # Author: kwc
 
+import os
+import threading
+from collections import OrderedDict
+
 import rosdistro
 from rosdistro.manifest_provider import get_release_tag
 from rospkg import distro as rospkg_distro
@@ -41,14 +45,72 @@ try:
 except ImportError:
     from urllib2 import urlopen
 
+from rosinstall import distro_cache
+from rosinstall.http_pool import fetch
+
 BRANCH_RELEASE = 'release'
 BRANCH_DEVEL = 'devel'
 
+# number of parsed rosdoc manifest.yaml files kept in memory
+MANIFEST_CACHE_SIZE = 256
+
+# parsed rosdoc manifest.yaml files by (distro, name), least recently used first
+_MANIFEST_CACHE = OrderedDict()
+_MANIFEST_CACHE_STATS = {'hits': 0, 'misses': 0}
+_MANIFEST_CACHE_LOCK = threading.Lock()
+
+
+# package/repository name to repository indexes, per loaded distro
+_REPO_INDEXES = {}
+
+# loaded rosdistro release files by distro name
+_RELEASE_FILES = {}
+
 
 class InvalidData(Exception):
     pass
 
 
+def _get_repo_index(key, distro, build):
+    """
+    Memoizes build(distro) under key, rebuilding it when another distro
+    object is passed for the same key.
+    """
+    cached = _REPO_INDEXES.get(key)
+    if cached is None or cached[0] is not distro:
+        cached = (distro, build(distro))
+        _REPO_INDEXES[key] = cached
+    return cached[1]
+
+
+def _build_wet_index(wet_distro):
+    """
+    :returns: dict mapping repository and package names to
+    (repo_name, repo_info), the first repository wins
+    """
+    index = {}
+    repos = wet_distro['repositories']
+    for repo in repos:
+        info = repos[repo]
+        index.setdefault(repo, (repo, info))
+        for pkg in info.get('packages', []):
+            index.setdefault(pkg, (repo, info))
+    return index
+
+
+def _build_release_index(release_file):
+    """
+    :returns: dict mapping package names to repository, the first
+    repository wins
+    """
+    index = {}
+    for r in release_file.repositories:
+        repo = release_file.repositories[r]
+        for pkg in repo.package_names:
+            index.setdefault(pkg, repo)
+    return index
+
+
 def build_rosinstall(repo_name, uri, vcs_type, version, prefix):
     """
     Build a rosinstall file given some basic information
@@ -69,12 +131,9 @@ def get_wet_info(wet_distro, name):
     """
     Get information about wet packages or stacks
     """
-    repos = wet_distro['repositories']
-    for repo in repos:
-        info = repos[repo]
-        if repo == name or name in info.get('packages', []):
-            return (repo, info)
-    return None
+    # only fuerte uses REP137 dict release files
+    index = _get_repo_index('fuerte', wet_distro, _build_wet_index)
+    return index.get(name)
 
 
 def get_dry_info(dry_distro, name):
@@ -125,17 +184,69 @@ def get_release_rosinstall(name, wet_distro, dry_distro, prefix):
     return None
 
 
-def get_manifest_yaml(name, distro):
+def _use_manifest_disk_cache():
+    return os.environ.get('ROSINSTALL_CACHE_MANIFESTS', '') not in ['', '0']
+
+
+def _load_manifest_yaml(name, distro):
     # If we didn't find the name, we need to try to find a stack for it
     url = 'http://ros.org/doc/%s/api/%s/manifest.yaml' % (distro, name)
     try:
-        return yaml.safe_load(urlopen(url))
+        if _use_manifest_disk_cache():
+            return distro_cache.get_url_cache().load_yaml(url)
+        return yaml.safe_load(fetch(url))
     except:
         raise IOError("Could not load a documentation manifest for %s-%s from ros.org\n\
 Have you selected a valid distro? Did you spell everything correctly? Is your package indexed on ros.org?\n\
 I'm looking here: %s for a yaml file." % (distro, name, url))
 
 
+def get_manifest_yaml(name, distro):
+    """
+    Loads the rosdoc manifest.yaml of name, each manifest is only
+    downloaded once per process (up to MANIFEST_CACHE_SIZE
+    manifests). With ROSINSTALL_CACHE_MANIFESTS=1, manifests are also
+    kept in the on-disk cache of rosinstall.distro_cache.
+
+    :returns: parsed manifest, shared between callers, do not modify
+    :raises IOError: if the manifest cannot be loaded
+    """
+    key = (distro, name)
+    with _MANIFEST_CACHE_LOCK:
+        if key in _MANIFEST_CACHE:
+            _MANIFEST_CACHE_STATS['hits'] += 1
+            manifest = _MANIFEST_CACHE.pop(key)
+            _MANIFEST_CACHE[key] = manifest
+            return manifest
+        _MANIFEST_CACHE_STATS['misses'] += 1
+    manifest = _load_manifest_yaml(name, distro)
+    with _MANIFEST_CACHE_LOCK:
+        _MANIFEST_CACHE[key] = manifest
+        while len(_MANIFEST_CACHE) > MANIFEST_CACHE_SIZE:
+            _MANIFEST_CACHE.popitem(last=False)
+    return manifest
+
+
+def get_manifest_yaml_cache_info():
+    """
+    :returns: dict with hits, misses, size and maxsize of the
+      get_manifest_yaml cache
+    """
+    with _MANIFEST_CACHE_LOCK:
+        return {'hits': _MANIFEST_CACHE_STATS['hits'],
+                'misses': _MANIFEST_CACHE_STATS['misses'],
+                'size': len(_MANIFEST_CACHE),
+                'maxsize': MANIFEST_CACHE_SIZE}
+
+
+def clear_manifest_yaml_cache():
+    """empties the get_manifest_yaml cache and resets its counters"""
+    with _MANIFEST_CACHE_LOCK:
+        _MANIFEST_CACHE.clear()
+        _MANIFEST_CACHE_STATS['hits'] = 0
+        _MANIFEST_CACHE_STATS['misses'] = 0
+
+
 def _get_fuerte_release():
     """
     Please delete me when fuerte is not supported anymore
@@ -196,16 +307,19 @@ def _get_electric_rosinstall(name, prefix=None):
 
 
 def _get_rosdistro_release(distro):
-    index = rosdistro.get_index(rosdistro.get_index_url())
-    return rosdistro.get_distribution_file(index, distro)
+    """
+    Loads the release file of distro once per process, so that the
+    repository index of _find_repo is built only once per distro.
+    """
+    if distro not in _RELEASE_FILES:
+        index = distro_cache.get_index(rosdistro.get_index_url())
+        _RELEASE_FILES[distro] = distro_cache.get_distribution_file(index, distro)
+    return _RELEASE_FILES[distro]
 
 
 def _find_repo(release_file, name):
-    for r in release_file.repositories:
-        repo = release_file.repositories[r]
-        if name in repo.package_names:
-            return repo
-    return None
+    index = _get_repo_index(release_file.name, release_file, _build_release_index)
+    return index.get(name)
 
 
 def _is_wet(release_file, name):
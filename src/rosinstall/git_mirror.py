@@ -0,0 +1,273 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Host level cache of bare git mirrors, shared by all workspaces of a
+host. Enabled by setting ROSINSTALL_GIT_MIRROR_DIR to a directory.
+
+Before git entries are checked out or updated, the mirror of each
+uri is created or refreshed once, then git is pointed at the mirror
+with a url.<mirror>.insteadOf setting in GIT_CONFIG_PARAMETERS, so
+clones are local (with hardlinked objects) while their origin remains
+the original uri. Mirrors are locked while they are refreshed, and the
+least recently used mirrors are removed when the directory grows above
+ROSINSTALL_GIT_MIRROR_MAX_SIZE bytes.
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import subprocess
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from rosinstall.parallel import iter_parallel
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+DEFAULT_JOBS = 8
+
+
+def get_default_mirror_dir():
+    """
+    :returns: ROSINSTALL_GIT_MIRROR_DIR, or None if mirroring is disabled
+    """
+    return os.environ.get('ROSINSTALL_GIT_MIRROR_DIR') or None
+
+
+def _get_dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _get_key(uri):
+    return hashlib.sha1(uri.encode('UTF-8')).hexdigest()
+
+
+def _sq_quote(value):
+    """quotes value as git does for GIT_CONFIG_PARAMETERS"""
+    return "'%s'" % value.replace("'", "'\\''")
+
+
+class MirrorCache(object):
+    """
+    Bare git mirrors in a directory, one per remote uri.
+    """
+
+    def __init__(self, mirror_dir, max_size=None):
+        """
+        :param mirror_dir: directory for mirrors, see get_default_mirror_dir
+        :param max_size: maximum total size of the mirrors in bytes
+        """
+        self.mirror_dir = mirror_dir
+        if max_size is None:
+            max_size = int(os.environ.get('ROSINSTALL_GIT_MIRROR_MAX_SIZE',
+                                          DEFAULT_MAX_SIZE))
+        self.max_size = max_size
+
+    def _get_path(self, key, suffix):
+        return os.path.join(self.mirror_dir, key + suffix)
+
+    def get_mirror_path(self, uri):
+        """:returns: path of the bare mirror of uri"""
+        return self._get_path(_get_key(uri), '.git')
+
+    @contextmanager
+    def _lock(self, key, blocking=True):
+        """
+        Holds an exclusive lock on the mirror, yields False if not
+        blocking and the mirror is locked by another process.
+        """
+        if fcntl is None:
+            yield True
+            return
+        with open(self._get_path(key, '.lock'), 'a') as fhand:
+            flags = fcntl.LOCK_EX
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            try:
+                fcntl.flock(fhand.fileno(), flags)
+            except (IOError, OSError):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fhand.fileno(), fcntl.LOCK_UN)
+
+    def update_mirror(self, uri):
+        """
+        Creates or refreshes the mirror of uri.
+
+        :returns: path of the mirror
+        :raises subprocess.CalledProcessError: if git fails
+        """
+        if not os.path.isdir(self.mirror_dir):
+            os.makedirs(self.mirror_dir)
+        key = _get_key(uri)
+        mirror_path = self._get_path(key, '.git')
+        with open(os.devnull, 'w') as devnull:
+            with self._lock(key):
+                if os.path.isdir(mirror_path):
+                    subprocess.check_call(['git', 'fetch', '-q', '--prune', 'origin'],
+                                          cwd=mirror_path, stdout=devnull)
+                else:
+                    # a partial clone of an interrupted run is never used
+                    tmp_path = self._get_path(key, '.tmp')
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    subprocess.check_call(['git', 'clone', '-q', '--mirror', uri, tmp_path],
+                                          stdout=devnull)
+                    os.rename(tmp_path, mirror_path)
+                # the stamp holds the size, its mtime is the last use
+                with open(self._get_path(key, '.stamp'), 'w') as fhand:
+                    fhand.write('%d\n' % _get_dir_size(mirror_path))
+        return mirror_path
+
+    def update_mirrors(self, uris, jobs=DEFAULT_JOBS):
+        """
+        Creates or refreshes the mirrors of uris, up to jobs at the
+        same time. Failures are reported on stderr, git then uses an
+        existing outdated mirror, or else the original uri.
+
+        :returns: dict of uri to mirror path for the mirrors available
+        """
+        mirrors = {}
+        for _, uri, mirror_path, error in iter_parallel(
+                self.update_mirror, sorted(set(uris)), jobs=jobs):
+            if error is None:
+                mirrors[uri] = mirror_path
+            elif os.path.isdir(self.get_mirror_path(uri)):
+                sys.stderr.write('Warning: cannot update mirror of %s, using outdated mirror: %s\n' %
+                                 (uri, error))
+                mirrors[uri] = self.get_mirror_path(uri)
+            else:
+                sys.stderr.write('Warning: cannot mirror %s: %s\n' % (uri, error))
+        self.evict(keep=list(mirrors.keys()))
+        return mirrors
+
+    def evict(self, keep=()):
+        """
+        Removes least recently used mirrors until the total size is
+        below max_size. Mirrors locked by other processes are skipped.
+
+        :param keep: uris of mirrors never to remove
+        """
+        keep_keys = set([_get_key(uri) for uri in keep])
+        entries = []
+        for filename in os.listdir(self.mirror_dir):
+            key, ext = os.path.splitext(filename)
+            if ext != '.stamp':
+                continue
+            path = os.path.join(self.mirror_dir, filename)
+            try:
+                with open(path, 'r') as fhand:
+                    size = int(fhand.read().strip() or 0)
+                entries.append((os.path.getmtime(path), key, size))
+            except (IOError, OSError, ValueError):
+                continue
+        total = sum([entry[2] for entry in entries])
+        for _, key, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            if key in keep_keys:
+                continue
+            with self._lock(key, blocking=False) as locked:
+                if not locked:
+                    continue
+                shutil.rmtree(self._get_path(key, '.git'), ignore_errors=True)
+                os.remove(self._get_path(key, '.stamp'))
+            total -= size
+
+    def get_git_config_parameters(self, mirrors, uris=()):
+        """
+        git applies insteadOf to every url starting with the value, the
+        longest match wins. Uris of uris without mirror that start with
+        a mirrored uri (like foo_msgs next to foo) are therefore mapped
+        to themselves.
+
+        :param mirrors: dict of uri to mirror path
+        :param uris: all uris in use
+        :returns: value for GIT_CONFIG_PARAMETERS redirecting the
+          uris to their mirrors
+        """
+        rewrites = dict(mirrors)
+        for uri in uris:
+            if uri not in mirrors and [mirrored for mirrored in mirrors
+                                       if uri.startswith(mirrored)]:
+                rewrites[uri] = uri
+        return ' '.join([_sq_quote('url.%s.insteadOf=%s' % (target, uri))
+                         for uri, target in sorted(rewrites.items())])
+
+
+def get_git_uris(path_specs):
+    """
+    :returns: uris of the git entries of path_specs
+    """
+    return [path_spec.get_uri() for path_spec in path_specs
+            if path_spec.get_scmtype() == 'git' and path_spec.get_uri()]
+
+
+@contextmanager
+def mirrored_git(uris, mirror_dir=None, jobs=DEFAULT_JOBS):
+    """
+    Refreshes the mirrors of uris and makes git commands started by
+    this process within the context fetch from them instead. Does
+    nothing if no mirror dir is given or configured.
+    """
+    if mirror_dir is None:
+        mirror_dir = get_default_mirror_dir()
+    if mirror_dir is None or not uris:
+        yield
+        return
+    cache = MirrorCache(mirror_dir)
+    parameters = cache.get_git_config_parameters(cache.update_mirrors(uris, jobs=jobs),
+                                                 uris)
+    old_parameters = os.environ.get('GIT_CONFIG_PARAMETERS')
+    if parameters:
+        os.environ['GIT_CONFIG_PARAMETERS'] = ' '.join(
+            [value for value in [old_parameters, parameters] if value])
+    try:
+        yield
+    finally:
+        if old_parameters is None:
+            os.environ.pop('GIT_CONFIG_PARAMETERS', None)
+        else:
+            os.environ['GIT_CONFIG_PARAMETERS'] = old_parameters
@@ -0,0 +1,167 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Reads the revision checked out in a git working copy directly from
+the .git metadata, without running git. Only loose refs and
+packed-refs are understood, callers fall back to the git client when
+None is returned.
+"""
+
+import os
+import re
+
+_SHA_RE = re.compile(r'^[0-9a-f]{40}([0-9a-f]{24})?$')
+# symbolic refs pointing to symbolic refs, followed at most this deep
+_MAX_REF_DEPTH = 5
+
+
+def _read_first_line(path):
+    try:
+        with open(path, 'r') as fhand:
+            return fhand.readline().strip()
+    except (IOError, OSError):
+        return None
+
+
+def get_git_dir(path):
+    """
+    :returns: the git directory of the working copy at path, following
+      '.git' files of worktrees and submodules, or None
+    """
+    dot_git = os.path.join(path, '.git')
+    if os.path.isdir(dot_git):
+        return dot_git
+    line = _read_first_line(dot_git)
+    if line is not None and line.startswith('gitdir:'):
+        git_dir = line[len('gitdir:'):].strip()
+        git_dir = os.path.normpath(os.path.join(path, git_dir))
+        if os.path.isdir(git_dir):
+            return git_dir
+    return None
+
+
+def get_git_common_dir(git_dir):
+    """
+    :returns: the directory holding the refs shared by all worktrees
+      of the repository of git_dir
+    """
+    line = _read_first_line(os.path.join(git_dir, 'commondir'))
+    if line:
+        return os.path.normpath(os.path.join(git_dir, line))
+    return git_dir
+
+
+def _read_packed_ref(common_dir, refname):
+    try:
+        with open(os.path.join(common_dir, 'packed-refs'), 'r') as fhand:
+            for line in fhand:
+                if line.startswith('#') or line.startswith('^'):
+                    continue
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == refname:
+                    return parts[0]
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def resolve_ref(git_dir, refname):
+    """
+    Resolves a ref name like 'HEAD' or 'refs/heads/master' to a commit
+    sha, following symbolic refs.
+
+    :returns: sha as str, or None if the ref cannot be resolved from
+      loose refs and packed-refs
+    """
+    common_dir = get_git_common_dir(git_dir)
+    if os.path.isdir(os.path.join(common_dir, 'reftable')):
+        return None
+    for _ in range(_MAX_REF_DEPTH):
+        value = None
+        # per worktree refs (HEAD) are in git_dir, others in common_dir
+        for ref_dir in [git_dir, common_dir]:
+            value = _read_first_line(os.path.join(ref_dir, refname))
+            if value:
+                break
+        if not value:
+            value = _read_packed_ref(common_dir, refname)
+        if not value:
+            return None
+        if value.startswith('ref:'):
+            refname = value[len('ref:'):].strip()
+            continue
+        if _SHA_RE.match(value):
+            return value
+        return None
+    return None
+
+
+def get_head_revision(path):
+    """
+    :returns: sha of the commit checked out in the git working copy at
+      path, or None if it cannot be read from the metadata
+    """
+    git_dir = get_git_dir(path)
+    if git_dir is None:
+        return None
+    return resolve_ref(git_dir, 'HEAD')
+
+
+def is_sha(version):
+    """:returns: True if version is a full commit sha"""
+    return version is not None and _SHA_RE.match(version) is not None
+
+
+def get_remote_url(path, remote='origin'):
+    """
+    :returns: the url of remote in the git config of the working copy
+      at path, or None
+    """
+    git_dir = get_git_dir(path)
+    if git_dir is None:
+        return None
+    section = '[remote "%s"]' % remote
+    in_section = False
+    try:
+        with open(os.path.join(get_git_common_dir(git_dir), 'config'), 'r') as fhand:
+            for line in fhand:
+                line = line.strip()
+                if line.startswith('['):
+                    in_section = line == section
+                elif in_section and '=' in line:
+                    key, value = line.split('=', 1)
+                    if key.strip().lower() == 'url':
+                        return value.strip()
+    except (IOError, OSError):
+        pass
+    return None
@@ -31,18 +31,140 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import re
 import sys
+import glob
 import codecs
+import shutil
+import tempfile
 import subprocess
 from wstool.config_elements import SetupConfigElement
 
 ROSINSTALL_FILENAME = ".rosinstall"
+# directory in the workspace for caches and other files of rosinstall
+WORKSPACE_STATE_DIRNAME = ".rosinstall_state"
+# directory in the state directory for deleted working copies to be removed
+TRASH_DIRNAME = "trash"
+# removes the paths given as arguments, used by reap_trash
+_REAP_SCRIPT = """
+import os, shutil, sys
+for path in sys.argv[1:]:
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.remove(path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+"""
+
+# ROS_ROOT detected from env.sh files, by (env.sh path, mtimes)
+_ROS_ROOTS = {}
+
+_ROS_ROOT_ASSIGNMENT = re.compile(r'^\s*(?:export\s+)?ROS_ROOT=(.*)$')
 
 
 class ROSInstallException(Exception):
     pass
 
 
+def get_workspace_state_path(base_path, *names):
+    """
+    :returns: path of a file in the rosinstall state directory of
+      the workspace at base_path
+    """
+    return os.path.join(base_path, WORKSPACE_STATE_DIRNAME, *names)
+
+
+def write_if_changed(path, content, backup_path=None):
+    """
+    Writes content to path unless the file already has this content.
+    Writes to a temporary file which is renamed to path, so readers
+    never see a partial file.
+
+    :param content: str
+    :param backup_path: if given, the previous file is kept there as a
+      hardlink (or a copy where hardlinks are not supported)
+    :returns: True if the file was written
+    """
+    if os.path.isfile(path):
+        with open(path, 'r') as fhand:
+            if fhand.read() == content:
+                return False
+        mode = os.stat(path).st_mode & 0o7777
+        if backup_path is not None:
+            if os.path.lexists(backup_path):
+                os.remove(backup_path)
+            try:
+                os.link(path, backup_path)
+            except OSError:
+                shutil.copy2(path, backup_path)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as fhand:
+            fhand.write(content)
+        os.chmod(tmp_path, mode)
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def move_to_trash(base_path, path):
+    """
+    Renames path into the trash directory of the workspace at
+    base_path, so that it can be removed later with reap_trash.
+
+    :returns: True if path was moved, False if it could not be renamed
+      (e.g. because it is on another file system)
+    """
+    trash_path = get_workspace_state_path(base_path, TRASH_DIRNAME)
+    if not os.path.isdir(trash_path):
+        os.makedirs(trash_path)
+    basename = os.path.basename(os.path.normpath(path))
+    count = 0
+    while True:
+        target = os.path.join(trash_path, '%s.%d.%d' % (basename, os.getpid(), count))
+        if not os.path.lexists(target):
+            break
+        count += 1
+    try:
+        os.rename(path, target)
+    except OSError:
+        return False
+    return True
+
+
+def reap_trash(base_path, background=False):
+    """
+    Removes the contents of the trash directory of the workspace.
+
+    :param background: remove them in a detached process and return
+      immediately
+    """
+    trash_path = get_workspace_state_path(base_path, TRASH_DIRNAME)
+    if not os.path.isdir(trash_path):
+        return
+    paths = [os.path.join(trash_path, name) for name in os.listdir(trash_path)]
+    if not paths:
+        return
+    if background:
+        with open(os.devnull, 'r+') as devnull:
+            subprocess.Popen([sys.executable, '-c', _REAP_SCRIPT] + paths,
+                             stdin=devnull, stdout=devnull, stderr=devnull,
+                             close_fds=True, preexec_fn=os.setsid)
+    else:
+        for path in paths:
+            if os.path.islink(path) or not os.path.isdir(path):
+                os.remove(path)
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+
+
 def is_path_stack(path):
     """
 
@@ -70,27 +192,105 @@ def is_path_ros(path):
     return False
 
 
-def get_ros_root_from_setupfile(path):
-    """ Return the ROS_ROOT if the path is a setup.sh file with an
-    env.sh next to it which sets the ROS_ROOT
-
-    :returns: path to ROS_ROOT or None
+def _get_env_sh(path):
+    """
+    :returns: the env.sh next to path if path is a setup.sh file, else None
     """
-    # For groovy, we rely on setup.sh setting ROS_ROOT, as no more
-    # rosbuild stack 'ros' exists
     dirpath, basename = os.path.split(path)
     if basename != 'setup.sh':
         return None
-
     # env.sh exists since fuerte
     setupfilename = os.path.join(dirpath, 'env.sh')
     if not os.path.isfile(setupfilename):
         return None
+    return setupfilename
+
+
+def _parse_ros_root(path):
+    """
+    Reads ROS_ROOT from plain assignments in the setup.sh, env.sh and
+    catkin environment hooks next to path, without running them.
+
+    :returns: ROS_ROOT, None if not set by a plain assignment to an
+      absolute path, or if there are several different assignments
+    """
+    dirpath = os.path.dirname(path)
+    filenames = [os.path.join(dirpath, 'env.sh'), path]
+    filenames.extend(sorted(glob.glob(os.path.join(dirpath, 'etc', 'catkin', 'profile.d', '*.sh'))))
+    values = set()
+    for filename in filenames:
+        try:
+            with open(filename, 'r') as fhand:
+                lines = fhand.readlines()
+        except (IOError, OSError):
+            return None
+        for line in lines:
+            match = _ROS_ROOT_ASSIGNMENT.match(line)
+            if match is None:
+                continue
+            value = match.group(1).strip().strip('"\'')
+            # anything computed needs a shell
+            if not value or not os.path.isabs(value) or \
+                    [c for c in '$`;&|() ' if c in value]:
+                return None
+            values.add(value)
+    if len(values) == 1:
+        return values.pop()
+    return None
+
+
+def _get_setupfile_key(env_sh, path):
+    """:returns: cache key of the files, None if one is missing"""
+    try:
+        return (env_sh, os.path.getmtime(env_sh), os.path.getmtime(path))
+    except OSError:
+        return None
+
 
-    cmd = "%s sh -c 'echo $ROS_ROOT'" % setupfilename
-    local_env = os.environ
-    if 'ROS_ROOT' in local_env:
-        local_env.pop('ROS_ROOT')
+def shell_quote(arg):
+    """:returns: arg quoted for use in sh scripts"""
+    return "'%s'" % arg.replace("'", "'\\''")
+
+
+def get_ros_roots_from_setupfiles(paths):
+    """ Return the ROS_ROOT for each path that is a setup.sh file with
+    an env.sh next to it which sets the ROS_ROOT.
+
+    ROS_ROOT is taken from plain assignments in the setup files when
+    possible, all other env.sh files are evaluated in a single shell
+    invocation. Results are cached until the files change.
+
+    :param paths: list of paths
+    :returns: dict path -> ROS_ROOT or None
+    """
+    result = {}
+    pending = []
+    for path in paths:
+        result[path] = None
+        # For groovy, we rely on setup.sh setting ROS_ROOT, as no more
+        # rosbuild stack 'ros' exists
+        env_sh = _get_env_sh(path)
+        if env_sh is None:
+            continue
+        key = _get_setupfile_key(env_sh, path)
+        if key is None or key not in _ROS_ROOTS:
+            ros_root = _parse_ros_root(path)
+            if ros_root is None:
+                pending.append((path, env_sh, key))
+                continue
+            if key is not None:
+                _ROS_ROOTS[key] = ros_root
+            result[path] = ros_root
+            continue
+        result[path] = _ROS_ROOTS[key]
+    if not pending:
+        return result
+
+    # one line per env.sh on fd 3, other output of setup files is dropped
+    cmd = ' '.join(["{ %s sh -c 'echo \"$ROS_ROOT\" >&3' || echo >&3; } 3>&1 >/dev/null;" %
+                    shell_quote(env_sh) for _, env_sh, _ in pending])
+    local_env = dict(os.environ)
+    local_env.pop('ROS_ROOT', None)
     process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                                env=local_env, shell=True)
     out = process.communicate()[0]
@@ -98,7 +298,23 @@ def get_ros_root_from_setupfile(path):
         out_str = codecs.unicode_escape_decode(out)[0]
     else:
         out_str = out.decode('utf-8')
-    return out_str.strip()
+    lines = out_str.splitlines()
+    for index, (path, _, key) in enumerate(pending):
+        ros_root = lines[index].strip() if index < len(lines) else ''
+        # files which are missing are evaluated again next time
+        if key is not None:
+            _ROS_ROOTS[key] = ros_root
+        result[path] = ros_root
+    return result
+
+
+def get_ros_root_from_setupfile(path):
+    """ Return the ROS_ROOT if the path is a setup.sh file with an
+    env.sh next to it which sets the ROS_ROOT
+
+    :returns: path to ROS_ROOT or None
+    """
+    return get_ros_roots_from_setupfiles([path])[path]
 
 
 def get_ros_stack_path(config):
@@ -106,13 +322,18 @@ def get_ros_stack_path(config):
     # need to track actual path, realpath, and source
     found_paths = set()
     sources = {}
+    setupfiles = [tree_el.get_local_name()
+                  for tree_el in config.get_config_elements()
+                  if isinstance(tree_el, SetupConfigElement) and
+                  not is_path_ros(tree_el.get_path())]
+    ros_roots = get_ros_roots_from_setupfiles(setupfiles)
     for tree_el in config.get_config_elements():
         el_path = tree_el.get_path()
         if is_path_ros(el_path):
             found_paths.add(os.path.realpath(el_path))
             sources[el_path] = el_path
         elif isinstance(tree_el, SetupConfigElement):
-            ros_root = get_ros_root_from_setupfile(tree_el.get_local_name())
+            ros_root = ros_roots[tree_el.get_local_name()]
             if ros_root:
                 found_paths.add(os.path.realpath(ros_root))
                 sources[tree_el.get_local_name()] = ros_root
@@ -0,0 +1,214 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Small keep-alive HTTP(S) connection pool for the many short GET
+requests made when looking up resources on ros.org, so consecutive
+lookups to the same host reuse TCP and TLS connections.
+
+Like urlopen, requests go through the proxies configured in
+http_proxy/https_proxy unless no_proxy excludes the host.
+"""
+
+import base64
+import socket
+import threading
+try:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.error import HTTPError, URLError
+    from urllib.parse import urljoin, urlsplit, unquote
+    from urllib.request import getproxies, proxy_bypass
+except ImportError:
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib2 import HTTPError, URLError
+    from urlparse import urljoin, urlsplit
+    from urllib import getproxies, proxy_bypass, unquote
+
+DEFAULT_TIMEOUT = 15
+MAX_REDIRECTS = 5
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+def _get_proxy(scheme, netloc):
+    """
+    :returns: (proxy netloc, headers for the proxy) for requests to
+      netloc, or None if the host is reached directly
+    """
+    proxy = getproxies().get(scheme)
+    if not proxy or proxy_bypass(netloc.rsplit(':', 1)[0]):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    parts = urlsplit(proxy)
+    proxy_netloc = parts.hostname
+    if parts.port:
+        proxy_netloc = '%s:%s' % (proxy_netloc, parts.port)
+    headers = {}
+    if parts.username is not None:
+        credentials = '%s:%s' % (unquote(parts.username), unquote(parts.password or ''))
+        headers['Proxy-Authorization'] = 'Basic %s' % base64.b64encode(
+            credentials.encode('UTF-8')).decode('ascii')
+    return proxy_netloc, headers
+
+
+def _get_pool_key(scheme, netloc, proxy):
+    """connections are only shared between requests using the same proxy"""
+    return (scheme, netloc, proxy[0] if proxy is not None else None)
+
+
+class ConnectionPool(object):
+    """
+    Keeps up to max_idle idle connections per host. Thread safe, a
+    connection is only used by one thread at a time.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_idle=4):
+        """
+        :param timeout: default timeout in seconds per request
+        :param max_idle: number of idle connections kept per host
+        """
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, netloc, timeout, proxy):
+        """:returns: (connection, True if connection was used before)"""
+        with self._lock:
+            connections = self._idle.get(_get_pool_key(scheme, netloc, proxy))
+            if connections:
+                return connections.pop(), True
+        if proxy is None:
+            if scheme == 'https':
+                return HTTPSConnection(netloc, timeout=timeout), False
+            return HTTPConnection(netloc, timeout=timeout), False
+        proxy_netloc, proxy_headers = proxy
+        if scheme == 'https':
+            # TLS to the server through a CONNECT tunnel
+            connection = HTTPSConnection(proxy_netloc, timeout=timeout)
+            connection.set_tunnel(netloc, headers=proxy_headers)
+            return connection, False
+        return HTTPConnection(proxy_netloc, timeout=timeout), False
+
+    def _release(self, scheme, netloc, proxy, connection):
+        with self._lock:
+            connections = self._idle.setdefault(_get_pool_key(scheme, netloc, proxy), [])
+            if len(connections) < self.max_idle:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """closes all idle connections"""
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request(self, scheme, netloc, path, timeout, headers):
+        """:returns: (status, reason, headers, body)"""
+        proxy = _get_proxy(scheme, netloc)
+        if proxy is not None and scheme == 'http':
+            # plain http proxies take the absolute uri
+            path = 'http://%s%s' % (netloc, path)
+            headers = dict(headers)
+            headers.update(proxy[1])
+        while True:
+            connection, reused = self._acquire(scheme, netloc, timeout, proxy)
+            connection.timeout = timeout
+            try:
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (HTTPException, socket.error) as exc:
+                connection.close()
+                # servers may close idle keep-alive connections at any
+                # time, retry those once on a fresh connection
+                if reused and not isinstance(exc, socket.timeout):
+                    continue
+                raise URLError(exc)
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(scheme, netloc, proxy, connection)
+            return response.status, response.reason, response.msg, body
+
+    def get(self, url, timeout=None, headers=None):
+        """
+        GET url, following redirects.
+
+        :param timeout: timeout in seconds, defaults to self.timeout
+        :param headers: dict of additional request headers
+        :returns: response body (bytes)
+        :raises: HTTPError for responses other than 200, URLError for
+          connection problems
+        """
+        if timeout is None:
+            timeout = self.timeout
+        for _ in range(MAX_REDIRECTS + 1):
+            scheme, netloc, path, query, _ = urlsplit(url)
+            if scheme not in ['http', 'https']:
+                raise URLError('Unsupported url scheme: %s' % url)
+            if query:
+                path = '%s?%s' % (path, query)
+            status, reason, response_headers, body = self._request(
+                scheme, netloc, path or '/', timeout, headers or {})
+            location = response_headers.get('location')
+            if status in _REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                continue
+            if status != 200:
+                raise HTTPError(url, status, reason, response_headers, None)
+            return body
+        raise URLError('Too many redirects: %s' % url)
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_connection_pool():
+    """:returns: the ConnectionPool shared in this process"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool()
+        return _POOL
+
+
+def fetch(url, timeout=None):
+    """GET url using the shared connection pool, see ConnectionPool.get"""
+    return get_connection_pool().get(url, timeout=timeout)
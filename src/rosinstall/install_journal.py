@@ -0,0 +1,138 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Journal of the entries an install or update completed, stored in the
+workspace state directory. Each completed entry is recorded with the
+fingerprint of its spec as soon as it is done, so that an interrupted
+run can be continued with --resume, skipping the entries which were
+completed and did not change in the config since.
+
+With -j, entries are installed in separate processes, so the journal
+is a file of json lines to which each process appends, rather than a
+file rewritten by each process.
+"""
+
+import os
+import json
+from contextlib import contextmanager
+
+from rosinstall.helpers import get_workspace_state_path
+
+INSTALL_JOURNAL_FILENAME = 'install_journal.jsonl'
+
+
+def _get_fingerprint(element):
+    """:returns: json compatible fingerprint of the spec of element"""
+    spec = element.get_path_spec()
+    return [spec.get_scmtype(), spec.get_uri(), spec.get_version(),
+            element.get_path()]
+
+
+class InstallJournal(object):
+    """
+    file of json lines [localname, fingerprint] of completed entries
+    """
+
+    def __init__(self, base_path):
+        self.path = get_workspace_state_path(base_path, INSTALL_JOURNAL_FILENAME)
+        self.entries = {}
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as fhand:
+                for line in fhand:
+                    try:
+                        localname, fingerprint = json.loads(line)
+                    except ValueError:
+                        # last line of an interrupted write
+                        continue
+                    self.entries[localname] = fingerprint
+
+    def is_done(self, element):
+        """:returns: True if element was completed with its current spec"""
+        return self.entries.get(element.get_local_name()) == _get_fingerprint(element)
+
+    def mark_done(self, element):
+        """appends element as completed to the journal"""
+        self.entries[element.get_local_name()] = _get_fingerprint(element)
+        line = json.dumps([element.get_local_name(), _get_fingerprint(element)]) + '\n'
+        # a single small write in append mode does not interleave
+        with open(self.path, 'a') as fhand:
+            fhand.write(line)
+
+    def reset(self):
+        """starts an empty journal"""
+        self.entries = {}
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w'):
+            pass
+
+
+@contextmanager
+def journaled_install(config, resume=False):
+    """
+    Records each element of config that installs successfully within
+    the context in the workspace install journal. Without resume, the
+    journal of a previous run is discarded, with resume the elements it
+    lists as completed with an unchanged spec are not installed again.
+
+    :returns: the InstallJournal
+    """
+    journal = InstallJournal(config.get_base_path())
+    if not resume:
+        journal.reset()
+    originals = []
+    for element in config.get_config_elements():
+        originals.append((element, element.__dict__.get('install')))
+        element.install = _get_journaled_install(journal, element, resume)
+    try:
+        yield journal
+    finally:
+        for element, install in originals:
+            if install is None:
+                del element.install
+            else:
+                element.install = install
+
+
+def _get_journaled_install(journal, element, resume):
+    install = element.install
+
+    def _install(*args, **kwargs):
+        if resume and journal.is_done(element):
+            print("Skipping %s, completed by a previous run" %
+                  element.get_local_name())
+            return None
+        result = install(*args, **kwargs)
+        journal.mark_done(element)
+        return result
+    return _install
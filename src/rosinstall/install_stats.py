@@ -0,0 +1,189 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Durations of the checkouts and updates of workspace entries, stored in
+the workspace state directory, used to schedule parallel installs. The
+entries expected to take longest are started first, so that a large
+repository does not start last and keep the whole run waiting for it
+alone, and the expected duration of the run is printed.
+
+As with the install journal, -j installs run in separate processes
+which append their durations as json lines, the file is compacted to
+one line per entry after the run.
+"""
+
+from __future__ import print_function
+
+import os
+import json
+import time
+import heapq
+from contextlib import contextmanager
+
+from wstool.common import select_elements
+
+from rosinstall.helpers import get_workspace_state_path, write_if_changed
+
+INSTALL_STATS_FILENAME = 'install_stats.jsonl'
+# weight of the latest duration in the expected duration of an entry
+_SMOOTHING = 0.5
+
+
+class InstallStats(object):
+    """
+    file of json lines [localname, seconds] of completed installs
+    """
+
+    def __init__(self, base_path):
+        self.path = get_workspace_state_path(base_path, INSTALL_STATS_FILENAME)
+        self.durations = {}
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as fhand:
+                for line in fhand:
+                    try:
+                        localname, duration = json.loads(line)
+                    except ValueError:
+                        # last line of an interrupted write
+                        continue
+                    previous = self.durations.get(localname)
+                    if previous is not None:
+                        duration = _SMOOTHING * duration + (1 - _SMOOTHING) * previous
+                    self.durations[localname] = duration
+
+    def get_expected(self, localname):
+        """:returns: expected duration in seconds, None if unknown"""
+        return self.durations.get(localname)
+
+    def get_order_key(self, element):
+        """
+        sort key starting entries without recorded duration first,
+        followed by the others longest first
+        """
+        expected = self.get_expected(element.get_local_name())
+        if expected is None:
+            return (0, 0)
+        return (1, -expected)
+
+    def record(self, localname, duration):
+        """appends the duration of an install of localname"""
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        # a single small write in append mode does not interleave
+        with open(self.path, 'a') as fhand:
+            fhand.write(json.dumps([localname, duration]) + '\n')
+
+    def compact(self, localnames):
+        """rewrites the file with the expected durations of localnames"""
+        if not os.path.isfile(self.path):
+            return
+        write_if_changed(self.path, ''.join(
+            [json.dumps([name, self.durations[name]]) + '\n'
+             for name in localnames if name in self.durations]))
+
+
+def estimate_duration(durations, jobs):
+    """
+    :param durations: expected seconds of each entry
+    :param jobs: number of parallel installs, <= 0 for all at once
+    :returns: seconds until all entries are done, when each entry starts
+      as soon as a job is free, longest first
+    """
+    if not durations:
+        return 0
+    if jobs <= 0:
+        jobs = len(durations)
+    loads = [0] * min(jobs, len(durations))
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    if minutes:
+        return '%dm%02ds' % (minutes, seconds)
+    return '%ds' % seconds
+
+
+def _get_timed_install(stats, element):
+    install = element.install
+
+    def _install(*args, **kwargs):
+        start = time.time()
+        result = install(*args, **kwargs)
+        stats.record(element.get_local_name(), time.time() - start)
+        return result
+    return _install
+
+
+@contextmanager
+def scheduled_install(config, jobs=1, localnames=None):
+    """
+    Prints the expected duration of the install and records the
+    duration of each successful install of an SCM entry within the
+    context. Pass InstallStats.get_order_key of the returned stats to
+    rosinstall_cmd.cmd_install_or_update to start the longest installs
+    first.
+
+    :param jobs: number of parallel installs, for the estimate
+    :param localnames: the entries to be installed, for the estimate,
+      None for all
+    :returns: the InstallStats
+    """
+    stats = InstallStats(config.get_base_path())
+    selected = [element for element in select_elements(config, localnames)
+                if element.is_vcs_element()]
+    durations = [stats.get_expected(element.get_local_name()) for element in selected]
+    known = [duration for duration in durations if duration is not None]
+    if known:
+        print("Expected duration: %s%s" %
+              (_format_duration(estimate_duration(known, jobs)),
+               (", %d of %d entries without history" %
+                (len(durations) - len(known), len(durations))
+                if len(known) < len(durations) else "")))
+
+    originals = []
+    for element in selected:
+        originals.append((element, element.__dict__.get('install')))
+        element.install = _get_timed_install(stats, element)
+    try:
+        yield stats
+    finally:
+        for element, install in originals:
+            if install is None:
+                del element.install
+            else:
+                element.install = install
+        stats = InstallStats(config.get_base_path())
+        stats.compact([element.get_local_name()
+                       for element in config.get_config_elements()])
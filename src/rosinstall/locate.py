@@ -34,18 +34,22 @@
 
 import sys
 import yaml
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib2 import urlopen
 
 from catkin_pkg.package import parse_package_string
-from rosdistro import get_cached_distribution, get_index, get_index_url
+from rosdistro import get_index_url
+
+from rosinstall.distro_cache import get_cached_distribution, get_index
+from rosinstall.http_pool import fetch
+from rosinstall.parallel import iter_parallel
 
 BRANCH_RELEASE = 'release'
 BRANCH_DEVEL = 'devel'
 
 
+# rosdistro distributions loaded in this process, by distro name
+_DISTRIBUTIONS = {}
+
+
 class InvalidData(Exception):
     pass
 
@@ -186,6 +190,7 @@ def get_manifest(stackage_name, distro_name=None):
     @return: (manifest data, 'package'|'stack'|'repository').
     @rtype: ({str: str}, str, str)
     @raise IOError: if data cannot be loaded
+    @raise InvalidData: if rosdoc has no information about stackage_name
     """
     data = None
     if distro_name is not None:
@@ -196,6 +201,74 @@ def get_manifest(stackage_name, distro_name=None):
     return data
 
 
+def get_manifests(stackage_names, distro_name=None):
+    """
+    Get the repository and manifest data of several resources, loading
+    the rosdistro distribution only once.
+
+    @param stackage_names: names of packages/stacks/repositories
+    @type  stackage_names: [str]
+    @param distro_name: name of ROS distribution
+    @type  distro_name: str
+
+    @return: for each name, (name, manifest data, type, error), where
+    error is the IOError or InvalidData raised for that name or None.
+    @rtype: [(str, {str: str}, str, Exception)]
+    """
+    results = []
+    for name in stackage_names:
+        try:
+            data, type_, _ = get_manifest(name, distro_name)
+            results.append((name, data, type_, None))
+        except (IOError, InvalidData) as exc:
+            results.append((name, None, None, exc))
+    return results
+
+
+def get_rosinstalls(stackage_names, distro_name=None, branch=None, prefix=None):
+    """
+    Compute a single rosinstall document for several resources.
+
+    @param stackage_names: names of packages/stacks/repositories
+    @param distro_name: name of ROS distribution
+    @param branch: source branch type ('devel' or 'release')
+    @param prefix: checkout filepath prefix
+    @return: (rosinstall yaml string, list of (name, error) for
+    resources that could not be located)
+    """
+    entries = []
+    failures = []
+    for name, data, type_, error in get_manifests(stackage_names, distro_name):
+        if error is None:
+            try:
+                entries.append(_get_rosinstall_dict(name, data, type_, branch, prefix))
+                continue
+            except InvalidData as invd:
+                error = invd
+        failures.append((name, error))
+    return yaml.dump(entries, default_flow_style=False), failures
+
+
+def get_distribution(distro_name):
+    """
+    Load the rosdistro distribution (from its distribution cache file)
+    once per process.
+
+    @param distro_name: name of ROS distribution
+    @type  distro_name: str
+    @return: rosdistro Distribution, None if distro_name is unknown
+    """
+    if distro_name not in _DISTRIBUTIONS:
+        index = get_index(get_index_url())
+        try:
+            _DISTRIBUTIONS[distro_name] = get_cached_distribution(index, distro_name)
+        except RuntimeError as runerr:
+            if not str(runerr).startswith("Unknown release"):
+                raise
+            _DISTRIBUTIONS[distro_name] = None
+    return _DISTRIBUTIONS[distro_name]
+
+
 def get_manifest_from_rosdistro(package_name, distro_name):
     """
     Get the rosdistro repository data and package information.
@@ -212,13 +285,9 @@ def get_manifest_from_rosdistro(package_name, distro_name):
     """
     data = {}
     type_ = None
-    index = get_index(get_index_url())
-    try:
-        distribution_cache = get_cached_distribution(index, distro_name)
-    except RuntimeError as runerr:
-        if (runerr.message.startswith("Unknown release")):
-            return None
-        raise
+    distribution_cache = get_distribution(distro_name)
+    if distribution_cache is None:
+        return None
 
     if package_name in distribution_cache.release_packages:
         pkg = distribution_cache.release_packages[package_name]
@@ -271,6 +340,7 @@ def get_rosdoc_manifest(stackage_name, distro_name=None):
     @return: (manifest data, 'package'|'stack').
     @rtype: ({str: str}, str, str)
     @raise IOError: if data cannot be loaded
+    @raise InvalidData: if rosdoc has no information about stackage_name
     """
     ROSDOC_PREFIX = 'http://ros.org/doc'
     if distro_name is not None:
@@ -278,27 +348,31 @@ def get_rosdoc_manifest(stackage_name, distro_name=None):
     else:
         prefix = ROSDOC_PREFIX
 
-    data = None
     url_stack = '%s/api/%s/stack.yaml' % (prefix, stackage_name)
     url_pack = '%s/api/%s/manifest.yaml' % (prefix, stackage_name)
+
+    def _probe(probe):
+        type_, url = probe
+        data = yaml.safe_load(fetch(url))
+        if not data:
+            raise InvalidData(
+                'No Information available on %s %s at %s' % (type_,
+                                                             stackage_name,
+                                                             url))
+        # with fuerte, stacks also have manifest.yaml, but have a type flag
+        return (data, data.get('package_type') or type_)
+
+    data = None
     errors = []
-    # ! loop vars used after loop as well
-    for type_, url in zip(['stack', 'package'], [url_stack, url_pack]):
-        try:
-            streamdata = urlopen(url)
-            data = yaml.safe_load(streamdata)
-            if not data:
-                raise InvalidData(
-                    'No Information available on %s %s at %s' % (type_,
-                                                                 stackage_name,
-                                                                 url))
-            # with fuerte, stacks also have manifest.yaml, but have a type flag
-            realtype = data.get('package_type')
-            if realtype:
-                type_ = realtype
+    # both urls are probed at once, results come in order so the
+    # stack result wins, the package probe is ignored if not needed
+    for _, (type_, url), result, error in iter_parallel(
+            _probe, [('stack', url_stack), ('package', url_pack)],
+            jobs=2, ordered=True):
+        if error is None:
+            data, type_ = result
             break
-        except Exception as loope:
-            errors.append((url, loope))
+        errors.append((url, error))
 
     # 1 error is expected when we query package
     if len(errors) > 1:
@@ -0,0 +1,125 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Helpers to run IO bound work (mostly SCM commands) for many
+workspace entries concurrently, using a bounded number of threads.
+"""
+
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def iter_parallel(func, items, jobs=1, ordered=False):
+    """
+    Calls func(item) for each item using at most jobs worker threads,
+    and yields a tuple (index, item, result, error) for each call as
+    soon as it is available. error is the exception raised by func,
+    or None, so one failing item does not stop the others.
+
+    Results are only ever yielded from the calling thread, so callers
+    may print from the loop body without interleaving output.
+
+    :param func: callable taking one item
+    :param items: sequence of items
+    :param jobs: maximum number of concurrent calls, negative values
+      for one thread per item, 0 and 1 run everything in the calling
+      thread
+    :param ordered: if True, yield results in the order of items,
+      holding back at most 2 * jobs finished results
+    """
+    items = list(items)
+    jobs = int(jobs or 1)
+    if jobs < 0:
+        jobs = len(items)
+    if jobs < 2 or len(items) < 2:
+        for index, item in enumerate(items):
+            try:
+                yield (index, item, func(item), None)
+            except Exception as exc:
+                yield (index, item, None, exc)
+        return
+
+    jobs = min(jobs, len(items))
+    # bounds how many tasks may be dispatched ahead of the consumer
+    window = 2 * jobs if ordered else jobs
+    tasks = queue.Queue()
+    results = queue.Queue()
+
+    def _worker():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            index, item = task
+            try:
+                results.put((index, item, func(item), None))
+            except Exception as exc:
+                results.put((index, item, None, exc))
+
+    threads = []
+    for _ in range(jobs):
+        thread = threading.Thread(target=_worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    next_dispatch = 0
+    next_yield = 0
+    yielded = 0
+    finished = {}
+    try:
+        while yielded < len(items):
+            while (next_dispatch < len(items) and
+                   next_dispatch - yielded < window):
+                tasks.put((next_dispatch, items[next_dispatch]))
+                next_dispatch += 1
+            # timeout keeps the wait interruptible by Ctrl-C on python2
+            try:
+                result = results.get(True, 0.1)
+            except queue.Empty:
+                continue
+            if not ordered:
+                yielded += 1
+                yield result
+                continue
+            finished[result[0]] = result
+            while next_yield in finished:
+                yielded += 1
+                yield finished.pop(next_yield)
+                next_yield += 1
+    finally:
+        for _ in threads:
+            tasks.put(None)
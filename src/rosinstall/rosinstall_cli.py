@@ -51,9 +51,11 @@ import os
 import sys
 from optparse import OptionParser
 import yaml
-import shutil
 
 from rosinstall import rosinstall_cmd
+from rosinstall.git_mirror import mirrored_git, get_git_uris
+from rosinstall.install_journal import journaled_install
+from rosinstall.install_stats import scheduled_install
 from wstool import multiproject_cmd
 from wstool.helpers import ROSINSTALL_FILENAME
 import rosinstall.__version__
@@ -128,14 +130,20 @@ Later URIs will shadow packages of earlier URIs.\n",
                       help="shows a combined status command over all SCM entries, also showing untracked files",
                       action="store_true")
     parser.add_option("-j", "--parallel", dest="jobs",
-                      default=1,
-                      help="How many parallel threads to use for installing",
+                      default=None,
+                      help="How many parallel threads to use for installing (default 1), --diff and --status (default all entries at once)",
                       action="store")
+    parser.add_option("--resume", dest="resume", default=False,
+                      help="skip entries completed by the previous, interrupted run",
+                      action="store_true")
     parser.add_option(
         "--generate-versioned-rosinstall", dest="generate_versioned",
         default=None,
         help="generate a versioned rosinstall file", action="store")
     (options, args) = parser.parse_args(args)
+    # like wstool, --diff and --status query all entries at once by default
+    jobs = 1 if options.jobs is None else int(options.jobs)
+    vcs_jobs = -1 if options.jobs is None else jobs
 
     if options.version:
         print("rosinstall %s\n%s" % (rosinstall.__version__.version, multiproject_cmd.cmd_version()))
@@ -176,7 +184,7 @@ Later URIs will shadow packages of earlier URIs.\n",
 
     if options.generate_versioned:
         filename = os.path.abspath(options.generate_versioned)
-        source_aggregate = multiproject_cmd.cmd_snapshot(config)
+        source_aggregate = rosinstall_cmd.cmd_snapshot(config)
         with open(filename, 'w') as fhand:
             fhand.write(yaml.safe_dump(source_aggregate))
         print("Saved versioned rosinstall of current directory %s to %s" %
@@ -184,45 +192,59 @@ Later URIs will shadow packages of earlier URIs.\n",
         return True
 
     if options.vcs_diff:
-        difflist = multiproject_cmd.cmd_diff(config)
-        alldiff = []
-        for entrydiff in difflist:
-            if entrydiff['diff'] is not None and entrydiff['diff'] != '':
-                alldiff.append(entrydiff['diff'])
-        print('\n'.join(alldiff))
+        # diffs are printed in config order as they arrive, separated
+        # by newlines as if joined
+        separator = ''
+        for _, diff in rosinstall_cmd.iter_diff(config, jobs=vcs_jobs):
+            if diff is not None and diff != '':
+                sys.stdout.write(separator + diff)
+                sys.stdout.flush()
+                separator = '\n'
+        print('')
         return True
 
     if options.vcs_status or options.vcs_status_untracked:
-        statuslist = multiproject_cmd.cmd_status(
-          config,
-          untracked=options.vcs_status_untracked)
-        allstatus = ""
-        for entrystatus in statuslist:
-            if entrystatus['status'] is not None:
-                allstatus += entrystatus['status']
-        print(allstatus, end='')
+        for _, status in rosinstall_cmd.iter_status(
+                config,
+                untracked=options.vcs_status_untracked,
+                jobs=vcs_jobs):
+            if status is not None:
+                sys.stdout.write(status)
+                sys.stdout.flush()
         return True
 
     print("rosinstall operating on", options.path,
           "from specifications in rosinstall files ",
           ", ".join(config_uris))
 
-    # includes ROS specific files
-    print("(Over-)Writing %s" %
-          os.path.join(options.path, ROSINSTALL_FILENAME))
-    if(os.path.isfile(os.path.join(options.path, ROSINSTALL_FILENAME))):
-        shutil.move(os.path.join(options.path, ROSINSTALL_FILENAME),
-                    "%s.bak" % os.path.join(options.path, ROSINSTALL_FILENAME))
-    rosinstall_cmd.cmd_persist_config(config)
+    # includes ROS specific files, the previous file is kept as .bak
+    if rosinstall_cmd.cmd_persist_config(config, backup=True):
+        print("(Over-)Wrote %s" %
+              os.path.join(options.path, ROSINSTALL_FILENAME))
 
-    ## install or update each element
-    install_success = multiproject_cmd.cmd_install_or_update(
-        config,
-        backup_path=options.backup_changed,
-        mode=mode,
-        robust=options.robust,
-        num_threads=int(options.jobs),
-        verbose=options.verbose)
+    ## install or update each element not yet at its pinned revision,
+    ## through the git mirrors if enabled
+    install_success = True
+    localnames = rosinstall_cmd.get_outdated_localnames(config)
+    skipped = len(config.get_config_elements()) - len(localnames)
+    if skipped > 0:
+        print("Skipping %d entries already at their pinned revision" % skipped)
+    if localnames:
+        elements = multiproject_cmd.select_elements(config, localnames)
+        # longest entries first, timing only installs the journal did not skip
+        with mirrored_git(get_git_uris([element.get_path_spec()
+                                        for element in elements])), \
+                scheduled_install(config, jobs, localnames) as stats, \
+                journaled_install(config, resume=options.resume):
+            install_success = rosinstall_cmd.cmd_install_or_update(
+                config,
+                backup_path=options.backup_changed,
+                mode=mode,
+                robust=options.robust,
+                localnames=localnames,
+                num_threads=jobs,
+                verbose=options.verbose,
+                order_key=stats.get_order_key)
 
     rosinstall_cmd.cmd_generate_ros_files(
         config,
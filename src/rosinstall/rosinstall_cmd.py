@@ -32,14 +32,34 @@
 
 
 import os
+import sys
 import subprocess
-from wstool.multiproject_cmd import cmd_persist_config as multipersist
+import yaml
+from wstool.common import MultiProjectException, DistributedWork, \
+    select_elements
+from wstool.config_yaml import PathSpec
 from rosinstall import setupfiles
 from wstool.helpers import ROSINSTALL_FILENAME
-from rosinstall.helpers import is_path_ros
+from rosinstall.helpers import is_path_ros, write_if_changed
+from rosinstall.parallel import iter_parallel
+from rosinstall.git_refs import get_head_revision, get_remote_url, is_sha
 
+# threads to query entries whose revision is not read from the metadata
+SNAPSHOT_JOBS = 8
+# width of the status column of SCMs, aligned to svn as by wstool
+_STATUS_COLUMNS = {'git': 3, 'hg': 2, 'bzr': 4}
 
-def cmd_persist_config(config, config_filename=ROSINSTALL_FILENAME, header=''):
+
+def cmd_persist_config(config, config_filename=ROSINSTALL_FILENAME, header='',
+                       backup=False):
+    """
+    Writes config to config_filename in the workspace, like wstool
+    cmd_persist_config, but only if the content changed, and through a
+    temporary file renamed over the old one.
+
+    :param backup: keep the previous file as config_filename.bak
+    :returns: True if the file was written
+    """
     ## Save .rosinstall
     header = (header or '') + """\
 # IT IS UNLIKELY YOU WANT TO EDIT THIS FILE BY HAND,
@@ -48,7 +68,241 @@ def cmd_persist_config(config, config_filename=ROSINSTALL_FILENAME, header=''):
 # USE THE rosinstall TOOL INSTEAD.
 # IF YOU CHANGE IT, USE rosinstall FOR THE CHANGES TO TAKE EFFECT
 """
-    multipersist(config, config_filename, header)
+    if not os.path.exists(config.get_base_path()):
+        os.makedirs(config.get_base_path())
+    config_path = os.path.realpath(os.path.join(config.get_base_path(), config_filename))
+    items = [element.get_legacy_yaml() for element in config.get_source()]
+    content = header
+    if items:
+        content += yaml.safe_dump(items)
+    written = write_if_changed(config_path, content,
+                               backup_path=('%s.bak' % config_path if backup else None))
+    # setup.sh would otherwise fall back to parsing .rosinstall
+    base_path = config.get_base_path()
+    if (os.path.isfile(os.path.join(base_path, 'setup.sh')) and
+            os.path.realpath(os.path.join(base_path, config_filename)) ==
+            os.path.realpath(os.path.join(base_path, ROSINSTALL_FILENAME))):
+        setupfiles.generate_setup_cache(config)
+    return written
+
+
+def _iter_vcs_elements(config, func, jobs):
+    """
+    Yields (element, func(element)) for the SCM entries of config, in
+    config order, running up to jobs calls at the same time.
+
+    :raises MultiProjectException: when func fails for an entry
+    """
+    elements = [element for element in config.get_config_elements()
+                if element.is_vcs_element()]
+    for _, element, result, error in iter_parallel(func, elements,
+                                                   jobs=jobs, ordered=True):
+        if error is not None:
+            raise MultiProjectException("Error processing '%s' : %s" %
+                                        (element.get_local_name(), error))
+        yield element, result
+
+
+def iter_diff(config, jobs=1):
+    """
+    Like wstool cmd_diff, but yields (element, diff) for each SCM entry
+    as soon as it and all entries before it are done, so that output
+    can be streamed in config order.
+
+    :param jobs: how many entries to diff in parallel
+    """
+    path = config.get_base_path()
+    return _iter_vcs_elements(config, lambda element: element.get_diff(path), jobs)
+
+
+def _align_status(scmtype, status):
+    """aligns the status output of other SCMs to svn"""
+    columns = _STATUS_COLUMNS.get(scmtype)
+    if columns is None or status is None:
+        return status
+    return ''.join(["%s%s\n" % (line[:columns].ljust(8), line[columns:])
+                    for line in status.splitlines()])
+
+
+def iter_status(config, untracked=False, jobs=1):
+    """
+    Like wstool cmd_status, but yields (element, status) for each SCM
+    entry in config order, see iter_diff.
+
+    :param untracked: also show files not added to the SCM
+    :param jobs: how many entries to query in parallel
+    """
+    path = config.get_base_path()
+
+    def _status(element):
+        return _align_status(element.get_path_spec().get_scmtype(),
+                             element.get_status(path, untracked))
+    return _iter_vcs_elements(config, _status, jobs)
+
+
+def _get_snapshot_spec(element):
+    """
+    The path spec of element at its current revision. The revision of
+    git entries with a uri is read from the .git metadata, other
+    entries are queried with their SCM client.
+    """
+    path_spec = element.get_path_spec()
+    if path_spec.get_scmtype() == 'git' and path_spec.get_uri():
+        revision = get_head_revision(element.get_path())
+        if revision is not None:
+            return PathSpec(local_name=path_spec.get_local_name(),
+                            scmtype='git',
+                            uri=path_spec.get_uri(),
+                            version=revision,
+                            path=path_spec.get_path())
+    spec = element.get_versioned_path_spec()
+    return PathSpec(local_name=spec.get_local_name(),
+                    scmtype=spec.get_scmtype(),
+                    uri=spec.get_uri() or spec.get_curr_uri(),
+                    version=(spec.get_current_revision() or
+                             spec.get_revision() or
+                             spec.get_version()),
+                    path=spec.get_path())
+
+
+def cmd_snapshot(config, localnames=None, jobs=SNAPSHOT_JOBS):
+    """
+    Like wstool cmd_snapshot, lists the SCM entries of config at their
+    current revisions, without running git for git entries where
+    possible.
+
+    :param jobs: how many entries to query with SCM clients in parallel
+    :returns: list of entries in rosinstall format
+    """
+    source_aggregate = []
+    elements = select_elements(config, localnames)
+    for _, element, spec, error in iter_parallel(
+            lambda element: (_get_snapshot_spec(element)
+                             if element.is_vcs_element() else None),
+            elements, jobs=jobs, ordered=True):
+        if error is not None:
+            raise MultiProjectException("Error processing '%s' : %s" %
+                                        (element.get_local_name(), error))
+        if spec is None:
+            sys.stderr.write('Warning, discarding non-vcs element %s\n' %
+                             element.get_local_name())
+            continue
+        if not spec.get_version():
+            sys.stderr.write(
+                'Warning, discarding non-vcs element %s\n' % element.get_local_name())
+        source_aggregate.append(spec.get_legacy_yaml())
+    return source_aggregate
+
+
+def _is_at_pinned_revision(element):
+    """
+    True for git entries pinned to a commit sha whose working copy is
+    at that commit and clones the same uri, checked from the .git
+    metadata only.
+    """
+    if not element.is_vcs_element():
+        return False
+    path_spec = element.get_path_spec()
+    if path_spec.get_scmtype() != 'git' or not is_sha(path_spec.get_version()):
+        return False
+    uri = get_remote_url(element.get_path())
+    return (uri is not None and
+            uri.rstrip('/') == path_spec.get_uri().rstrip('/') and
+            get_head_revision(element.get_path()) == path_spec.get_version())
+
+
+def get_outdated_localnames(config):
+    """
+    Pre-pass for cmd_install_or_update on versioned configs: fetching
+    a git entry that already is at its pinned commit cannot change it.
+
+    :returns: localnames of the elements of config that need to be
+      installed or updated, in config order
+    """
+    return [element.get_local_name()
+            for element in config.get_config_elements()
+            if not _is_at_pinned_revision(element)]
+
+
+def cmd_install_or_update(config, backup_path=None, mode='abort',
+                          robust=False, localnames=None, num_threads=1,
+                          timeout=None, verbose=False, shallow=False,
+                          order_key=None):
+    """
+    Like wstool cmd_install_or_update, but the installs are started in
+    the order given by order_key. The preparation, which may prompt
+    the user, still follows the config order.
+
+    :param order_key: function of a config element, installs with a
+      lower key start first, config order if None
+    :returns: True on Success
+    :raises MultiProjectException: on plenty of errors
+    """
+    success = True
+    if not os.path.exists(config.get_base_path()):
+        os.mkdir(config.get_base_path())
+    # Prepare install operation check filesystem and ask user
+    preparation_reports = []
+    abs_backup_path = None
+    if backup_path is not None:
+        abs_backup_path = os.path.join(config.get_base_path(), backup_path)
+    for tree_el in select_elements(config, localnames):
+        try:
+            preparation_report = tree_el.prepare_install(
+                backup_path=abs_backup_path,
+                arg_mode=mode,
+                robust=robust)
+            if preparation_report is not None:
+                if preparation_report.abort:
+                    raise MultiProjectException(
+                        "Aborting install because of %s" % preparation_report.error)
+                if not preparation_report.skip:
+                    preparation_reports.append(preparation_report)
+                elif preparation_report.error is not None:
+                    print("Skipping install of %s because: %s" %
+                          (preparation_report.config_element.get_local_name(),
+                           preparation_report.error))
+        except MultiProjectException as exc:
+            fail_str = ("Failed to install tree '%s'\n %s" %
+                        (tree_el.get_path(), exc))
+            if robust:
+                success = False
+                print("Continuing despite %s" % fail_str)
+            else:
+                raise MultiProjectException(fail_str)
+    if order_key is not None:
+        # stable sort, DistributedWork starts the installs in this order
+        preparation_reports.sort(key=lambda report: order_key(report.config_element))
+
+    class Installer():
+
+        def __init__(self, report):
+            self.element = report.config_element
+            self.report = report
+
+        def do_work(self):
+            self.element.install(checkout=self.report.checkout,
+                                 backup=self.report.backup,
+                                 backup_path=self.report.backup_path,
+                                 inplace=self.report.inplace,
+                                 timeout=timeout,
+                                 verbose=verbose,
+                                 shallow=shallow)
+            return {}
+
+    work = DistributedWork(capacity=len(preparation_reports),
+                           num_threads=num_threads,
+                           silent=False)
+    for report in preparation_reports:
+        work.add_thread(Installer(report))
+    try:
+        work.run()
+    except MultiProjectException as exc:
+        print("Exception caught during install: %s" % exc)
+        success = False
+        if not robust:
+            raise
+    return success
 
 
 def _ros_requires_boostrap(config):
@@ -67,16 +321,28 @@ def _ros_requires_boostrap(config):
     return False
 
 
+def _print_setup_files_written(config, written):
+    names = [os.path.basename(path) for path in written
+             if os.path.dirname(path) == config.get_base_path()]
+    if names:
+        print("Writing %s in %s" % (', '.join(names), config.get_base_path()))
+    else:
+        print("setup.sh, setup.bash, and setup.zsh in %s are up to date" %
+              config.get_base_path())
+
+
 def cmd_maybe_refresh_ros_files(config):
     """
     Regenerates setup.* files if they exist already
 
     :param config: workspace config object
+    :returns: list of paths of written files
     """
     if (os.path.isfile(os.path.join(config.get_base_path(), 'setup.sh'))):
-        print("Overwriting setup.sh, setup.bash, and setup.zsh in %s" %
-              config.get_base_path())
-        setupfiles.generate_setup(config, no_ros_allowed=True)
+        written = setupfiles.generate_setup(config, no_ros_allowed=True)
+        _print_setup_files_written(config, written)
+        return written
+    return []
 
 
 def cmd_generate_ros_files(config, path, nobuild=False, rosdep_yes=False, catkin=False, catkinpp=None, no_ros_allowed=False):
@@ -88,7 +354,9 @@ def cmd_generate_ros_files(config, path, nobuild=False, rosdep_yes=False, catkin
     :param catkin: if true, generates catkin(fuerte) CMakeLists.txt instead of invoking rosmake
     :param catkinpp: Prefix path for catkin if generating for catkin
     :param no_ros_allowed: if true, does not look for a core ros stack
+    :returns: list of paths of written setup files
     """
+    written = []
 
     # Catkin must be enabled if catkinpp is set
     if catkinpp is not None:
@@ -100,9 +368,8 @@ def cmd_generate_ros_files(config, path, nobuild=False, rosdep_yes=False, catkin
 
     else:  # DRY install case
         ## Generate setup.sh and save
-        print("(Over-)Writing setup.sh, setup.bash, and setup.zsh in %s" %
-              config.get_base_path())
-        setupfiles.generate_setup(config, no_ros_allowed)
+        written = setupfiles.generate_setup(config, no_ros_allowed)
+        _print_setup_files_written(config, written)
 
         if _ros_requires_boostrap(config) and not nobuild:
             print("Bootstrapping ROS build")
@@ -118,3 +385,4 @@ def cmd_generate_ros_files(config, path, nobuild=False, rosdep_yes=False, catkin
                     ros_comm_insert,
                     rosdep_yes_insert))
             subprocess.check_call(cmd, shell=True, executable='/bin/bash')
+    return written
@@ -50,16 +50,21 @@ from optparse import OptionParser
 from wstool.cli_common import get_info_list, get_info_table, \
     get_info_table_raw_csv, get_workspace, ONLY_OPTION_VALID_ATTRS
 import rosinstall.rosinstall_cmd as rosinstall_cmd
-from wstool.multiproject_cmd import get_config, cmd_install_or_update, \
-    cmd_snapshot, cmd_version, cmd_info, cmd_find_unmanaged_repos
+from wstool.multiproject_cmd import get_config, cmd_version, \
+    cmd_find_unmanaged_repos
 import rosinstall.__version__
 
 from wstool.common import MultiProjectException, select_elements
 from wstool.helpers import ROSINSTALL_FILENAME
-from rosinstall.helpers import get_ros_package_path, get_ros_stack_path
+from rosinstall.helpers import get_ros_package_path, get_ros_stack_path, \
+    WORKSPACE_STATE_DIRNAME
+from rosinstall.status_cache import cached_cmd_info
+from rosinstall.git_mirror import mirrored_git, get_git_uris
+from rosinstall.install_journal import journaled_install
+from rosinstall.install_stats import scheduled_install
 from wstool.multiproject_cli import MultiprojectCLI, __MULTIPRO_CMD_DICT__, \
     __MULTIPRO_CMD_HELP_LIST__, __MULTIPRO_CMD_ALIASES__, \
-    IndentedHelpFormatterWithNL, list_usage
+    IndentedHelpFormatterWithNL, list_usage, _get_mode_from_options
 
 ## This file adds or extends commands from multiproject_cli where ROS
 ## specific output has to be generated.
@@ -152,11 +157,14 @@ $ %(prog)s init ~/fuerte /opt/ros/fuerte
               self.config_filename))
         rosinstall_cmd.cmd_persist_config(config)
 
-        ## install or update each element
-        install_success = cmd_install_or_update(
-            config,
-            robust=False,
-            num_threads=int(options.jobs))
+        ## install or update each element, through the git mirrors if enabled
+        with mirrored_git(get_git_uris(config.get_source())), \
+                scheduled_install(config, int(options.jobs)) as stats:
+            install_success = rosinstall_cmd.cmd_install_or_update(
+                config,
+                robust=False,
+                num_threads=int(options.jobs),
+                order_key=stats.get_order_key)
 
         rosinstall_cmd.cmd_generate_ros_files(config,
                                               target_path,
@@ -174,6 +182,99 @@ $ %(prog)s init ~/fuerte /opt/ros/fuerte
             print("\nType 'source %s/setup.bash' to change into this environment. Add that source command to the bottom of your ~/.bashrc to set it up every time you log in.\n\nIf you are not using bash please see http://wiki.ros.org/rosinstall/NonBashShells " % os.path.abspath(target_path))
         return 0
 
+    def cmd_update(self, target_path, argv, config=None):
+        """
+        update of multiproject_cli, fetching git entries through the
+        git mirrors if enabled (ROSINSTALL_GIT_MIRROR_DIR), recording
+        completed entries in the install journal.
+        """
+        parser = OptionParser(usage="usage: %s update [localname]*" % self.progname,
+                              formatter=IndentedHelpFormatterWithNL(),
+                              description=__MULTIPRO_CMD_DICT__["update"] + """
+
+This command calls the SCM provider to pull changes from remote to
+your local filesystem. In case the url has changed, the command will
+ask whether to delete or backup the folder.
+
+Examples:
+$ %(progname)s update -t ~/fuerte
+$ %(progname)s update robot_model geometry
+""" % {'progname': self.progname},
+                              epilog="See: http://www.ros.org/wiki/rosinstall for details\n")
+        parser.add_option("--delete-changed-uris", dest="delete_changed",
+                          default=False,
+                          help="Delete the local copy of a directory before changing uri.",
+                          action="store_true")
+        parser.add_option("--abort-changed-uris", dest="abort_changed",
+                          default=False,
+                          help="Abort if changed uri detected",
+                          action="store_true")
+        parser.add_option("--continue-on-error", dest="robust",
+                          default=False,
+                          help="Continue despite checkout errors",
+                          action="store_true")
+        parser.add_option("--backup-changed-uris", dest="backup_changed",
+                          default='',
+                          help="backup the local copy of a directory before changing uri to this directory.",
+                          action="store")
+        parser.add_option("-m", "--timeout", dest="timeout",
+                          default=None,
+                          help="How long to wait for each repo before failing [seconds]",
+                          action="store", type=float)
+        parser.add_option("-j", "--parallel", dest="jobs",
+                          default=1,
+                          help="How many parallel threads to use for installing",
+                          action="store")
+        parser.add_option("-v", "--verbose", dest="verbose",
+                          default=False,
+                          help="Whether to print out more information",
+                          action="store_true")
+        parser.add_option("--resume", dest="resume",
+                          default=False,
+                          help="skip entries completed by the previous, interrupted update",
+                          action="store_true")
+        # -t option required here for help but used one layer above, see cli_common
+        parser.add_option("-t", "--target-workspace", dest="workspace",
+                          default=None,
+                          help="which workspace to use",
+                          action="store")
+        (options, args) = parser.parse_args(argv)
+
+        # ROS_WORKSPACE may be relative, wstool compares it to the config path
+        target_path = os.path.abspath(target_path)
+        if config is None:
+            config = get_config(
+                target_path,
+                additional_uris=[],
+                config_filename=self.config_filename)
+        elif config.get_base_path() != target_path:
+            raise MultiProjectException("Config path does not match %s %s " % (
+                config.get_base_path(),
+                target_path))
+        mode = _get_mode_from_options(parser, options)
+        if args == []:
+            # None means no filter, [] means filter all
+            args = None
+        # only the mirrors of the entries to update are refreshed
+        elements = select_elements(config, args)
+        with mirrored_git(get_git_uris([element.get_path_spec()
+                                        for element in elements])), \
+                scheduled_install(config, int(options.jobs), args) as stats, \
+                journaled_install(config, resume=options.resume):
+            install_success = rosinstall_cmd.cmd_install_or_update(
+                config,
+                localnames=args,
+                backup_path=options.backup_changed,
+                mode=mode,
+                robust=options.robust,
+                num_threads=int(options.jobs),
+                timeout=options.timeout,
+                verbose=options.verbose,
+                order_key=stats.get_order_key)
+        if install_success or options.robust:
+            return 0
+        return 1
+
     def cmd_regenerate(self, target_path, argv, config=None):
         parser = OptionParser(usage="usage: %s regenerate" % self.progname,
                               formatter=IndentedHelpFormatterWithNL(),
@@ -249,6 +350,12 @@ overlay later entries.
 When given one localname, just show the data of one element in list form.
 This also has the generic properties element which is usually empty.
 
+The revisions and uris of repositories are cached in the workspace until
+HEAD, index or configuration of the repository change, for at most
+ROSINSTALL_STATUS_CACHE_TTL seconds (default 600, 0 disables the cache).
+Whether a repository has local modifications is checked on every call.
+Use --refresh to query all repositories fully.
+
 The --only option accepts keywords: %(opts)s
 
 Examples:
@@ -291,6 +398,10 @@ $ %(prog)s info --only=path,cur_uri,cur_revision robot_model geometry
             default=False,
             help="Also show untracked files as modifications",
             action="store_true")
+        parser.add_option(
+            "--refresh", dest="refresh", default=False,
+            help="Query all entries, ignoring cached status of unchanged repositories.",
+            action="store_true")
         # -t option required here for help but used one layer above, see cli_common
         parser.add_option(
             "-t", "--target-workspace", dest="workspace", default=None,
@@ -337,14 +448,16 @@ $ %(prog)s info --only=path,cur_uri,cur_revision robot_model geometry
             print('\n'.join(lines))
             return 0
         elif options.yaml:
-            source_aggregate = cmd_snapshot(config, localnames=args)
+            source_aggregate = rosinstall_cmd.cmd_snapshot(config, localnames=args)
             print(yaml.safe_dump(source_aggregate), end='')
             return 0
 
-        # this call takes long, as it invokes scms.
-        outputs = cmd_info(config, localnames=args,
-                           untracked=options.untracked,
-                           fetch=options.fetch)
+        # this call takes long, as it invokes scms, unless the
+        # status of unchanged repositories is cached
+        outputs = cached_cmd_info(config, localnames=args,
+                                  untracked=options.untracked,
+                                  fetch=options.fetch,
+                                  refresh=options.refresh)
         if args and len(args) == 1:
             # if only one element selected, print just one line
             print(get_info_list(config.get_base_path(),
@@ -363,7 +476,9 @@ $ %(prog)s info --only=path,cur_uri,cur_revision robot_model geometry
             print("\n%s" % table)
 
         if options.unmanaged:
-            outputs2 = cmd_find_unmanaged_repos(config)
+            # deleted checkouts wait in the trash of the state directory
+            outputs2 = [output for output in cmd_find_unmanaged_repos(config)
+                        if output['localname'].split(os.sep)[0] != WORKSPACE_STATE_DIRNAME]
             table2 = get_info_table(config.get_base_path(),
                                    outputs2,
                                    options.data_only,
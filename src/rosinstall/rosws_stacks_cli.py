@@ -32,15 +32,22 @@
 
 
 import os
+import re
 import sys
 import distutils
 import shutil
+from collections import deque
 from subprocess import Popen, PIPE
 from optparse import OptionParser
+from xml.etree import ElementTree
 
 import yaml
+import rospkg
 
-from rosinstall.helpers import ROSInstallException, ROSINSTALL_FILENAME
+from rosinstall.helpers import ROSInstallException, ROSINSTALL_FILENAME, \
+    get_ros_stack_path, move_to_trash, reap_trash
+from rosinstall.locate import get_manifest, get_rosinstall, InvalidData, \
+    BRANCH_DEVEL
 from wstool.common import MultiProjectException
 from wstool.cli_common import get_workspace
 import rosinstall.rosws_cli
@@ -48,6 +55,11 @@ from rosinstall.rosinstall_cmd import cmd_persist_config
 from wstool.multiproject_cmd import get_config, cmd_install_or_update
 import wstool.config_yaml
 
+# stack dependencies parsed from stack.xml files, by path, as (mtime, depends)
+_STACK_DEPENDS = {}
+# ROS distro names detected for workspaces, by workspace path
+_DISTRO_NAMES = {}
+
 
 def get_stack_element_in_config(config, stack):
     """
@@ -63,40 +75,90 @@ def get_stack_element_in_config(config, stack):
     return None
 
 
+class StackElementIndex(object):
+    """
+    Index of the config elements by local name, to look up stacks like
+    get_stack_element_in_config without scanning the config for every
+    stack. Changes to the config have to be made through the index to
+    keep it current.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._elements = {}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._elements.clear()
+        for entry in self.config.get_config_elements():
+            # first element wins, as in get_stack_element_in_config
+            self._elements.setdefault(entry.get_local_name(), entry)
+
+    def get_stack_element(self, stack):
+        """
+        The config element named like stack if it has a root level
+        file named stack.xml, else None
+        """
+        entry = self._elements.get(stack)
+        if entry is not None and os.path.isfile(os.path.join(entry.get_path(), 'stack.xml')):
+            return entry
+        return None
+
+    def add_path_spec(self, path_spec, merge_strategy='KillAppend'):
+        """
+        Config.add_path_spec, updating the index
+
+        :returns: merge action taken, as Config.add_path_spec
+        """
+        result = self.config.add_path_spec(path_spec, merge_strategy=merge_strategy)
+        elements = self.config.get_config_elements()
+        local_name = os.path.normpath(path_spec.get_local_name())
+        if elements and elements[-1].get_local_name() == local_name:
+            # new elements get appended, replacing elements of that name
+            self._elements[local_name] = elements[-1]
+        elif local_name in self._elements:
+            # may have been replaced in place
+            self._rebuild()
+        return result
+
+    def remove_element(self, local_name):
+        """
+        Config.remove_element, updating the index
+
+        :returns: True if such an element was found
+        """
+        self._elements.pop(local_name, None)
+        return self.config.remove_element(local_name)
+
+
 def roslocate_info(stack, distro, dev):
     """
-    Looks up stack yaml on the web
+    Looks up stack yaml on the web, like 'roslocate info', but in this
+    process, so that the rosdistro distribution is only loaded once for
+    all stacks.
 
     :raises: ROSInstallException on errors
     """
-    # TODO: use roslocate from code
-    cmd = ['roslocate', 'info', '--distro=%s' % (distro), stack]
-    if dev is True:
-        cmd.append('--dev')
+    branch = BRANCH_DEVEL if dev is True else None
     try:
-        proc = Popen(cmd, stdout=PIPE, stderr=PIPE)
-    except OSError as exc:
-        raise ROSInstallException(
-            '%s\nfailed to execute roslocate; is your ROS environment configured?' % (exc))
-
-    stdout, stderr = proc.communicate()
-    if proc.returncode != 0:
+        data, type_, _ = get_manifest(stack, distro)
+    except IOError:
         sys.stderr.write('[rosws] Warning: failed to locate stack "%s" in distro "%s".    Falling back on non-distro-specific search; compatibility problems may ensue.\n' % (stack, distro))
-        # Could be that the stack hasn't been released; try roslocate
-        # again, without specifying the distro.
-        cmd = ['roslocate', 'info', stack]
-        if dev is True:
-            cmd.append('--dev')
-        try:
-            proc = Popen(cmd, stdout=PIPE, stderr=PIPE)
-        except OSError as exc:
+        # Could be that the stack hasn't been released; try again with
+        # the distro of the environment, as roslocate without --distro
+        fallback_distro = os.environ.get('ROS_DISTRO')
+        if not fallback_distro:
             raise ROSInstallException(
-                '%s\nfailed to execute roslocate; is your ROS environment configured?' % (exc))
-
-        stdout, stderr = proc.communicate()
-        if proc.returncode != 0:
-            raise ROSInstallException('roslocate failed: %s' % (stderr))
-    return yaml.safe_load(stdout)
+                'roslocate failed: cannot locate information about %s, please set ROS_DISTRO' % stack)
+        try:
+            data, type_, _ = get_manifest(stack, fallback_distro)
+        except IOError as ioe:
+            raise ROSInstallException('roslocate failed: %s' % (ioe))
+    try:
+        return yaml.safe_load(get_rosinstall(stack, data, type_, branch))
+    except InvalidData as exc:
+        sys.stderr.write('%s\n' % exc)
+        return None
 
 
 def get_ros_stack_version():
@@ -121,6 +183,58 @@ def get_ros_stack_version():
     return ver
 
 
+def _read_ros_stack_version(ros_path):
+    """
+    Reads the ros stack version from its stack.xml, or from the
+    rosbuild_make_distribution call of its CMakeLists.txt, as rosversion
+    does for older stacks.
+
+    :returns: version as list of ints or None
+    """
+    text = None
+    stack_xml = os.path.join(ros_path, 'stack.xml')
+    if os.path.isfile(stack_xml):
+        try:
+            text = ElementTree.parse(stack_xml).getroot().findtext('version')
+        except ElementTree.ParseError:
+            pass
+    cmakelists = os.path.join(ros_path, 'CMakeLists.txt')
+    if not text and os.path.isfile(cmakelists):
+        with open(cmakelists) as fhand:
+            match = re.search(r'rosbuild_make_distribution\s*\(\s*([^\s)]+)',
+                              fhand.read())
+        if match:
+            text = match.group(1)
+    if text:
+        match = re.match(r'\s*(\d+)\.(\d+)', text)
+        if match:
+            return [int(part) for part in match.groups()]
+    return None
+
+
+def get_ros_distro_name(config):
+    """
+    Infers the distro name for the workspace from the version of the
+    ros stack in the config or from ROS_DISTRO, else from calling
+    rosversion. Results are kept per workspace.
+    """
+    base_path = config.get_base_path()
+    if base_path in _DISTRO_NAMES:
+        return _DISTRO_NAMES[base_path]
+    distro = None
+    ros_path = get_ros_stack_path(config)
+    if ros_path is not None:
+        ver = _read_ros_stack_version(ros_path)
+        if ver is not None:
+            distro = rosversion_to_distro_name(ver)
+    if distro is None:
+        distro = os.environ.get('ROS_DISTRO') or None
+    if distro is None:
+        distro = rosversion_to_distro_name(get_ros_stack_version())
+    _DISTRO_NAMES[base_path] = distro
+    return distro
+
+
 def rosversion_to_distro_name(ver):
     """
     Reads/Infers the distro name from ROS / or the ros stack
@@ -143,11 +257,79 @@ def rosversion_to_distro_name(ver):
         raise ROSInstallException('unknown ros version: %s' % (ver))
 
 
-def get_dependent_stacks(stack):
+def _get_stack_depends(stack_xml):
+    """
+    Reads the names of the stacks a stack.xml file depends on. Results
+    are kept until the modification time of the file changes.
+    """
+    mtime = os.path.getmtime(stack_xml)
+    cached = _STACK_DEPENDS.get(stack_xml)
+    if cached is None or cached[0] != mtime:
+        try:
+            root = ElementTree.parse(stack_xml).getroot()
+            depends = [dep.get('stack') for dep in root.findall('depend')
+                       if dep.get('stack')]
+        except ElementTree.ParseError as exc:
+            sys.stderr.write('[rosws] Warning: ignoring invalid %s: %s\n' % (stack_xml, exc))
+            depends = []
+        cached = (mtime, depends)
+        _STACK_DEPENDS[stack_xml] = cached
+    return cached[1]
+
+
+def get_stack_paths(config):
+    """
+    Finds the stacks of the ROS environment (ROS_ROOT and
+    ROS_PACKAGE_PATH) and of the config, the config taking precedence.
+
+    :returns: dict of stack names to stack paths
+    """
+    paths = {}
+    rosstack = rospkg.RosStack()
+    for name in rosstack.list():
+        paths[name] = rosstack.get_path(name)
+    for entry in config.get_config_elements():
+        if os.path.isfile(os.path.join(entry.get_path(), 'stack.xml')):
+            paths[entry.get_local_name()] = entry.get_path()
+    return paths
+
+
+def get_stack_dependency_graph(stack_paths):
+    """
+    :param stack_paths: dict of stack names to stack paths
+    :returns: dict of stack names to the list of stacks that
+      directly depend on them
+    """
+    depends_on = {}
+    for name, path in stack_paths.items():
+        stack_xml = os.path.join(path, 'stack.xml')
+        if not os.path.isfile(stack_xml):
+            continue
+        for dep in _get_stack_depends(stack_xml):
+            depends_on.setdefault(dep, []).append(name)
+    return depends_on
+
+
+def get_dependent_stacks(stack, config=None):
     """
-    Calls rosstack depends-on to get a list of dependance stacks. Avoid
-    using this function if you can.
+    Lists the stacks that depend on stack, directly or indirectly, like
+    rosstack depends-on. With a config, the stack.xml files of the
+    config and the ROS environment are read in this process, else
+    rosstack is called.
     """
+    if config is not None:
+        depends_on = get_stack_dependency_graph(get_stack_paths(config))
+        deps = []
+        visited = set([stack])
+        queue = deque([stack])
+        while queue:
+            for dep in sorted(depends_on.get(queue.popleft(), [])):
+                if dep not in visited:
+                    visited.add(dep)
+                    deps.append(dep)
+                    queue.append(dep)
+        return deps
+
     # roslib.stacks doesn't expose the dependency parts of rosstack, so
     # we'll call it manually
     cmd = ['rosstack', 'depends-on', stack]
@@ -177,8 +359,8 @@ def cmd_add_stack(config, stackname, released=False, recurse=False):
     :param recurse: also get dependant version
     :returns: True if stack has been added
     """
-    def _add_stack(config, stackname, distro, released=False):
-        stack_element = get_stack_element_in_config(config, stackname)
+    def _add_stack(index, stackname, distro, released=False):
+        stack_element = index.get_stack_element(stackname)
         if stack_element is not None:
             print("stack %stackname already in config at %s" %
                   (stackname, stack_element.get_path()))
@@ -187,27 +369,28 @@ def cmd_add_stack(config, stackname, released=False, recurse=False):
         if yaml_dict is not None and len(yaml_dict) > 0:
             path_spec = wstool.config_yaml.get_path_spec_from_yaml(yaml_dict[0])
 
-            if config.add_path_spec(path_spec, merge_strategy="MergeKeep") is False:
+            if index.add_path_spec(path_spec, merge_strategy="MergeKeep") is False:
                 print("Config did not add element %s" % path_spec)
                 return False
             return True
         print("roslocate did not return anything")
         return False
 
-    ver = get_ros_stack_version()
-    distro = rosversion_to_distro_name(ver)
-    if _add_stack(config, stackname, distro, released) is False:
+    distro = get_ros_distro_name(config)
+    index = StackElementIndex(config)
+    if _add_stack(index, stackname, distro, released) is False:
         return False
 
     if recurse:
-        deps = get_dependent_stacks(stackname)
+        deps = get_dependent_stacks(stackname, config)
         # Also switch anything that depends on this stack
         for stack in deps:
-            _add_stack(config, stack, distro=distro, released=released)
+            _add_stack(index, stack, distro=distro, released=released)
     return True
 
 
-def cmd_delete_stack(config, stackname, delete=False, recurse=False):
+def cmd_delete_stack(config, stackname, delete=False, recurse=False,
+                     background=False):
     """
     Attempts to get ROS stack from source if it is not already in config.
     Attempts the same for all stacks it depents, if recurse is given.
@@ -215,28 +398,33 @@ def cmd_delete_stack(config, stackname, delete=False, recurse=False):
 
     :param released: use the released or the dev version
     :param recurse: also get dependant version
+    :param background: with delete, move working copies to the trash of
+      the workspace instead of deleting them, see reap_trash
     :returns: True if stack has been added
     """
-    def _del_stack(config, stackname, delete=False):
-        stack_element = get_stack_element_in_config(config, stackname)
+    def _del_stack(index, stackname, delete=False):
+        stack_element = index.get_stack_element(stackname)
         if stack_element is None:
             print("stack not in config: %s " % stackname)
             return False
-        config.remove_element(stack_element.get_local_name())
+        index.remove_element(stack_element.get_local_name())
         if delete:
             # TODO confirm each delete
-            shutil.rmtree(os.path.join(config.base_path, stackname),
-                          ignore_errors=True)
+            path = os.path.join(config.base_path, stackname)
+            if not (background and os.path.lexists(path) and
+                    move_to_trash(config.get_base_path(), path)):
+                shutil.rmtree(path, ignore_errors=True)
         return True
 
-    if _del_stack(config, stackname, delete) is False:
+    index = StackElementIndex(config)
+    if _del_stack(index, stackname, delete) is False:
         return False
 
     if recurse:
-        deps = get_dependent_stacks(stackname)
+        deps = get_dependent_stacks(stackname, config)
         # Also switch anything that depends on this stack
         for stack in deps:
-            _del_stack(config, stack, delete)
+            _del_stack(index, stack, delete)
     return True
 
 
@@ -272,6 +460,9 @@ class RosWsStacksCLI():
                           default='',
                           help="backup the local copy of a directory before changing uri to this directory.",
                           action="store")
+        parser.add_option("-j", "--parallel", dest="jobs", default=1,
+                          help="How many parallel threads to use for installing",
+                          action="store")
         (options, args) = parser.parse_args(argv)
         mode = 'prompt'
         if options.delete_changed:
@@ -300,17 +491,30 @@ class RosWsStacksCLI():
         stack = args[0]
         config = get_config(
             target_path, [], config_filename=self.config_filename)
+        # working copies left by delete-stack --background
+        reap_trash(config.get_base_path(), background=True)
+        old_specs = dict([(element.get_local_name(),
+                           element.get_path_spec().get_legacy_yaml())
+                          for element in config.get_config_elements()])
         if cmd_add_stack(config,
                          stack,
                          released=options.released,
                          recurse=(not options.norecurse)) is True:
             cmd_persist_config(config, self.config_filename)
-            # install or update each element
+            # install only the added elements, the others are unchanged
+            added = [element.get_local_name()
+                     for element in config.get_config_elements()
+                     if old_specs.get(element.get_local_name()) !=
+                     element.get_path_spec().get_legacy_yaml()]
+            if not added:
+                return 0
             install_success = cmd_install_or_update(
                 config,
                 backup_path=options.backup_changed,
                 mode=mode,
-                robust=options.robust)
+                robust=options.robust,
+                localnames=added,
+                num_threads=int(options.jobs))
             if install_success:
                 return 0
         return 1
@@ -327,7 +531,13 @@ class RosWsStacksCLI():
                           default=False,
                           help="when deleting a stack from the configuration, also delete the working copy (DANGEROUS!)",
                           action="store_true")
+        parser.add_option("--background", dest="background",
+                          default=False,
+                          help="with -d, move working copies to the trash of the workspace and delete them in a background process",
+                          action="store_true")
         (options, args) = parser.parse_args(argv)
+        if options.background and not options.delete:
+            parser.error("--background requires --delete-working-copies")
 
         if len(args) < 1:
             print("Error: Too few arguments.")
@@ -343,8 +553,11 @@ class RosWsStacksCLI():
         if cmd_delete_stack(config,
                             uri,
                             delete=options.delete,
-                            recurse=(not options.norecurse)):
+                            recurse=(not options.norecurse),
+                            background=options.background):
             cmd_persist_config(config, self.config_filename)
+            if options.background:
+                reap_trash(config.get_base_path(), background=True)
             return 0
         return 1
 
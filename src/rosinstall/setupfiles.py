@@ -33,7 +33,13 @@
 import os
 import rosinstall.__version__
 
-from rosinstall.helpers import ROSInstallException, get_ros_stack_path
+from wstool.config_elements import SetupConfigElement
+from rosinstall.helpers import ROSINSTALL_FILENAME, ROSInstallException, get_ros_stack_path, \
+    get_workspace_state_path, shell_quote, write_if_changed, \
+    WORKSPACE_STATE_DIRNAME
+
+# pure shell file with the parsed .rosinstall, see generate_setup_cache
+SETUP_CACHE_FILENAME = 'setup_cache.sh'
 
 # template for catkin fuerte, not valid for Groovy and beyond, to be
 # removed once fuerte goes out of support
@@ -150,6 +156,64 @@ if y is not None:
   print(output)"""
 
 
+def generate_setup_cache_text(config):
+    """
+    Generates a shell file defining the same values the embedded
+    python code computes from .rosinstall, so that setup.sh does not
+    need to run python when sourced.
+
+    :returns: shell code, None if the config contains entries the
+      embedded python code would report as errors
+    """
+    workspace_path = config.get_base_path()
+    paths = []
+    setupfile_paths = []
+    for element in config.get_config_elements():
+        path = os.path.join(workspace_path, element.get_local_name())
+        if isinstance(element, SetupConfigElement):
+            if not os.path.isfile(path):
+                return None
+            setupfile_paths.append(path)
+        else:
+            if os.path.isfile(path):
+                return None
+            paths.append(os.path.normpath(path))
+    return """%(header)s
+_ROS_PACKAGE_PATH_ROSINSTALL_NEW=%(rpp)s
+_SETUPFILES_ROSINSTALL_NEW=%(setupfiles)s
+""" % {'header': SHELL_HEADER,
+       'rpp': shell_quote(':'.join(reversed(paths))),
+       'setupfiles': shell_quote(':'.join(setupfile_paths))}
+
+
+def generate_setup_cache(config):
+    """
+    Writes the setup.sh cache for the config, which must match the
+    .rosinstall file of the workspace.  setup.sh uses the cache unless
+    .rosinstall is newer. Removes an outdated cache if the config
+    cannot be cached.
+
+    :returns: path of the cache file if it was written, else None
+    """
+    cache_path = get_workspace_state_path(config.get_base_path(),
+                                          SETUP_CACHE_FILENAME)
+    text = generate_setup_cache_text(config)
+    if text is None:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        return None
+    if not os.path.isdir(os.path.dirname(cache_path)):
+        os.makedirs(os.path.dirname(cache_path))
+    if write_if_changed(cache_path, text):
+        return cache_path
+    # same content, but must not be older than a rewritten .rosinstall
+    rosinstall_path = os.path.join(config.get_base_path(), ROSINSTALL_FILENAME)
+    if (os.path.isfile(rosinstall_path) and
+            os.path.getmtime(rosinstall_path) >= os.path.getmtime(cache_path)):
+        os.utime(cache_path, None)
+    return None
+
+
 def generate_setup_sh_text(workspacepath):
     '''
     generates the string that goes into setup.sh.
@@ -189,25 +253,38 @@ unset ROS_ROOT
 
 unset _SETUP_SH_ERROR
 
-# python script to read .rosinstall even when rosinstall is not installed
-# this files parses the .rosinstall and sets environment variables accordingly
 # The ROS_PACKAGE_PATH contains all elements in reversed order (for historic reasons)
-
-# We store into _PARSED_CONFIG the result of python code,
-# which is the ros_package_path and the list of setup_files to source
-# Using python here to benefit of the pyyaml library
-export _PARSED_CONFIG=`/usr/bin/env python << EOPYTHON
+# _ROS_PACKAGE_PATH_ROSINSTALL_NEW gets the ros_package_path and
+# _SETUPFILES_ROSINSTALL_NEW the list of setup_files to source
+# The cache generated by rosws/rosinstall is used unless .rosinstall changed since
+_SETUP_CACHE_ROSINSTALL="$ROS_WORKSPACE/%(cachepath)s"
+if [ -f "$_SETUP_CACHE_ROSINSTALL" -a -f "$ROS_WORKSPACE/.rosinstall" ] && \
+   [ ! "$ROS_WORKSPACE/.rosinstall" -nt "$_SETUP_CACHE_ROSINSTALL" ]; then
+  . "$_SETUP_CACHE_ROSINSTALL"
+else
+  # python script to read .rosinstall even when rosinstall is not installed
+  # this files parses the .rosinstall and sets environment variables accordingly
+
+  # We store into _PARSED_CONFIG the result of python code,
+  # Using python here to benefit of the pyyaml library
+  _PARSED_CONFIG=`/usr/bin/env python << EOPYTHON
 
 %(pycode)s
 EOPYTHON`
 
-if [ x"$_PARSED_CONFIG" = x"ERROR" ]; then
-  echo 'Could not parse .rosinstall file' 1<&2
-  _SETUP_SH_ERROR=1
+  if [ x"$_PARSED_CONFIG" = x"ERROR" ]; then
+    echo 'Could not parse .rosinstall file' 1<&2
+    _SETUP_SH_ERROR=1
+    _PARSED_CONFIG=
+  fi
+
+  # split up ros_package_path and setupfile results
+  _ROS_PACKAGE_PATH_ROSINSTALL_NEW=${_PARSED_CONFIG%%%%ROSINSTALL_PATH_SETUPFILE_SEPARATOR*}
+  _SETUPFILES_ROSINSTALL_NEW=${_PARSED_CONFIG#*ROSINSTALL_PATH_SETUPFILE_SEPARATOR}
+  unset _PARSED_CONFIG
 fi
+unset _SETUP_CACHE_ROSINSTALL
 
-# using sed to split up ros_package_path and setupfile results
-_ROS_PACKAGE_PATH_ROSINSTALL_NEW=`echo "$_PARSED_CONFIG" | sed 's,\(.*\)ROSINSTALL_PATH_SETUPFILE_SEPARATOR\(.*\),\\1,'`
 if [ ! -z "$_ROS_PACKAGE_PATH_ROSINSTALL_NEW" ]; then
   if [ ! -z "$_ROS_PACKAGE_PATH_ROSINSTALL" ]; then
     export _ROS_PACKAGE_PATH_ROSINSTALL=$_ROS_PACKAGE_PATH_ROSINSTALL:$_ROS_PACKAGE_PATH_ROSINSTALL_NEW
@@ -215,8 +292,8 @@ if [ ! -z "$_ROS_PACKAGE_PATH_ROSINSTALL_NEW" ]; then
     export _ROS_PACKAGE_PATH_ROSINSTALL=$_ROS_PACKAGE_PATH_ROSINSTALL_NEW
   fi
 fi
+unset _ROS_PACKAGE_PATH_ROSINSTALL_NEW
 
-_SETUPFILES_ROSINSTALL_NEW=`echo "$_PARSED_CONFIG" | sed 's,\(.*\)'ROSINSTALL_PATH_SETUPFILE_SEPARATOR'\(.*\),\\2,'`
 if [ ! -z "$_SETUPFILES_ROSINSTALL_NEW" ]; then
   if [ ! -z "$_SETUPFILES_ROSINSTALL" ]; then
     _SETUPFILES_ROSINSTALL=$_SETUPFILES_ROSINSTALL_NEW:$_SETUPFILES_ROSINSTALL
@@ -224,16 +301,19 @@ if [ ! -z "$_SETUPFILES_ROSINSTALL_NEW" ]; then
     _SETUPFILES_ROSINSTALL=$_SETUPFILES_ROSINSTALL_NEW
   fi
 fi
-unset _PARSED_CONFIG
+unset _SETUPFILES_ROSINSTALL_NEW
 
 # colon separates entries
-_LOOP_SETUP_FILE=`echo $_SETUPFILES_ROSINSTALL | sed 's,\([^:]*\)[:]\(.*\),\\1,'`
+_LOOP_SETUP_FILE=${_SETUPFILES_ROSINSTALL%%%%:*}
 # this loop does fake recursion, as the called setup.sh may work on
 # the remaining elements in the _SETUPFILES_ROSINSTALL stack
 while [ ! -z "$_LOOP_SETUP_FILE" ]
 do
   # need to pop from stack before recursing, as chained setup.sh might rely on this
-  _SETUPFILES_ROSINSTALL=`echo $_SETUPFILES_ROSINSTALL | sed 's,\([^:]*[:]*\),,'`
+  case "$_SETUPFILES_ROSINSTALL" in
+    *:*) _SETUPFILES_ROSINSTALL=${_SETUPFILES_ROSINSTALL#*:} ;;
+    *) _SETUPFILES_ROSINSTALL= ;;
+  esac
   if [ -f "$_LOOP_SETUP_FILE" ]; then
     _ROSINSTALL_IN_RECURSION=recurse
     . $_LOOP_SETUP_FILE
@@ -241,7 +321,7 @@ do
   else
     echo warn: no such file : "$_LOOP_SETUP_FILE"
   fi
-  _LOOP_SETUP_FILE=`echo $_SETUPFILES_ROSINSTALL | sed 's,\([^:]*\)[:]\(.*\),\\1,'`
+  _LOOP_SETUP_FILE=${_SETUPFILES_ROSINSTALL%%%%:*}
 done
 
 unset _LOOP_SETUP_FILE
@@ -249,19 +329,30 @@ unset _SETUPFILES_ROSINSTALL
 
 # prepend elements from .rosinstall file to ROS_PACKAGE_PATH
 # ignoring duplicates entries from value set by setup files
-export ROS_PACKAGE_PATH=`/usr/bin/env python << EOPYTHON
-import os
-ros_package_path = os.environ.get('ROS_PACKAGE_PATH', '')
-original_elements = ros_package_path.split(':')
-ros_package_path2 = os.environ.get('_ROS_PACKAGE_PATH_ROSINSTALL', '')
-new_elements = ros_package_path2.split(':')
-new_elements = [path for path in new_elements if path]
-
-for original_path in original_elements:
-  if original_path and original_path not in new_elements:
-    new_elements.append(original_path)
-print(':'.join(new_elements))
-EOPYTHON`
+_ROSINSTALL_RPP=
+_ROSINSTALL_REST="$_ROS_PACKAGE_PATH_ROSINSTALL:"
+while [ ! -z "$_ROSINSTALL_REST" ]
+do
+  _ROSINSTALL_ELEM=${_ROSINSTALL_REST%%%%:*}
+  _ROSINSTALL_REST=${_ROSINSTALL_REST#*:}
+  if [ ! -z "$_ROSINSTALL_ELEM" ]; then
+    _ROSINSTALL_RPP=${_ROSINSTALL_RPP:+$_ROSINSTALL_RPP:}$_ROSINSTALL_ELEM
+  fi
+done
+_ROSINSTALL_REST="$ROS_PACKAGE_PATH:"
+while [ ! -z "$_ROSINSTALL_REST" ]
+do
+  _ROSINSTALL_ELEM=${_ROSINSTALL_REST%%%%:*}
+  _ROSINSTALL_REST=${_ROSINSTALL_REST#*:}
+  if [ ! -z "$_ROSINSTALL_ELEM" ]; then
+    case ":$_ROSINSTALL_RPP:" in
+      *:"$_ROSINSTALL_ELEM":*) ;;
+      *) _ROSINSTALL_RPP=${_ROSINSTALL_RPP:+$_ROSINSTALL_RPP:}$_ROSINSTALL_ELEM ;;
+    esac
+  fi
+done
+export ROS_PACKAGE_PATH=$_ROSINSTALL_RPP
+unset _ROSINSTALL_RPP
 
 unset _ROS_PACKAGE_PATH_ROSINSTALL
 
@@ -271,30 +362,28 @@ export ROS_WORKSPACE=%(wspath)s
 # if setup.sh did not set ROS_ROOT (pre-fuerte)
 if [ -z "${ROS_ROOT}" ]; then
   # using ROS_ROOT now being in ROS_PACKAGE_PATH
-  export _ROS_ROOT_ROSINSTALL=`/usr/bin/env python << EOPYTHON
-import sys, os;
-if 'ROS_PACKAGE_PATH' in os.environ:
-  pkg_path = os.environ['ROS_PACKAGE_PATH']
-  for path in pkg_path.split(':'):
-    if (os.path.basename(path) == 'ros'
-        and os.path.isfile(os.path.join(path, 'stack.xml'))):
-      print(path)
+  _ROSINSTALL_REST="$ROS_PACKAGE_PATH:"
+  while [ ! -z "$_ROSINSTALL_REST" ]
+  do
+    _ROSINSTALL_ELEM=${_ROSINSTALL_REST%%%%:*}
+    _ROSINSTALL_REST=${_ROSINSTALL_REST#*:}
+    if [ x"${_ROSINSTALL_ELEM##*/}" = x"ros" -a -f "$_ROSINSTALL_ELEM/stack.xml" ]; then
+      export ROS_ROOT=$_ROSINSTALL_ELEM
+      export PATH=$ROS_ROOT/bin:$PATH
+      export PYTHONPATH=$ROS_ROOT/core/roslib/src:$PYTHONPATH
       break
-EOPYTHON`
-
-  if [ ! -z "${_ROS_ROOT_ROSINSTALL}" ]; then
-    export ROS_ROOT=$_ROS_ROOT_ROSINSTALL
-    export PATH=$ROS_ROOT/bin:$PATH
-    export PYTHONPATH=$ROS_ROOT/core/roslib/src:$PYTHONPATH
-  fi
-unset _ROS_ROOT_ROSINSTALL
+    fi
+  done
 fi
+unset _ROSINSTALL_REST
+unset _ROSINSTALL_ELEM
 
 if [ ! -z "$_SETUP_SH_ERROR" ]; then
   # return failure code when sourcing file
   false
 fi
-""" % {'header': SHELL_HEADER, 'wspath': workspacepath, 'pycode': pycode}
+""" % {'header': SHELL_HEADER, 'wspath': workspacepath, 'pycode': pycode,
+       'cachepath': os.path.join(WORKSPACE_STATE_DIRNAME, SETUP_CACHE_FILENAME)}
 
     return text
 
@@ -379,6 +468,14 @@ fi
 
 
 def generate_setup(config, no_ros_allowed=False):
+    """
+    Generates setup.sh, setup.bash, setup.zsh and the setup.sh cache,
+    files with unchanged content are not rewritten.
+
+    :param no_ros_allowed: if False, raise ROSInstallException if no
+      ros stack is found in config
+    :returns: list of paths of the files that were written
+    """
     ros_root = get_ros_stack_path(config)
     if ros_root is None:
         if not no_ros_allowed:
@@ -392,13 +489,19 @@ Please add the location of a ros distribution to this command.
 
 See http://ros.org/wiki/rosinstall.""" % (candidates))
 
+    written = []
     text = generate_setup_sh_text(workspacepath=config.get_base_path())
     setup_path = os.path.join(config.get_base_path(), 'setup.sh')
-    with open(setup_path, 'w') as fhand:
-        fhand.write(text)
+    if write_if_changed(setup_path, text):
+        written.append(setup_path)
 
     for shell in ['bash', 'zsh']:
         text = generate_setup_bash_text(shell)
         setup_path = os.path.join(config.get_base_path(), 'setup.%s' % shell)
-        with open(setup_path, 'w') as fhand:
-            fhand.write(text)
+        if write_if_changed(setup_path, text):
+            written.append(setup_path)
+
+    cache_path = generate_setup_cache(config)
+    if cache_path is not None:
+        written.append(cache_path)
+    return written
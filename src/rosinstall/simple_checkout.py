@@ -30,28 +30,124 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+from __future__ import print_function
+
+import os
 import sys
+import subprocess
 import vcstools
+from wstool.common import MultiProjectException
 from wstool.config_yaml import get_path_spec_from_yaml
 
+from rosinstall.parallel import iter_parallel
+from rosinstall.git_mirror import mirrored_git, get_git_uris
+
 
-def checkout_rosinstall(rosinstall_data, verbose=False, shallow=False):
+def _add_worktree(repo_path, path_spec):
+    """
+    Creates the path of path_spec as detached git worktree of the
+    clone at repo_path, at the version of path_spec.
+    """
+    version = path_spec.get_version() or 'HEAD'
+    with open(os.devnull, 'w') as devnull:
+        # remote branches have no local branch in the clone
+        for revision in [version, 'origin/%s' % version]:
+            if subprocess.call(['git', 'rev-parse', '-q', '--verify',
+                                '%s^{commit}' % revision],
+                               cwd=repo_path, stdout=devnull, stderr=devnull) == 0:
+                subprocess.check_call(['git', 'worktree', 'add', '-q', '--detach',
+                                       os.path.abspath(path_spec.get_path()), revision],
+                                      cwd=repo_path, stdout=devnull)
+                return
+    raise MultiProjectException("version %s not found in %s" %
+                                (version, path_spec.get_uri()))
+
+
+def _group_path_specs(path_specs, share_clones):
+    """
+    :returns: list of lists of path specs, git entries with the same uri
+      share a group if share_clones is True, other entries are alone
     """
+    groups = []
+    by_uri = {}
+    for path_spec in path_specs:
+        if share_clones and path_spec.get_scmtype() == 'git':
+            if path_spec.get_uri() in by_uri:
+                by_uri[path_spec.get_uri()].append(path_spec)
+                continue
+            by_uri[path_spec.get_uri()] = [path_spec]
+            groups.append(by_uri[path_spec.get_uri()])
+        else:
+            groups.append([path_spec])
+    return groups
+
+
+def checkout_rosinstall(rosinstall_data, verbose=False, shallow=False, jobs=1,
+                        share_clones=False):
+    """
+    Checks out all entries, up to jobs entries at the same time. A
+    failing entry does not stop the other checkouts, failures are
+    reported once all entries have been processed.
+
     :param rosinstall_data: yaml dict in rosinstall format
     :param verbose: verbose output
     :param shallow: hint to use shallow checkout
-    :raises: rosinstall.common.MultiProjectException for incvalid yaml
+    :param jobs: how many entries to check out in parallel
+    :param share_clones: clone git repositories used by several entries
+      (like the packages of a release repository) only once, the other
+      entries become worktrees of that clone
+    :raises: rosinstall.common.MultiProjectException for incvalid yaml,
+      or if any checkout failed
     """
-    for frag in rosinstall_data:
-        path_spec = get_path_spec_from_yaml(frag)
-        if verbose:
-            print(path_spec.get_scmtype(),
-                  path_spec.get_path(),
-                  path_spec.get_uri(),
-                  path_spec.get_version())
+    # parse all entries first so that invalid input fails before any checkout
+    path_specs = [get_path_spec_from_yaml(frag) for frag in rosinstall_data]
 
+    def _checkout(path_spec):
         vcs_client = vcstools.get_vcs_client(path_spec.get_scmtype(),
                                              path_spec.get_path())
-        vcs_client.checkout(path_spec.get_uri(),
-                            path_spec.get_version(),
-                            shallow=shallow)
+        if vcs_client.checkout(path_spec.get_uri(),
+                               path_spec.get_version(),
+                               shallow=shallow) is False:
+            raise MultiProjectException("checkout of %s failed" %
+                                        path_spec.get_uri())
+
+    def _checkout_group(group):
+        """:returns: list of (path_spec, error) of the group"""
+        try:
+            _checkout(group[0])
+        except Exception as exc:
+            return [(path_spec, exc) for path_spec in group]
+        results = [(group[0], None)]
+        for path_spec in group[1:]:
+            try:
+                _add_worktree(group[0].get_path(), path_spec)
+                results.append((path_spec, None))
+            except Exception as exc:
+                results.append((path_spec, exc))
+        return results
+
+    # worktrees need the full history
+    groups = _group_path_specs(path_specs, share_clones and not shallow)
+    failures = []
+    with mirrored_git(get_git_uris(path_specs)):
+        # results arrive in completion order, printing only happens here
+        for _, group, results, group_error in iter_parallel(_checkout_group, groups,
+                                                            jobs=jobs):
+            if group_error is not None:
+                results = [(path_spec, group_error) for path_spec in group]
+            for path_spec, error in results:
+                if verbose:
+                    print(path_spec.get_scmtype(),
+                          path_spec.get_path(),
+                          path_spec.get_uri(),
+                          path_spec.get_version())
+                if error is not None:
+                    sys.stderr.write("Failed to checkout %s: %s\n" %
+                                     (path_spec.get_path(), error))
+                    failures.append((path_spec, error))
+            sys.stdout.flush()
+    if failures:
+        raise MultiProjectException(
+            "%d of %d checkouts failed: %s" %
+            (len(failures), len(path_specs),
+             ", ".join([spec.get_path() for spec, _ in failures])))
@@ -0,0 +1,251 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2010, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Cache for the per-entry output of wstool's cmd_info, stored in the
+workspace state directory. The slow part of 'rosws info' is running
+several SCM commands for each entry. The revisions and uris of an
+entry are answered from the cache as long as the fingerprint of its
+SCM metadata (HEAD, refs, index, config) and its .rosinstall spec did
+not change, for at most ROSINSTALL_STATUS_CACHE_TTL seconds.
+
+Whether an entry is modified depends on the working tree, which the
+fingerprint does not cover, so it is never cached: it is evaluated
+with a single status command per entry on every call.
+"""
+
+import os
+import json
+import time
+
+from wstool.common import select_elements
+from wstool.multiproject_cmd import cmd_info
+
+from rosinstall.git_refs import get_git_dir
+from rosinstall.parallel import iter_parallel
+from rosinstall.helpers import get_workspace_state_path, write_if_changed
+
+STATUS_CACHE_FILENAME = 'status_cache.json'
+DEFAULT_STATUS_CACHE_TTL = 600
+
+# metadata files which change whenever the state reported by info changes
+_SCM_METADATA = {
+    'git': ['HEAD', 'index', 'config', 'packed-refs'],
+    'hg': ['dirstate', 'branch', 'bookmarks', 'bookmarks.current', 'hgrc'],
+    'svn': ['wc.db', 'entries'],
+    'bzr': ['checkout/dirstate', 'branch/last-revision', 'branch/branch.conf'],
+}
+
+
+def _stat_files(base, names):
+    result = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(base, name))
+        except OSError:
+            continue
+        result.append([name, stat.st_mtime, stat.st_size])
+    return result
+
+
+def get_scm_fingerprint(path, scmtype):
+    """
+    :returns: list of [file, mtime, size] of the SCM metadata of the
+      checkout at path, None if unknown or not a checkout
+    """
+    if scmtype not in _SCM_METADATA or not os.path.isdir(path):
+        return None
+    if scmtype == 'git':
+        meta_dir = get_git_dir(path)
+        if meta_dir is None:
+            return None
+        names = list(_SCM_METADATA['git'])
+        try:
+            with open(os.path.join(meta_dir, 'HEAD'), 'r') as fhand:
+                head = fhand.read().strip()
+        except (IOError, OSError):
+            return None
+        if head.startswith('ref:'):
+            names.append(head[len('ref:'):].strip())
+        # remote refs change with fetch, which changes remote_revision
+        remote_refs = os.path.join(meta_dir, 'refs', 'remotes')
+        for dirpath, _, filenames in os.walk(remote_refs):
+            for filename in filenames:
+                names.append(os.path.relpath(os.path.join(dirpath, filename), meta_dir))
+    else:
+        meta_dir = os.path.join(path, '.%s' % scmtype)
+        if not os.path.isdir(meta_dir):
+            return None
+        names = _SCM_METADATA[scmtype]
+    fingerprint = _stat_files(meta_dir, names)
+    if not fingerprint:
+        return None
+    return fingerprint
+
+
+def _get_element_key(element, base_path, untracked):
+    """:returns: json compatible key for the cached state, None if not cacheable"""
+    path = element.get_path() or os.path.join(base_path, element.get_local_name())
+    if not element.is_vcs_element():
+        # info only checks whether the path exists
+        return [None, path, os.path.exists(path)]
+    spec = element.get_path_spec()
+    fingerprint = get_scm_fingerprint(path, spec.get_scmtype())
+    if fingerprint is None:
+        return None
+    return [spec.get_scmtype(), spec.get_uri(), spec.get_version(),
+            path, bool(untracked), fingerprint]
+
+
+class StatusCache(object):
+    """
+    json file mapping localnames to their key and cmd_info output
+    """
+
+    def __init__(self, base_path, ttl=None):
+        self.path = get_workspace_state_path(base_path, STATUS_CACHE_FILENAME)
+        if ttl is None:
+            ttl = float(os.environ.get('ROSINSTALL_STATUS_CACHE_TTL',
+                                       DEFAULT_STATUS_CACHE_TTL))
+        self.ttl = ttl
+        self.entries = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r') as fhand:
+                    self.entries = json.load(fhand)
+            except ValueError:
+                self.entries = {}
+
+    def get(self, localname, key):
+        """:returns: cached info dict, None if missing, changed or expired"""
+        entry = self.entries.get(localname)
+        if (entry is None or key is None or entry['key'] != key or
+                time.time() - entry['cached'] > self.ttl):
+            return None
+        return dict(entry['info'])
+
+    def put(self, localname, key, info):
+        if key is None:
+            self.entries.pop(localname, None)
+            return
+        info = dict(info)
+        info.pop('entry', None)
+        info.pop('properties', None)
+        # depends on the working tree, see module docstring
+        info.pop('modified', None)
+        self.entries[localname] = {'key': key,
+                                   'cached': time.time(),
+                                   'info': info}
+
+    def update_key(self, localname, key):
+        """replaces the key of a cached entry, keeping its age"""
+        if key is None:
+            self.entries.pop(localname, None)
+        elif localname in self.entries:
+            self.entries[localname]['key'] = key
+
+    def save(self, localnames):
+        """writes the cache, dropping entries not in localnames"""
+        self.entries = dict([(name, entry) for name, entry in self.entries.items()
+                             if name in localnames])
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        write_if_changed(self.path, json.dumps(self.entries, sort_keys=True))
+
+
+def cached_cmd_info(config, localnames=None, untracked=False, fetch=False,
+                    refresh=False):
+    """
+    Like wstool.multiproject_cmd.cmd_info, but answers entries whose
+    SCM metadata did not change from the workspace status cache. The
+    modified flag of cached entries is evaluated again in any case.
+    Results obtained with fetch are neither read from nor stored in
+    the cache, as they depend on the remote.
+
+    :param refresh: if True, evaluate all entries and renew the cache
+    """
+    if fetch:
+        return cmd_info(config, localnames=localnames,
+                        untracked=untracked, fetch=fetch)
+    base_path = config.get_base_path()
+    cache = StatusCache(base_path)
+    if refresh or cache.ttl <= 0:
+        cache.entries = {}
+    elements = [element for element in select_elements(config, localnames)
+                if element.get_properties() is None or
+                'setup-file' not in element.get_properties()]
+    outputs = {}
+    missing = []
+    cached = []
+    for element in elements:
+        localname = element.get_local_name()
+        info = cache.get(localname,
+                         _get_element_key(element, base_path, untracked))
+        if info is None:
+            missing.append(localname)
+        else:
+            info['entry'] = element.get_path_spec()
+            info['properties'] = element.get_properties()
+            info['modified'] = ''
+            outputs[localname] = info
+            if element.is_vcs_element() and info['exists']:
+                cached.append(element)
+
+    def _get_status(element):
+        return element.get_status(base_path, untracked)
+    for _, element, status, error in iter_parallel(_get_status, cached, jobs=-1):
+        if error is not None:
+            # let cmd_info report the problem
+            del outputs[element.get_local_name()]
+            missing.append(element.get_local_name())
+            continue
+        if status is not None and status.strip() != '':
+            outputs[element.get_local_name()]['modified'] = True
+        # status may have refreshed the git index
+        cache.update_key(element.get_local_name(),
+                         _get_element_key(element, base_path, untracked))
+    if missing:
+        by_localname = dict([(element.get_local_name(), element)
+                             for element in elements])
+        for info in cmd_info(config, localnames=missing,
+                             untracked=untracked, fetch=fetch):
+            localname = info['localname']
+            outputs[localname] = info
+            # scm commands may have refreshed metadata like the git index
+            cache.put(localname,
+                      _get_element_key(by_localname[localname], base_path, untracked),
+                      info)
+    if cache.ttl > 0:
+        cache.save([element.get_local_name()
+                    for element in config.get_config_elements()])
+    return [outputs[element.get_local_name()] for element in elements
+            if element.get_local_name() in outputs]
@@ -0,0 +1,135 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmark for package name lookups with get_release_info in rosdistro
+release files. Loading the release file is replaced by a generated
+release file, the linear scan is the lookup as it was before the
+package index.
+
+Run as::
+
+    PYTHONPATH=src python test/benchmarks/bench_distro_locate.py
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from rosinstall import distro_locate
+
+NUM_REPOS = 3000
+PACKAGES_PER_REPO = 5
+
+
+class FakeRepository(object):
+
+    def __init__(self, name, package_names):
+        self.name = name
+        self.url = 'https://example.com/%s.git' % name
+        self.package_names = package_names
+
+    def get_release_tag(self, pkg_name):
+        return 'release/%s/1.0.0' % pkg_name
+
+
+class FakeReleaseFile(object):
+
+    def __init__(self, name, num_repos, packages_per_repo):
+        self.name = name
+        self.repositories = {}
+        for i in range(num_repos):
+            repo_name = 'repo%d' % i
+            self.repositories[repo_name] = FakeRepository(
+                repo_name,
+                ['%s_pkg%d' % (repo_name, j) for j in range(packages_per_repo)])
+
+
+class FakeRospkgDistro(object):
+    """dry distro without stacks"""
+
+    def distro_uri(self, distro):
+        return distro
+
+    def load_distro(self, uri):
+        return self
+
+    def get_stacks(self, released=False):
+        return {}
+
+
+def _linear_find_repo(release_file, name):
+    """the lookup as it was before the package index"""
+    for r in release_file.repositories:
+        repo = release_file.repositories[r]
+        if name in repo.package_names:
+            return repo
+    return None
+
+
+def _time(func, names):
+    start = time.time()
+    for name in names:
+        func(name)
+    return time.time() - start
+
+
+def main(num_repos=NUM_REPOS, packages_per_repo=PACKAGES_PER_REPO):
+    # every 10th repository, last package
+    names = ['repo%d_pkg%d' % (i, packages_per_repo - 1)
+             for i in range(0, num_repos, 10)]
+
+    def get_distribution_file(index, distro):
+        # a new object on every load, like rosdistro
+        return FakeReleaseFile(distro, num_repos, packages_per_repo)
+    distro_locate.distro_cache.get_index = lambda url: None
+    distro_locate.distro_cache.get_distribution_file = get_distribution_file
+    distro_locate.rospkg_distro = FakeRospkgDistro()
+
+    release_file = get_distribution_file(None, 'bench')
+    linear = _time(lambda name: _linear_find_repo(release_file, name), names)
+    first = _time(lambda name: distro_locate.get_release_info(name, 'bench'), names[:1])
+    indexed = _time(lambda name: distro_locate.get_release_info(name, 'bench'), names)
+
+    print('%d repositories, %d packages, %d lookups' %
+          (num_repos, num_repos * packages_per_repo, len(names)))
+    print('linear scan:       %8.2f ms (%.3f ms per lookup)' %
+          (linear * 1000, linear * 1000 / len(names)))
+    print('first lookup:      %8.2f ms (loads and indexes the release file)' %
+          (first * 1000))
+    print('get_release_info:  %8.2f ms (%.4f ms per lookup)' %
+          (indexed * 1000, indexed * 1000 / len(names)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares looking up the rosinstall entries of a chain of 30 stacks, as
+'rosws add-stack' does for dependent stacks, by forking the roslocate
+script for each stack (as rosws did before) against the in-process
+rosws_stacks_cli.roslocate_info.
+
+Uses a generated rosdistro index with file:// urls, run as::
+
+    PYTHONPATH=src python test/benchmarks/bench_roslocate_info.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+import yaml
+
+NUM_STACKS = 30
+DISTRO = 'bench'
+PACKAGE_XML = ('<?xml version="1.0"?><package format="2"><name>%(name)s</name>'
+               '<version>1.0.0</version><description>%(name)s</description>'
+               '<maintainer email="maintainer@example.com">maintainer</maintainer>'
+               '<license>BSD</license></package>')
+
+
+def create_rosdistro(path, names):
+    """writes a rosdistro index with one repository per name to path"""
+    repositories = {}
+    for name in names:
+        repositories[name] = {
+            'release': {'packages': [name],
+                        'tags': {'release': 'release/%s/{package}/{version}' % DISTRO},
+                        'url': 'https://example.com/%s-release.git' % name,
+                        'version': '1.0.0-0'},
+            'source': {'type': 'git',
+                       'url': 'https://example.com/%s.git' % name,
+                       'version': 'master'},
+            'status': 'maintained'}
+    distribution = {'type': 'distribution', 'version': 2,
+                    'release_platforms': {'ubuntu': ['focal']},
+                    'repositories': repositories}
+    cache = {'type': 'cache', 'version': 2, 'name': DISTRO,
+             'distribution_file': [distribution],
+             'release_package_xmls': dict([(name, PACKAGE_XML % {'name': name})
+                                           for name in names]),
+             'source_repo_package_xmls': {}}
+    index = {'type': 'index', 'version': 4,
+             'distributions': {DISTRO: {
+                 'distribution': ['%s/distribution.yaml' % DISTRO],
+                 'distribution_cache': '%s-cache.yaml' % DISTRO,
+                 'distribution_status': 'active',
+                 'distribution_type': 'ros1',
+                 'python_version': 3}}}
+    os.makedirs(os.path.join(path, DISTRO))
+    for filename, data in [('index.yaml', index),
+                           (os.path.join(DISTRO, 'distribution.yaml'), distribution),
+                           ('%s-cache.yaml' % DISTRO, cache)]:
+        with open(os.path.join(path, filename), 'w') as fhand:
+            yaml.safe_dump(data, fhand)
+    return 'file://%s' % os.path.join(path, 'index.yaml')
+
+
+def main(num_stacks=NUM_STACKS):
+    root_path = tempfile.mkdtemp()
+    try:
+        names = ['stack%d' % i for i in range(num_stacks)]
+        os.environ['ROSDISTRO_INDEX_URL'] = create_rosdistro(
+            os.path.join(root_path, 'rosdistro'), names)
+        os.environ['ROSINSTALL_CACHE_DIR'] = os.path.join(root_path, 'cache')
+        roslocate = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)))), 'scripts', 'roslocate')
+
+        start = time.time()
+        forked = []
+        for name in names:
+            output = subprocess.check_output(
+                [sys.executable, roslocate, 'info', '--distro=%s' % DISTRO, name])
+            forked.append(yaml.safe_load(output))
+        fork_time = time.time() - start
+
+        from rosinstall.rosws_stacks_cli import roslocate_info
+        start = time.time()
+        in_process = [roslocate_info(name, DISTRO, False) for name in names]
+        in_process_time = time.time() - start
+
+        if forked != in_process:
+            print('results differ:\n%s\n%s' % (forked, in_process))
+            return 1
+        print('%d stacks' % num_stacks)
+        print('forking roslocate: %8.2f s' % fork_time)
+        print('in process:        %8.2f s' % in_process_time)
+    finally:
+        shutil.rmtree(root_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compares snapshots (rosinstall --generate-versioned-rosinstall, rosws
+info --yaml) of a workspace of git clones with wstool's cmd_snapshot,
+which runs git for every entry.
+
+Run as::
+
+    PYTHONPATH=src python test/benchmarks/bench_snapshot.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from wstool import multiproject_cmd
+
+from rosinstall import rosinstall_cmd
+
+NUM_REPOS = 300
+
+
+def main(num_repos=NUM_REPOS):
+    root_path = tempfile.mkdtemp()
+    try:
+        remote_path = os.path.join(root_path, 'remote')
+        subprocess.check_call(['git', 'init', '-q', remote_path])
+        subprocess.check_call(['git', '-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+                               'commit', '-q', '--allow-empty', '-m', 'initial'],
+                              cwd=remote_path)
+        ws_path = os.path.join(root_path, 'ws')
+        os.makedirs(ws_path)
+        with open(os.path.join(ws_path, '.rosinstall'), 'w') as fhand:
+            for i in range(num_repos):
+                name = 'repo%d' % i
+                subprocess.check_call(['git', 'clone', '-q', '--shared', remote_path, name],
+                                      cwd=ws_path)
+                fhand.write('- git: {local-name: %s, uri: %s}\n' % (name, remote_path))
+        config = multiproject_cmd.get_config(ws_path, [], config_filename='.rosinstall')
+
+        start = time.time()
+        expected = multiproject_cmd.cmd_snapshot(config)
+        wstool_time = time.time() - start
+        start = time.time()
+        result = rosinstall_cmd.cmd_snapshot(config)
+        metadata_time = time.time() - start
+        if expected != result:
+            print('snapshots differ')
+            return 1
+
+        print('%d git repositories' % num_repos)
+        print('wstool cmd_snapshot:   %8.2f s' % wstool_time)
+        print('rosinstall_cmd:        %8.2f s' % metadata_time)
+    finally:
+        shutil.rmtree(root_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmark for stack lookups in a large workspace config, as done by
+recursive 'rosws add-stack' and 'rosws delete-stack'.
+
+Run as::
+
+    PYTHONPATH=src python test/benchmarks/bench_stack_element_index.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from wstool.config import Config
+from wstool.config_yaml import PathSpec
+
+from rosinstall.rosws_stacks_cli import get_stack_element_in_config, \
+    StackElementIndex
+
+NUM_ENTRIES = 2000
+
+
+def main(num_entries=NUM_ENTRIES):
+    root_path = tempfile.mkdtemp()
+    try:
+        names = ['stack%d' % i for i in range(num_entries)]
+        for name in names[::2]:
+            os.makedirs(os.path.join(root_path, name))
+            with open(os.path.join(root_path, name, 'stack.xml'), 'w') as fhand:
+                fhand.write('<stack/>')
+        config = Config([PathSpec(name) for name in names], root_path, None)
+        # every stack once, as a recursive add over all stacks would
+        lookups = names + ['unknown%d' % i for i in range(num_entries // 10)]
+
+        start = time.time()
+        linear = [get_stack_element_in_config(config, name) for name in lookups]
+        linear_time = time.time() - start
+
+        start = time.time()
+        index = StackElementIndex(config)
+        build_time = time.time() - start
+        start = time.time()
+        indexed = [index.get_stack_element(name) for name in lookups]
+        indexed_time = time.time() - start
+        assert linear == indexed
+
+        print('%d entries, %d lookups' % (num_entries, len(lookups)))
+        print('linear scan:  %8.2f ms' % (linear_time * 1000))
+        print('index build:  %8.2f ms' % (build_time * 1000))
+        print('index lookup: %8.2f ms' % (indexed_time * 1000))
+    finally:
+        shutil.rmtree(root_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Times the core commands of rosinstall and rosws on generated local
+workspaces of git clones, entirely offline, and writes the results as
+JSON so that runs of different commits can be compared.
+
+Run as::
+
+    PYTHONPATH=src python test/benchmarks/bench_workspace.py --sizes 10,100 -o results.json
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+SIZES = [10, 100, 1000]
+OVERLAY_DEPTHS = [1, 2, 4]
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _script(name):
+    return [sys.executable, os.path.join(ROOT_PATH, 'scripts', name)]
+
+
+def _create_remote(path):
+    subprocess.check_call(['git', 'init', '-q', path])
+    with open(os.path.join(path, 'file.txt'), 'w') as fhand:
+        fhand.write('content\n')
+    subprocess.check_call(['git', 'add', 'file.txt'], cwd=path)
+    subprocess.check_call(['git', 'commit', '-q', '-m', 'initial'], cwd=path)
+
+
+def _create_fake_ros(path):
+    """a directory rosinstall accepts as ros stack, as in scm_test_base"""
+    os.makedirs(os.path.join(path, 'bin'))
+    with open(os.path.join(path, 'stack.xml'), 'w') as fhand:
+        fhand.write('<stack></stack>')
+    for name in ['rosmake', 'rospack']:
+        with open(os.path.join(path, 'bin', name), 'w') as fhand:
+            fhand.write('#!/usr/bin/env sh\n')
+        os.chmod(os.path.join(path, 'bin', name), 0o755)
+
+
+class Benchmark(object):
+
+    def __init__(self, root_path, jobs, env):
+        self.root_path = root_path
+        self.jobs = jobs
+        self.env = env
+        self.results = []
+
+    def run(self, name, size, cmd, **kwargs):
+        """runs cmd once and records its wall time"""
+        start = time.time()
+        with open(os.devnull, 'w') as devnull:
+            returncode = subprocess.call(cmd, stdout=devnull, stderr=devnull,
+                                         env=self.env, **kwargs)
+        seconds = time.time() - start
+        self.results.append({'benchmark': name,
+                             'repos': size,
+                             'seconds': round(seconds, 4),
+                             'returncode': returncode})
+        # stdout is reserved for the report
+        sys.stderr.write('%-24s %6d repos %10.3f s%s\n' %
+                         (name, size, seconds,
+                          '' if returncode == 0 else ' (exit %d)' % returncode))
+
+    def run_size(self, size):
+        base_path = os.path.join(self.root_path, 'size%d' % size)
+        remote_path = os.path.join(base_path, 'remote')
+        ros_path = os.path.join(base_path, 'ros')
+        ws_path = os.path.join(base_path, 'ws')
+        os.makedirs(base_path)
+        _create_remote(remote_path)
+        _create_fake_ros(ros_path)
+        rosinstall_file = os.path.join(base_path, 'workspace.rosinstall')
+        with open(rosinstall_file, 'w') as fhand:
+            fhand.write('- other: {local-name: %s}\n' % ros_path)
+            for i in range(size):
+                fhand.write('- git: {local-name: repo%d, uri: %s}\n' % (i, remote_path))
+
+        jobs = ['-j', str(self.jobs)]
+        rosco_path = os.path.join(base_path, 'rosco')
+        os.makedirs(rosco_path)
+        with open(os.path.join(base_path, 'rosco.rosinstall'), 'w') as fhand:
+            for i in range(size):
+                fhand.write('- git: {local-name: repo%d, uri: %s}\n' % (i, remote_path))
+        self.run('rosco_checkout', size,
+                 _script('rosco') + jobs + ['-r', os.path.join(base_path, 'rosco.rosinstall')],
+                 cwd=rosco_path)
+        self.run('rosinstall_checkout', size,
+                 _script('rosinstall') + ['-n'] + jobs + [ws_path, rosinstall_file])
+        self.run('rosinstall_noop_update', size,
+                 _script('rosinstall') + ['-n'] + jobs + [ws_path])
+        # a few modified entries for status and diff
+        for i in range(0, size, 10):
+            with open(os.path.join(ws_path, 'repo%d' % i, 'file.txt'), 'a') as fhand:
+                fhand.write('modified\n')
+        self.run('rosws_info', size, _script('rosws') + ['info', '-t', ws_path])
+        self.run('rosws_info_cached', size, _script('rosws') + ['info', '-t', ws_path])
+        self.run('rosws_status', size, _script('rosws') + ['status', '-t', ws_path])
+        self.run('rosws_diff', size, _script('rosws') + ['diff', '-t', ws_path])
+        self.run('rosws_regenerate', size, _script('rosws') + ['regenerate', '-t', ws_path])
+        self.run('snapshot', size, _script('rosws') + ['info', '--yaml', '-t', ws_path])
+
+        previous = ws_path
+        for depth in range(1, max(OVERLAY_DEPTHS) + 1):
+            overlay_path = os.path.join(base_path, 'overlay%d' % depth)
+            os.makedirs(os.path.join(overlay_path, 'src'))
+            with open(os.path.join(overlay_path, '.rosinstall'), 'w') as fhand:
+                fhand.write('- setup-file: {local-name: %s}\n'
+                            '- other: {local-name: src}\n' %
+                            os.path.join(previous, 'setup.sh'))
+            subprocess.check_call(_script('rosws') + ['regenerate', '-t', overlay_path],
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  env=self.env)
+            if depth in OVERLAY_DEPTHS:
+                self.run('source_setup_sh_depth%d' % depth, size,
+                         ['sh', '-c', '. %s' % os.path.join(overlay_path, 'setup.sh')])
+            previous = overlay_path
+
+
+def main(argv=None):
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("--sizes", dest="sizes", default=','.join([str(size) for size in SIZES]),
+                      help="comma separated numbers of git repositories per workspace")
+    parser.add_option("-j", "--parallel", dest="jobs", default=8,
+                      help="parallel jobs for rosinstall checkouts")
+    parser.add_option("-o", "--output", dest="output", default=None,
+                      help="write JSON results to this file instead of stdout")
+    (options, _) = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.join(ROOT_PATH, 'src')] +
+        [path for path in [env.get('PYTHONPATH')] if path])
+    env.pop('ROS_WORKSPACE', None)
+    for key, value in [('GIT_AUTHOR_NAME', 'bench'), ('GIT_COMMITTER_NAME', 'bench'),
+                       ('GIT_AUTHOR_EMAIL', 'bench@example.com'),
+                       ('GIT_COMMITTER_EMAIL', 'bench@example.com')]:
+        env.setdefault(key, value)
+        os.environ.setdefault(key, value)
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT_PATH,
+                                         stderr=subprocess.PIPE).decode('UTF-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    root_path = tempfile.mkdtemp()
+    benchmark = Benchmark(root_path, int(options.jobs), env)
+    try:
+        for size in [int(size) for size in options.sizes.split(',')]:
+            benchmark.run_size(size)
+    finally:
+        shutil.rmtree(root_path)
+
+    report = json.dumps({'commit': commit,
+                         'python': platform.python_version(),
+                         'platform': platform.platform(),
+                         'results': benchmark.results},
+                        indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as fhand:
+            fhand.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import gzip
+import time
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+try:
+    from urllib.error import HTTPError, URLError
+except ImportError:
+    from urllib2 import HTTPError, URLError
+
+import rosinstall.distro_cache
+from rosinstall.distro_cache import UrlCache
+
+
+class FakeResponse(object):
+
+    def __init__(self, data, headers):
+        self.data = data
+        self.headers = headers
+
+    def read(self):
+        return self.data
+
+    def info(self):
+        return self.headers
+
+
+class FakeServer(object):
+    """replaces urlopen, records requests"""
+
+    def __init__(self, data, etag='"v1"'):
+        self.data = data
+        self.etag = etag
+        self.requests = []
+        self.reachable = True
+
+    def __call__(self, request, timeout=None):
+        self.requests.append(request)
+        if not self.reachable:
+            raise URLError('no route to host')
+        if request.get_header('If-none-match') == self.etag:
+            raise HTTPError(request.get_full_url(), 304, 'Not Modified', {}, None)
+        return FakeResponse(self.data, {'ETag': self.etag})
+
+
+class UrlCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.url = 'http://example.com/index.yaml'
+        self.server = FakeServer(b'foo: [1, 2]\n')
+        self.original_urlopen = rosinstall.distro_cache.urlopen
+        rosinstall.distro_cache.urlopen = self.server
+
+    def tearDown(self):
+        rosinstall.distro_cache.urlopen = self.original_urlopen
+        shutil.rmtree(self.cache_dir)
+
+    def test_ttl(self):
+        cache = UrlCache(self.cache_dir, ttl=1000)
+        self.assertEqual(b'foo: [1, 2]\n', cache.load_url(self.url))
+        self.assertEqual(b'foo: [1, 2]\n', cache.load_url(self.url))
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_revalidate(self):
+        cache = UrlCache(self.cache_dir, ttl=0)
+        self.assertEqual({'foo': [1, 2]}, cache.load_yaml(self.url))
+        self.assertEqual({'foo': [1, 2]}, cache.load_yaml(self.url))
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual('"v1"', self.server.requests[1].get_header('If-none-match'))
+        # changed on server
+        self.server.data = b'foo: [3]\n'
+        self.server.etag = '"v2"'
+        self.assertEqual({'foo': [3]}, cache.load_yaml(self.url))
+
+    def test_offline(self):
+        cache = UrlCache(self.cache_dir, ttl=0)
+        cache.load_url(self.url)
+        self.server.reachable = False
+        # stale entry served when server is unreachable
+        self.assertEqual(b'foo: [1, 2]\n', cache.load_url(self.url))
+        cache.offline = True
+        self.assertEqual(b'foo: [1, 2]\n', cache.load_url(self.url))
+        self.assertEqual(2, len(self.server.requests))
+        self.assertRaises(IOError, cache.load_url, 'http://example.com/other.yaml')
+
+    def test_gz(self):
+        stream = BytesIO()
+        gz_file = gzip.GzipFile(fileobj=stream, mode='wb')
+        gz_file.write(b'bar: baz\n')
+        gz_file.close()
+        self.server.data = stream.getvalue()
+        cache = UrlCache(self.cache_dir, ttl=1000)
+        self.assertEqual({'bar': 'baz'},
+                         cache.load_yaml('http://example.com/cache.yaml.gz'))
+
+    def test_yaml_types(self):
+        self.server.data = b'1: one\n'
+        cache = UrlCache(self.cache_dir, ttl=1000)
+        self.assertEqual({1: 'one'}, cache.load_yaml(self.url))
+        self.assertEqual({1: 'one'}, cache.load_yaml(self.url))
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_parsed_cache(self):
+        original_yaml = rosinstall.distro_cache.yaml
+        parsed = []
+
+        class CountingYaml(object):
+
+            def load(self, data, Loader):
+                parsed.append(data)
+                return original_yaml.load(data, Loader=Loader)
+        rosinstall.distro_cache.yaml = CountingYaml()
+        try:
+            self.server.data = b'1: one\n'
+            cache = UrlCache(self.cache_dir, ttl=0)
+            self.assertEqual({1: 'one'}, cache.load_yaml(self.url))
+            # revalidated with 304, parsed document reused
+            self.assertEqual({1: 'one'}, UrlCache(self.cache_dir, ttl=0).load_yaml(self.url))
+            self.assertEqual(2, len(self.server.requests))
+            self.assertEqual(1, len(parsed))
+            # changed on server
+            self.server.data = b'2: two\n'
+            self.server.etag = '"v2"'
+            self.assertEqual({2: 'two'}, cache.load_yaml(self.url))
+            self.assertEqual({2: 'two'}, cache.load_yaml(self.url))
+            self.assertEqual(2, len(parsed))
+        finally:
+            rosinstall.distro_cache.yaml = original_yaml
+
+    def test_index_query(self):
+        self.server.data = b"""type: index
+version: 4
+distributions:
+  groovy:
+    distribution: [groovy/distribution.yaml]
+    distribution_cache: groovy-cache.yaml.gz
+    distribution_status: active
+    distribution_type: ros1
+    python_version: 2
+"""
+        original_cache = rosinstall.distro_cache._URL_CACHE
+        rosinstall.distro_cache._URL_CACHE = UrlCache(self.cache_dir, ttl=1000)
+        try:
+            index1 = rosinstall.distro_cache.get_index('http://example.com/index.yaml?token=1')
+            index2 = rosinstall.distro_cache.get_index('http://example.com/index.yaml?token=2')
+        finally:
+            rosinstall.distro_cache._URL_CACHE = original_cache
+        # urls differing in the query are cached separately
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual('http://example.com/groovy-cache.yaml.gz?token=1',
+                         index1.distributions['groovy']['distribution_cache'])
+        self.assertEqual('http://example.com/groovy-cache.yaml.gz?token=2',
+                         index2.distributions['groovy']['distribution_cache'])
+
+    def test_evict(self):
+        cache = UrlCache(self.cache_dir, ttl=1000, max_size=10000)
+        self.server.data = b'x' * 4000
+        cache.load_url('http://example.com/1')
+        # make entry 1 least recently used
+        data_files = [f for f in os.listdir(self.cache_dir) if f.endswith('.data')]
+        old = time.time() - 100
+        os.utime(os.path.join(self.cache_dir, data_files[0]), (old, old))
+        cache.load_url('http://example.com/2')
+        cache.load_url('http://example.com/3')
+        data_files = [f for f in os.listdir(self.cache_dir) if f.endswith('.data')]
+        self.assertEqual(2, len(data_files))
+        self.assertEqual(None, cache._read_meta('http://example.com/1'))
+
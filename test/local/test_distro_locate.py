@@ -0,0 +1,187 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import unittest
+
+from rosinstall import distro_locate
+
+
+class FakeRepository(object):
+
+    def __init__(self, name, package_names):
+        self.name = name
+        self.url = 'https://example.com/%s.git' % name
+        self.package_names = package_names
+
+    def get_release_tag(self, pkg_name):
+        return 'release/%s/1.0.0' % pkg_name
+
+
+class FakeReleaseFile(object):
+
+    def __init__(self, name, repositories):
+        self.name = name
+        self.repositories = dict([(r.name, r) for r in repositories])
+
+
+class DistroLocateIndexTest(unittest.TestCase):
+
+    def test_find_repo(self):
+        foo = FakeRepository('foo', ['foo', 'foo_msgs'])
+        bar = FakeRepository('bar', ['bar'])
+        release_file = FakeReleaseFile('testdistro', [foo, bar])
+        self.assertEqual(foo, distro_locate._find_repo(release_file, 'foo_msgs'))
+        self.assertEqual(bar, distro_locate._find_repo(release_file, 'bar'))
+        self.assertEqual(None, distro_locate._find_repo(release_file, 'baz'))
+        self.assertTrue(distro_locate._is_wet(release_file, 'foo'))
+        self.assertFalse(distro_locate._is_wet(release_file, 'baz'))
+        # a newly loaded release file for the same distro replaces the index
+        baz = FakeRepository('baz', ['baz'])
+        release_file2 = FakeReleaseFile('testdistro', [baz])
+        self.assertEqual(baz, distro_locate._find_repo(release_file2, 'baz'))
+        self.assertEqual(None, distro_locate._find_repo(release_file2, 'foo'))
+
+    def test_get_wet_info(self):
+        wet_distro = {'repositories': {
+            'foo': {'packages': {'foo_msgs': None}},
+            'bar': {'version': '1.0'}}}
+        self.assertEqual(('foo', wet_distro['repositories']['foo']),
+                         distro_locate.get_wet_info(wet_distro, 'foo_msgs'))
+        self.assertEqual(('bar', wet_distro['repositories']['bar']),
+                         distro_locate.get_wet_info(wet_distro, 'bar'))
+        self.assertEqual(None, distro_locate.get_wet_info(wet_distro, 'baz'))
+
+
+class FakeRospkgDistro(object):
+
+    def distro_uri(self, distro):
+        return distro
+
+    def load_distro(self, uri):
+        return self
+
+    def get_stacks(self, released=False):
+        return {}
+
+
+class ReleaseInfoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.original_get_index = distro_locate.distro_cache.get_index
+        self.original_get_distribution_file = distro_locate.distro_cache.get_distribution_file
+        self.original_rospkg_distro = distro_locate.rospkg_distro
+        self.original_build = distro_locate._build_release_index
+        self.loaded = []
+        self.built = []
+
+        def get_distribution_file(index, distro):
+            self.loaded.append(distro)
+            return FakeReleaseFile(distro, [FakeRepository('foo', ['foo', 'foo_msgs'])])
+
+        def build(release_file):
+            self.built.append(release_file.name)
+            return self.original_build(release_file)
+        distro_locate.distro_cache.get_index = lambda url: None
+        distro_locate.distro_cache.get_distribution_file = get_distribution_file
+        distro_locate.rospkg_distro = FakeRospkgDistro()
+        distro_locate._build_release_index = build
+        distro_locate._RELEASE_FILES.clear()
+
+    def tearDown(self):
+        distro_locate.distro_cache.get_index = self.original_get_index
+        distro_locate.distro_cache.get_distribution_file = self.original_get_distribution_file
+        distro_locate.rospkg_distro = self.original_rospkg_distro
+        distro_locate._build_release_index = self.original_build
+        distro_locate._RELEASE_FILES.clear()
+
+    def test_load_once(self):
+        for name in ['foo', 'foo_msgs', 'foo']:
+            self.assertEqual(
+                [{'git': {'local-name': name, 'uri': 'https://example.com/foo.git',
+                          'version': 'release/%s/1.0.0' % name}}],
+                distro_locate.get_release_info(name, 'testdistro'))
+        self.assertEqual(['testdistro'], self.loaded)
+        self.assertEqual(['testdistro'], self.built)
+        distro_locate.get_release_info('foo', 'otherdistro')
+        self.assertEqual(['testdistro', 'otherdistro'], self.loaded)
+        self.assertEqual(['testdistro', 'otherdistro'], self.built)
+
+
+class ManifestYamlCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.original_fetch = distro_locate.fetch
+        self.original_size = distro_locate.MANIFEST_CACHE_SIZE
+        self.urls = []
+
+        def fetch(url, timeout=None):
+            self.urls.append(url)
+            if '/missing/' in url:
+                raise IOError('not found')
+            return b'package_type: package\nurl: http://ros.org/wiki/foo\ndescription: foo\n'
+        distro_locate.fetch = fetch
+        distro_locate.clear_manifest_yaml_cache()
+
+    def tearDown(self):
+        distro_locate.fetch = self.original_fetch
+        distro_locate.MANIFEST_CACHE_SIZE = self.original_size
+        distro_locate.clear_manifest_yaml_cache()
+
+    def test_fetch_once(self):
+        self.assertEqual('package', distro_locate.get_doc_type('foo', 'groovy'))
+        self.assertEqual('http://ros.org/wiki/foo', distro_locate.get_doc_www('foo', 'groovy'))
+        self.assertEqual('foo', distro_locate.get_doc_description('foo', 'groovy'))
+        self.assertEqual(['http://ros.org/doc/groovy/api/foo/manifest.yaml'], self.urls)
+        distro_locate.get_doc_type('foo', 'hydro')
+        self.assertEqual(2, len(self.urls))
+        info = distro_locate.get_manifest_yaml_cache_info()
+        self.assertEqual(2, info['hits'])
+        self.assertEqual(2, info['misses'])
+        self.assertEqual(2, info['size'])
+
+    def test_errors_not_cached(self):
+        self.assertRaises(IOError, distro_locate.get_doc_type, 'missing', 'groovy')
+        self.assertRaises(IOError, distro_locate.get_doc_type, 'missing', 'groovy')
+        self.assertEqual(2, len(self.urls))
+        self.assertEqual(0, distro_locate.get_manifest_yaml_cache_info()['size'])
+
+    def test_lru(self):
+        distro_locate.MANIFEST_CACHE_SIZE = 2
+        distro_locate.get_manifest_yaml('a', 'groovy')
+        distro_locate.get_manifest_yaml('b', 'groovy')
+        distro_locate.get_manifest_yaml('a', 'groovy')
+        distro_locate.get_manifest_yaml('c', 'groovy')
+        # b was least recently used
+        distro_locate.get_manifest_yaml('a', 'groovy')
+        self.assertEqual(3, len(self.urls))
+        distro_locate.get_manifest_yaml('b', 'groovy')
+        self.assertEqual(4, len(self.urls))
@@ -0,0 +1,152 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+from rosinstall.git_mirror import MirrorCache, mirrored_git
+from rosinstall.rosws_cli import RoswsCLI
+from rosinstall.simple_checkout import checkout_rosinstall
+
+from test.scm_test_base import AbstractRosinstallCLITest, _create_git_repo, \
+    _create_yaml_file, _create_config_elt_dict
+
+
+class GitMirrorTest(AbstractRosinstallCLITest):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.mirror_dir = os.path.join(self.root_path, 'mirrors')
+        self.remote_path = os.path.join(self.root_path, 'remote')
+        _create_git_repo(self.remote_path)
+        self.uri = 'file://%s' % self.remote_path
+        self.old_env = dict(os.environ)
+        os.environ['ROSINSTALL_GIT_MIRROR_DIR'] = self.mirror_dir
+        os.environ.pop('GIT_CONFIG_PARAMETERS', None)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.old_env)
+        shutil.rmtree(self.root_path)
+
+    def _head(self, path):
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=path).decode('UTF-8').strip()
+
+    def _checkout(self, name):
+        path = os.path.join(self.root_path, name)
+        checkout_rosinstall([{'git': {'local-name': path, 'uri': self.uri}}])
+        return path
+
+    def test_checkout_through_mirror(self):
+        clone1 = self._checkout('clone1')
+        mirror_path = MirrorCache(self.mirror_dir).get_mirror_path(self.uri)
+        self.assertTrue(os.path.isdir(mirror_path))
+        self.assertEqual(self._head(self.remote_path), self._head(mirror_path))
+        self.assertEqual(self._head(self.remote_path), self._head(clone1))
+        origin = subprocess.check_output(['git', 'config', 'remote.origin.url'],
+                                         cwd=clone1).decode('UTF-8').strip()
+        self.assertEqual(self.uri, origin)
+        self.assertFalse('GIT_CONFIG_PARAMETERS' in os.environ)
+
+        # the mirror gets refreshed
+        subprocess.check_call(['git', 'commit', '-q', '--allow-empty', '-m', 'second'],
+                              cwd=self.remote_path)
+        clone2 = self._checkout('clone2')
+        self.assertEqual(self._head(self.remote_path), self._head(clone2))
+
+        # an outdated mirror is used when the remote is not available
+        head = self._head(self.remote_path)
+        shutil.move(self.remote_path, self.remote_path + '.moved')
+        clone3 = self._checkout('clone3')
+        self.assertEqual(head, self._head(clone3))
+
+    def test_prefix_of_failed_mirror(self):
+        # foo_msgs has no mirror, foo is mirrored and a prefix of it
+        msgs_path = self.remote_path + '_msgs'
+        _create_git_repo(msgs_path)
+        msgs_uri = self.uri + '_msgs'
+        original_update_mirror = MirrorCache.update_mirror
+
+        def failing_update_mirror(cache, uri):
+            if uri == msgs_uri:
+                raise subprocess.CalledProcessError(128, 'git clone')
+            return original_update_mirror(cache, uri)
+        MirrorCache.update_mirror = failing_update_mirror
+        try:
+            checkout_rosinstall([{'git': {'local-name': os.path.join(self.root_path, name),
+                                          'uri': uri}}
+                                 for name, uri in [('foo', self.uri),
+                                                   ('foo_msgs', msgs_uri)]])
+        finally:
+            MirrorCache.update_mirror = original_update_mirror
+        self.assertTrue(os.path.isdir(MirrorCache(self.mirror_dir).get_mirror_path(self.uri)))
+        self.assertEqual(self._head(msgs_path),
+                         self._head(os.path.join(self.root_path, 'foo_msgs')))
+
+    def test_update_selected(self):
+        other_path = os.path.join(self.root_path, 'other')
+        _create_git_repo(other_path)
+        other_uri = 'file://%s' % other_path
+        ws_path = os.path.join(self.root_path, 'ws')
+        os.makedirs(ws_path)
+        _create_yaml_file([_create_config_elt_dict('git', 'clone', self.uri),
+                           _create_config_elt_dict('git', 'other', other_uri)],
+                          os.path.join(ws_path, '.rosinstall'))
+        self.assertEqual(0, RoswsCLI().cmd_update(ws_path, ['clone']))
+        cache = MirrorCache(self.mirror_dir)
+        self.assertTrue(os.path.isdir(cache.get_mirror_path(self.uri)))
+        self.assertFalse(os.path.isdir(cache.get_mirror_path(other_uri)))
+
+    def test_disabled(self):
+        os.environ.pop('ROSINSTALL_GIT_MIRROR_DIR')
+        with mirrored_git([self.uri]):
+            self.assertFalse('GIT_CONFIG_PARAMETERS' in os.environ)
+        self._checkout('clone1')
+        self.assertFalse(os.path.exists(self.mirror_dir))
+
+    def test_evict(self):
+        other_path = os.path.join(self.root_path, 'other')
+        _create_git_repo(other_path)
+        other_uri = 'file://%s' % other_path
+        cache = MirrorCache(self.mirror_dir, max_size=0)
+        cache.update_mirrors([other_uri])
+        self.assertTrue(os.path.isdir(cache.get_mirror_path(other_uri)))
+        # over max_size, the least recently used mirror is removed
+        cache.update_mirrors([self.uri])
+        self.assertFalse(os.path.isdir(cache.get_mirror_path(other_uri)))
+        self.assertTrue(os.path.isdir(cache.get_mirror_path(self.uri)))
+        cache.max_size = 10 * 1024 * 1024
+        cache.update_mirrors([other_uri])
+        self.assertTrue(os.path.isdir(cache.get_mirror_path(other_uri)))
+        self.assertTrue(os.path.isdir(cache.get_mirror_path(self.uri)))
@@ -0,0 +1,103 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+from rosinstall.git_refs import get_git_dir, get_head_revision, get_remote_url, is_sha
+
+from test.scm_test_base import AbstractRosinstallCLITest, _create_git_repo
+
+
+class GitRefsTest(AbstractRosinstallCLITest):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.repo_path = os.path.join(self.root_path, 'repo')
+        _create_git_repo(self.repo_path)
+        subprocess.check_call(['git', 'commit', '-q', '--allow-empty', '-m', 'second'],
+                              cwd=self.repo_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def _rev_parse(self, path, rev='HEAD'):
+        return subprocess.check_output(['git', 'rev-parse', rev], cwd=path).decode('UTF-8').strip()
+
+    def test_head_loose_and_packed(self):
+        expected = self._rev_parse(self.repo_path)
+        self.assertEqual(expected, get_head_revision(self.repo_path))
+        subprocess.check_call(['git', 'pack-refs', '--all'], cwd=self.repo_path)
+        branch = subprocess.check_output(['git', 'symbolic-ref', 'HEAD'],
+                                         cwd=self.repo_path).decode('UTF-8').strip()
+        self.assertFalse(os.path.exists(os.path.join(self.repo_path, '.git', branch)))
+        self.assertEqual(expected, get_head_revision(self.repo_path))
+
+    def test_head_detached_and_symbolic(self):
+        first = self._rev_parse(self.repo_path, 'HEAD~1')
+        subprocess.check_call(['git', 'checkout', '-q', first], cwd=self.repo_path)
+        self.assertEqual(first, get_head_revision(self.repo_path))
+        subprocess.check_call(['git', 'checkout', '-q', '-b', 'other'], cwd=self.repo_path)
+        subprocess.check_call(['git', 'symbolic-ref', 'refs/heads/alias', 'refs/heads/other'],
+                              cwd=self.repo_path)
+        subprocess.check_call(['git', 'symbolic-ref', 'HEAD', 'refs/heads/alias'],
+                              cwd=self.repo_path)
+        self.assertEqual(first, get_head_revision(self.repo_path))
+
+    def test_worktree(self):
+        worktree_path = os.path.join(self.root_path, 'worktree')
+        subprocess.check_call(['git', 'worktree', 'add', '-q', '-b', 'wt', worktree_path, 'HEAD~1'],
+                              cwd=self.repo_path)
+        subprocess.check_call(['git', 'pack-refs', '--all'], cwd=self.repo_path)
+        self.assertTrue(os.path.isfile(os.path.join(worktree_path, '.git')))
+        self.assertEqual(self._rev_parse(worktree_path), get_head_revision(worktree_path))
+        self.assertEqual(self._rev_parse(self.repo_path), get_head_revision(self.repo_path))
+
+    def test_remote_url(self):
+        clone_path = os.path.join(self.root_path, 'clone')
+        subprocess.check_call(['git', 'clone', '-q', self.repo_path, clone_path])
+        self.assertEqual(self.repo_path, get_remote_url(clone_path))
+        self.assertEqual(None, get_remote_url(clone_path, 'upstream'))
+        self.assertEqual(None, get_remote_url(self.repo_path))
+        self.assertTrue(is_sha(self._rev_parse(clone_path)))
+        self.assertFalse(is_sha('master'))
+        self.assertFalse(is_sha(None))
+
+    def test_no_git(self):
+        self.assertEqual(None, get_git_dir(self.root_path))
+        self.assertEqual(None, get_head_revision(self.root_path))
+        empty_path = os.path.join(self.root_path, 'empty')
+        subprocess.check_call(['git', 'init', '-q', empty_path])
+        # unborn branch
+        self.assertEqual(None, get_head_revision(empty_path))
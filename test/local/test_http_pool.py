@@ -0,0 +1,177 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import threading
+import unittest
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from urllib.error import HTTPError
+    from urllib.parse import urlsplit
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from urllib2 import HTTPError
+    from urlparse import urlsplit
+
+import rosinstall.locate
+from rosinstall.http_pool import ConnectionPool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address))
+        # proxy requests carry the absolute uri
+        path = urlsplit(self.path).path
+        if path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/data')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if path != '/data':
+            self.send_error(404)
+            return
+        body = b'foo: bar\n'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+        self.pool = ConnectionPool(timeout=5)
+        self.old_env = dict(os.environ)
+        for name in ['http_proxy', 'https_proxy', 'no_proxy',
+                     'HTTP_PROXY', 'HTTPS_PROXY', 'NO_PROXY']:
+            os.environ.pop(name, None)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.old_env)
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/data'))
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/data'))
+        self.assertEqual(2, len(self.server.requests))
+        # same client port, so the connection was reused
+        self.assertEqual(self.server.requests[0][1], self.server.requests[1][1])
+
+    def test_redirect(self):
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/redirect'))
+        self.assertEqual(['/redirect', '/data'], [r[0] for r in self.server.requests])
+
+    def test_not_found(self):
+        try:
+            self.pool.get(self.url + '/missing')
+            self.fail('expected HTTPError')
+        except HTTPError as e:
+            self.assertEqual(404, e.code)
+        # connection still usable after error response
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/data'))
+
+    def test_proxy(self):
+        # the test server acts as proxy for an unresolvable host
+        os.environ['http_proxy'] = self.url
+        self.assertEqual(b'foo: bar\n', self.pool.get('http://rosinstall.invalid/redirect'))
+        self.assertEqual(['http://rosinstall.invalid/redirect',
+                          'http://rosinstall.invalid/data'],
+                         [r[0] for r in self.server.requests])
+
+    def test_no_proxy(self):
+        os.environ['http_proxy'] = 'http://127.0.0.1:1'
+        os.environ['no_proxy'] = '127.0.0.1'
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/data'))
+        self.assertEqual(['/data'], [r[0] for r in self.server.requests])
+
+    def test_stale_connection(self):
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/data'))
+        # server forgets the connection, pool retries on a new one
+        for connections in self.pool._idle.values():
+            for connection in connections:
+                connection.sock.close()
+        self.assertEqual(b'foo: bar\n', self.pool.get(self.url + '/data'))
+
+
+class RosdocManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.original_fetch = rosinstall.locate.fetch
+        self.urls = []
+
+    def tearDown(self):
+        rosinstall.locate.fetch = self.original_fetch
+
+    def _fake_fetch(self, existing):
+        def fetch(url, timeout=None):
+            self.urls.append(url)
+            for name in existing:
+                if url.endswith(name):
+                    return existing[name]
+            raise HTTPError(url, 404, 'Not Found', {}, None)
+        return fetch
+
+    def test_prefer_stack(self):
+        rosinstall.locate.fetch = self._fake_fetch({
+            'stack.yaml': b'name: stackdata\n',
+            'manifest.yaml': b'name: packagedata\n'})
+        data, type_, url = rosinstall.locate.get_rosdoc_manifest('foo', 'groovy')
+        self.assertEqual('stack', type_)
+        self.assertEqual({'name': 'stackdata'}, data)
+        self.assertEqual('http://ros.org/doc/groovy/api/foo/stack.yaml', url)
+
+    def test_package(self):
+        rosinstall.locate.fetch = self._fake_fetch({
+            'manifest.yaml': b'name: packagedata\npackage_type: stack\n'})
+        data, type_, url = rosinstall.locate.get_rosdoc_manifest('foo')
+        self.assertEqual('stack', type_)
+        self.assertEqual('packagedata', data['name'])
+        self.assertEqual(2, len(self.urls))
+
+    def test_missing(self):
+        rosinstall.locate.fetch = self._fake_fetch({})
+        self.assertRaises(IOError, rosinstall.locate.get_rosdoc_manifest, 'foo')
@@ -0,0 +1,112 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import tempfile
+
+from wstool.common import MultiProjectException
+from wstool.config import Config
+from wstool.config_yaml import PathSpec
+from wstool.multiproject_cmd import cmd_install_or_update
+
+from rosinstall.install_journal import InstallJournal, journaled_install
+
+from test.scm_test_base import AbstractRosinstallCLITest, _create_git_repo
+
+
+class InstallJournalTest(AbstractRosinstallCLITest):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.remote_path = os.path.join(self.root_path, 'remote')
+        _create_git_repo(self.remote_path)
+        self.ws_path = os.path.join(self.root_path, 'ws')
+        os.makedirs(self.ws_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def _get_config(self, uris):
+        return Config([PathSpec('clone%d' % i, 'git', uri) for i, uri in enumerate(uris)],
+                      self.ws_path,
+                      None)
+
+    def test_resume(self):
+        missing = os.path.join(self.root_path, 'missing')
+        config = self._get_config([self.remote_path, missing, self.remote_path])
+        try:
+            with journaled_install(config):
+                cmd_install_or_update(config)
+            self.fail('expected exception')
+        except MultiProjectException:
+            pass
+        journal = InstallJournal(self.ws_path)
+        # other entries continue after a failure
+        self.assertEqual(['clone0', 'clone2'], sorted(journal.entries.keys()))
+        # elements are restored after the context
+        self.assertFalse('install' in config.get_config_elements()[0].__dict__)
+
+        # a completed entry removed meanwhile is not checked out again
+        shutil.rmtree(os.path.join(self.ws_path, 'clone0'))
+        config = self._get_config([self.remote_path] * 3)
+        with journaled_install(config, resume=True):
+            cmd_install_or_update(config)
+        self.assertFalse(os.path.exists(os.path.join(self.ws_path, 'clone0')))
+        for name in ['clone1', 'clone2']:
+            self.assertTrue(os.path.isfile(os.path.join(self.ws_path, name, 'gitfixed.txt')))
+        self.assertEqual(['clone0', 'clone1', 'clone2'],
+                         sorted(InstallJournal(self.ws_path).entries.keys()))
+
+        # entries with a changed spec are installed again
+        config = Config([PathSpec('clone0', 'git', self.remote_path, 'HEAD')],
+                        self.ws_path,
+                        None)
+        with journaled_install(config, resume=True):
+            cmd_install_or_update(config)
+        self.assertTrue(os.path.isfile(os.path.join(self.ws_path, 'clone0', 'gitfixed.txt')))
+
+    def test_parallel(self):
+        config = self._get_config([self.remote_path] * 4)
+        with journaled_install(config):
+            cmd_install_or_update(config, num_threads=4)
+        self.assertEqual(['clone0', 'clone1', 'clone2', 'clone3'],
+                         sorted(InstallJournal(self.ws_path).entries.keys()))
+
+    def test_no_resume_resets(self):
+        config = self._get_config([self.remote_path])
+        with journaled_install(config):
+            cmd_install_or_update(config)
+        shutil.rmtree(os.path.join(self.ws_path, 'clone0'))
+        with journaled_install(config):
+            cmd_install_or_update(config)
+        self.assertTrue(os.path.isfile(os.path.join(self.ws_path, 'clone0', 'gitfixed.txt')))
@@ -0,0 +1,124 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import shutil
+import tempfile
+
+from wstool.config import Config
+from wstool.config_yaml import PathSpec
+
+from rosinstall.rosinstall_cmd import cmd_install_or_update
+from rosinstall.install_stats import InstallStats, estimate_duration, \
+    scheduled_install
+
+from test.io_wrapper import StringIO
+from test.scm_test_base import AbstractRosinstallCLITest, _create_git_repo
+
+
+class EstimateDurationTest(AbstractRosinstallCLITest):
+
+    def test_estimate(self):
+        self.assertEqual(0, estimate_duration([], 4))
+        self.assertEqual(10, estimate_duration([1, 2, 3, 4], 1))
+        self.assertEqual(10, estimate_duration([10, 1, 2, 3], 2))
+        self.assertEqual(10, estimate_duration([10, 1, 2, 3], 0))
+        # longest first is what the install does, not the optimum of 6
+        self.assertEqual(7, estimate_duration([3, 3, 2, 2, 2], 2))
+
+
+class ScheduledInstallTest(AbstractRosinstallCLITest):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.remote_path = os.path.join(self.root_path, 'remote')
+        _create_git_repo(self.remote_path)
+        self.ws_path = os.path.join(self.root_path, 'ws')
+        os.makedirs(self.ws_path)
+        self.names = ['clone%d' % i for i in range(4)]
+        self.config = Config([PathSpec(name, 'git', self.remote_path) for name in self.names],
+                             self.ws_path,
+                             None)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def _get_names(self):
+        return [element.get_local_name() for element in self.config.get_config_elements()]
+
+    def test_records_durations(self):
+        with scheduled_install(self.config, 2):
+            cmd_install_or_update(self.config, num_threads=2)
+        stats = InstallStats(self.ws_path)
+        for name in self.names:
+            self.assertTrue(stats.get_expected(name) > 0, name)
+        with open(stats.path, 'r') as fhand:
+            self.assertEqual(4, len(fhand.readlines()))
+        self.assertFalse('install' in self.config.get_config_elements()[0].__dict__)
+
+    def test_longest_first(self):
+        stats = InstallStats(self.ws_path)
+        stats.record('clone0', 1.0)
+        stats.record('clone1', 5.0)
+        stats.record('clone2', 2.0)
+        stats.record('clone2', 4.0)
+        stats = InstallStats(self.ws_path)
+        self.assertEqual(3.0, stats.get_expected('clone2'))
+        prepared = []
+        installed = []
+        for element in self.config.get_config_elements():
+            element.prepare_install = self._recording(element.prepare_install, prepared,
+                                                      element.get_local_name())
+            element.install = self._recording(element.install, installed,
+                                              element.get_local_name())
+        sys.stdout = output = StringIO()
+        try:
+            with scheduled_install(self.config, 2) as stats:
+                cmd_install_or_update(self.config, order_key=stats.get_order_key)
+        finally:
+            sys.stdout = sys.__stdout__
+        self.assertTrue('Expected duration: 5s, 1 of 4 entries without history' in
+                        output.getvalue(), output.getvalue())
+        # preparation, which may prompt, follows the config
+        self.assertEqual(self.names, prepared)
+        # entries without history first, then longest first
+        self.assertEqual(['clone3', 'clone1', 'clone2', 'clone0'], installed)
+        self.assertEqual(self.names, self._get_names())
+        with open(stats.path, 'r') as fhand:
+            self.assertEqual(4, len(fhand.readlines()))
+
+    def _recording(self, func, calls, name):
+        def _func(*args, **kwargs):
+            calls.append(name)
+            return func(*args, **kwargs)
+        return _func
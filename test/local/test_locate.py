@@ -154,6 +154,35 @@ class LocateTest(unittest.TestCase):
         self.assertEqual('package', locate.get_type(data))
 
 
+    def test_get_rosinstalls(self):
+        data = {'vcs': 'git',
+                'vcs_uri': 'https://example.com/repo.git',
+                'vcs_version': 'master'}
+
+        def fake_get_manifest(name, distro_name=None):
+            if name == 'missing':
+                raise IOError('not found')
+            if name == 'empty':
+                raise locate.InvalidData('no information')
+            return data, 'package', name
+        original = locate.get_manifest
+        try:
+            locate.get_manifest = fake_get_manifest
+            results = locate.get_manifests(['foo', 'missing', 'empty'], 'lunar')
+            self.assertEqual(['foo', 'missing', 'empty'], [r[0] for r in results])
+            self.assertEqual((data, 'package', None), results[0][1:])
+            self.assertTrue(isinstance(results[1][3], IOError))
+            self.assertTrue(isinstance(results[2][3], locate.InvalidData))
+            result, failures = locate.get_rosinstalls(['foo', 'missing', 'empty', 'bar'],
+                                                      'lunar', prefix='src')
+        finally:
+            locate.get_manifest = original
+        self.assertEqual(
+            '- git:\n    local-name: src/foo\n    uri: https://example.com/repo.git\n    version: master\n'
+            '- git:\n    local-name: src/bar\n    uri: https://example.com/repo.git\n    version: master\n',
+            result)
+        self.assertEqual(['missing', 'empty'], [name for name, _ in failures])
+
     def test_get_manifest_lunar(self):
         distro = 'lunar'
         # rviz
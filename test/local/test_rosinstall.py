@@ -31,6 +31,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import sys
 import copy
 import yaml
 import subprocess
@@ -38,9 +39,13 @@ import tempfile
 
 import rosinstall
 import rosinstall.helpers
+import rosinstall.rosinstall_cmd
 from rosinstall.rosinstall_cli import rosinstall_main
+from wstool import multiproject_cmd
 
-from test.scm_test_base import AbstractRosinstallBaseDirTest, AbstractFakeRosBasedTest, _create_yaml_file, _create_config_elt_dict
+from test.io_wrapper import StringIO
+from test.scm_test_base import AbstractRosinstallBaseDirTest, AbstractFakeRosBasedTest, _create_yaml_file, _create_config_elt_dict, \
+    _create_git_repo, _add_to_file
 
 
 class RosinstallCommandlineOverlays(AbstractFakeRosBasedTest):
@@ -265,3 +270,69 @@ class RosinstallLocalDistro(AbstractRosinstallBaseDirTest):
             cmd.extend([self.directory, distrodir, '--catkin'])
             self.assertTrue(rosinstall_main(cmd))
             self.assertTrue(os.path.exists(os.path.join(self.directory, 'CMakeLists.txt')))
+
+
+class RosinstallDiffStatusTest(AbstractRosinstallBaseDirTest):
+    """--diff, --status and snapshots of a workspace of git clones"""
+
+    def setUp(self):
+        AbstractRosinstallBaseDirTest.setUp(self)
+        remote_path = os.path.join(self.directory, 'remote')
+        _create_git_repo(remote_path)
+        self.ws_path = os.path.join(self.directory, 'ws')
+        os.makedirs(self.ws_path)
+        names = ['clone%d' % i for i in range(4)]
+        for name in names:
+            subprocess.check_call(['git', 'clone', '-q', remote_path, name], cwd=self.ws_path)
+        # clone2 stays unchanged
+        for name in ['clone0', 'clone1', 'clone3']:
+            _add_to_file(os.path.join(self.ws_path, name, 'gitfixed.txt'), name)
+        _create_yaml_file([_create_config_elt_dict('git', name, remote_path) for name in names],
+                          os.path.join(self.ws_path, '.rosinstall'))
+
+    def _run(self, args):
+        sys.stdout = output = StringIO()
+        try:
+            self.assertTrue(rosinstall_main(['rosinstall', self.ws_path] + args))
+        finally:
+            sys.stdout = sys.__stdout__
+        return output.getvalue()
+
+    def test_diff(self):
+        config = multiproject_cmd.get_config(self.ws_path, [], config_filename='.rosinstall')
+        expected = '\n'.join([entry['diff'] for entry in multiproject_cmd.cmd_diff(config)
+                              if entry['diff']]) + '\n'
+        self.assertEqual(expected, self._run(['--diff']))
+        output = self._run(['--diff', '-j', '3'])
+        self.assertEqual(expected, output)
+        positions = [output.index('+clone%d' % i) for i in [0, 1, 3]]
+        self.assertEqual(sorted(positions), positions)
+
+    def test_status(self):
+        config = multiproject_cmd.get_config(self.ws_path, [], config_filename='.rosinstall')
+        expected = ''.join([entry['status'] for entry in multiproject_cmd.cmd_status(config)
+                            if entry['status'] is not None])
+        self.assertEqual(expected, self._run(['--status', '-j', '3']))
+
+    def test_snapshot(self):
+        config = multiproject_cmd.get_config(self.ws_path, [], config_filename='.rosinstall')
+        expected = multiproject_cmd.cmd_snapshot(config)
+        self.assertEqual(expected, rosinstall.rosinstall_cmd.cmd_snapshot(config))
+        subprocess.check_call(['git', 'pack-refs', '--all'], cwd=os.path.join(self.ws_path, 'clone1'))
+        self.assertEqual(expected, rosinstall.rosinstall_cmd.cmd_snapshot(config, jobs=1))
+        self.assertEqual(expected[1:2], rosinstall.rosinstall_cmd.cmd_snapshot(config, localnames=['clone1']))
+
+    def test_outdated_localnames(self):
+        remote_path = os.path.join(self.directory, 'remote')
+        sha = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                      cwd=remote_path).decode('UTF-8').strip()
+        # clone0 is at its pinned revision, clone1 clones another uri,
+        # clone2 is not pinned, clone3 is pinned to another commit
+        _create_yaml_file([_create_config_elt_dict('git', 'clone0', remote_path, sha),
+                           _create_config_elt_dict('git', 'clone1', self.directory, sha),
+                           _create_config_elt_dict('git', 'clone2', remote_path),
+                           _create_config_elt_dict('git', 'clone3', remote_path, '0' * 40)],
+                          os.path.join(self.ws_path, '.rosinstall'))
+        config = multiproject_cmd.get_config(self.ws_path, [], config_filename='.rosinstall')
+        self.assertEqual(['clone1', 'clone2', 'clone3'],
+                         sorted(rosinstall.rosinstall_cmd.get_outdated_localnames(config)))
@@ -70,16 +70,82 @@ class FunctionsTest(unittest.TestCase):
             mock_os.path = mock_path
             mock_os.environ = {}
             mock_path.split = os.path.split
+            mock_path.join = os.path.join
+            mock_path.dirname = os.path.dirname
+            mock_path.isabs = os.path.isabs
             mock_path.normpath = os.path.normpath
             mock_path.isfile.return_value = True
+            mock_path.getmtime.return_value = 0
+            rosinstall.helpers._ROS_ROOTS.clear()
             rosinstall.helpers.subprocess = mock_subprocess
             rosinstall.helpers.os = mock_os
             result = rosinstall.helpers.get_ros_root_from_setupfile("fooroot/foodir/setup.sh")
             self.assertEqual('/somewhere/mock_ros_root', os.path.normpath(result))
+            self.assertEqual(1, mock_subprocess.Popen.call_count)
+            # cached while files are unchanged
+            result = rosinstall.helpers.get_ros_root_from_setupfile("fooroot/foodir/setup.sh")
+            self.assertEqual('/somewhere/mock_ros_root', os.path.normpath(result))
+            self.assertEqual(1, mock_subprocess.Popen.call_count)
         finally:
+            rosinstall.helpers._ROS_ROOTS.clear()
             rosinstall.helpers.subprocess = subprocess
             rosinstall.helpers.os = os
 
+    def test_ros_roots_from_setupfiles(self):
+        def make_setup(name, setup_sh, env_sh):
+            path = os.path.join(self.root_path, name)
+            os.makedirs(path)
+            with open(os.path.join(path, 'setup.sh'), 'w') as fhand:
+                fhand.write(setup_sh)
+            with open(os.path.join(path, 'env.sh'), 'w') as fhand:
+                fhand.write(env_sh)
+            os.chmod(os.path.join(path, 'env.sh'), 0o755)
+            return os.path.join(path, 'setup.sh')
+        static = make_setup('static', 'export ROS_ROOT=/opt/ros/static/share/ros\n',
+                            '#!/bin/sh\n. "`dirname $0`/setup.sh"\nexec "$@"\n')
+        dynamic_env = '#!/bin/sh\nexport ROS_ROOT="`dirname $0`/share/ros"\necho noise\nexec "$@"\n'
+        dynamic1 = make_setup('dynamic1', '', dynamic_env)
+        dynamic2 = make_setup('dynamic2', '', dynamic_env)
+        nosetup = os.path.join(self.root_path, 'foo', 'setup.bash')
+
+        calls = []
+
+        class CountingSubprocess(object):
+            PIPE = subprocess.PIPE
+
+            def Popen(self, *args, **kwargs):
+                calls.append(args)
+                return subprocess.Popen(*args, **kwargs)
+        original_ros_root = os.environ.get('ROS_ROOT')
+        os.environ['ROS_ROOT'] = '/should/not/be/used'
+        try:
+            rosinstall.helpers.subprocess = CountingSubprocess()
+            result = rosinstall.helpers.get_ros_roots_from_setupfiles(
+                [static, dynamic1, nosetup, dynamic2])
+            self.assertEqual({static: '/opt/ros/static/share/ros',
+                              dynamic1: os.path.join(self.root_path, 'dynamic1', 'share', 'ros'),
+                              dynamic2: os.path.join(self.root_path, 'dynamic2', 'share', 'ros'),
+                              nosetup: None},
+                             result)
+            self.assertEqual(1, len(calls))
+            self.assertEqual('/should/not/be/used', os.environ['ROS_ROOT'])
+            self.assertEqual(result[dynamic1],
+                             rosinstall.helpers.get_ros_root_from_setupfile(dynamic1))
+            self.assertEqual(1, len(calls))
+            # a deleted setup.sh is evaluated again instead of failing
+            os.remove(dynamic1)
+            self.assertEqual(result[dynamic1],
+                             rosinstall.helpers.get_ros_root_from_setupfile(dynamic1))
+            self.assertEqual(result[dynamic1],
+                             rosinstall.helpers.get_ros_root_from_setupfile(dynamic1))
+            self.assertEqual(3, len(calls))
+        finally:
+            if original_ros_root is None:
+                os.environ.pop('ROS_ROOT')
+            else:
+                os.environ['ROS_ROOT'] = original_ros_root
+            rosinstall.helpers.subprocess = subprocess
+
     def test_is_path_stack(self):
         self.assertTrue(rosinstall.helpers.is_path_stack(os.path.join("test", "example_dirs", "ros")))
         self.assertTrue(rosinstall.helpers.is_path_stack(os.path.join("test", "example_dirs", "ros_comm")))
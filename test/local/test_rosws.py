@@ -40,6 +40,7 @@ import wstool.multiproject_cmd
 
 from test.scm_test_base import AbstractFakeRosBasedTest
 from rosinstall.rosws_cli import RoswsCLI
+from rosinstall.helpers import move_to_trash
 
 
 class RosWsTest(AbstractFakeRosBasedTest):
@@ -84,6 +85,29 @@ class RosWsTest(AbstractFakeRosBasedTest):
         self.assertTrue(os.path.exists(workspace))
         self.assertTrue(os.path.exists(os.path.join(workspace, '.rosinstall')))
 
+    def test_update_relative_path(self):
+        workspace = os.path.join(self.test_root_path, 'ws1e')
+        cli = RoswsCLI()
+        self.assertEqual(0, cli.cmd_init([workspace, self.simple_rosinstall]))
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.test_root_path)
+            self.assertEqual(0, cli.cmd_update('ws1e', []))
+        finally:
+            os.chdir(cwd)
+
+    def test_update_help(self):
+        cli = RoswsCLI()
+        sys.stdout = output = StringIO()
+        try:
+            cli.cmd_update(self.test_root_path, ['--help'])
+            self.fail("expected exit")
+        except SystemExit:
+            pass
+        finally:
+            sys.stdout = sys.__stdout__
+        self.assertTrue('--resume' in output.getvalue(), output.getvalue())
+
     def test_merge(self):
         workspace = os.path.join(self.test_root_path, 'ws2')
         cli = RoswsCLI()
@@ -286,6 +310,37 @@ class RosWsTest(AbstractFakeRosBasedTest):
         output = output.getvalue()
         self.assertEqual('git,ros\ngit,gitrepo', output.strip())
 
+    def test_info_cached(self):
+        workspace = os.path.join(self.test_root_path, 'ws7b')
+        cli = RoswsCLI()
+        self.assertEqual(0, cli.cmd_init([workspace, self.simple_rosinstall]))
+        outputs = []
+        for argv in [[], [], ['--refresh']]:
+            sys.stdout = output = StringIO()
+            self.assertEqual(0, cli.cmd_info(workspace, argv))
+            outputs.append(output.getvalue())
+        sys.stdout = sys.__stdout__
+        self.assertTrue('gitrepo' in outputs[0], outputs[0])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+        self.assertTrue(os.path.isfile(os.path.join(workspace, '.rosinstall_state', 'status_cache.json')))
+
+    def test_info_unmanaged_trash(self):
+        workspace = os.path.join(self.test_root_path, 'ws7c')
+        cli = RoswsCLI()
+        self.assertEqual(0, cli.cmd_init([workspace, self.simple_rosinstall]))
+        subprocess.check_call(['git', 'clone', '-q', os.path.join(self.test_root_path, 'gitrepo'),
+                               'unmanaged'], cwd=workspace)
+        subprocess.check_call(['git', 'clone', '-q', os.path.join(self.test_root_path, 'gitrepo'),
+                               'deleted'], cwd=workspace)
+        self.assertTrue(move_to_trash(workspace, os.path.join(workspace, 'deleted')))
+        sys.stdout = output = StringIO()
+        self.assertEqual(0, cli.cmd_info(workspace, []))
+        output = output.getvalue()
+        sys.stdout = sys.__stdout__
+        self.assertTrue('unmanaged' in output, output)
+        self.assertFalse('deleted' in output, output)
+
     def test_set_add_scm_change_localname(self):
         workspace = os.path.join(self.test_root_path, 'ws8')
         cli = RoswsCLI()
@@ -0,0 +1,258 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import rosinstall.rosws_stacks_cli
+from rosinstall.helpers import get_workspace_state_path, move_to_trash, \
+    reap_trash
+from rosinstall.rosws_stacks_cli import get_dependent_stacks, RosWsStacksCLI, \
+    get_ros_distro_name, get_stack_element_in_config, StackElementIndex
+from wstool.config import Config
+from wstool.config_yaml import PathSpec
+
+
+def _write_stack_xml(path, depends):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    with open(os.path.join(path, 'stack.xml'), 'w') as fhand:
+        fhand.write('<stack><description>test</description>%s</stack>' %
+                    ''.join(['<depend stack="%s"/>' % dep for dep in depends]))
+
+
+class StackDependsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.env_path = os.path.join(self.root_path, 'env')
+        # a stack of the ROS environment
+        _write_stack_xml(os.path.join(self.env_path, 'ros'), [])
+        _write_stack_xml(os.path.join(self.root_path, 'ws', 'comm'), ['ros'])
+        _write_stack_xml(os.path.join(self.root_path, 'ws', 'tools'), ['comm'])
+        _write_stack_xml(os.path.join(self.root_path, 'ws', 'other'), ['tools', 'ros'])
+        self.config = Config([PathSpec('comm'),
+                              PathSpec('tools'),
+                              PathSpec('other'),
+                              PathSpec('nostack')],
+                             os.path.join(self.root_path, 'ws'),
+                             None)
+        self.old_env = dict(os.environ)
+        os.environ.pop('ROS_ROOT', None)
+        os.environ['ROS_PACKAGE_PATH'] = self.env_path
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.old_env)
+        shutil.rmtree(self.root_path)
+
+    def test_get_dependent_stacks(self):
+        self.assertEqual(['comm', 'other', 'tools'], get_dependent_stacks('ros', self.config))
+        self.assertEqual(['tools', 'other'], get_dependent_stacks('comm', self.config))
+        self.assertEqual([], get_dependent_stacks('other', self.config))
+        self.assertEqual([], get_dependent_stacks('unknown', self.config))
+
+    def test_get_dependent_stacks_mtime(self):
+        self.assertEqual([], get_dependent_stacks('other', self.config))
+        stack_xml = os.path.join(self.root_path, 'ws', 'comm', 'stack.xml')
+        self.assertEqual(['ros'], rosinstall.rosws_stacks_cli._STACK_DEPENDS[stack_xml][1])
+        _write_stack_xml(os.path.join(self.root_path, 'ws', 'comm'), ['ros', 'other'])
+        mtime = os.path.getmtime(stack_xml) + 10
+        os.utime(stack_xml, (mtime, mtime))
+        self.assertEqual(['comm', 'tools'], get_dependent_stacks('other', self.config))
+
+
+class StackElementIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        _write_stack_xml(os.path.join(self.root_path, 'comm'), [])
+        _write_stack_xml(os.path.join(self.root_path, 'tools'), [])
+        os.makedirs(os.path.join(self.root_path, 'nostack'))
+        self.config = Config([PathSpec('comm'), PathSpec('nostack')], self.root_path, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def test_index(self):
+        index = StackElementIndex(self.config)
+        for name in ['comm', 'nostack', 'tools', 'unknown']:
+            self.assertEqual(get_stack_element_in_config(self.config, name),
+                             index.get_stack_element(name))
+        self.assertEqual(None, index.get_stack_element('tools'))
+        index.add_path_spec(PathSpec('tools'), merge_strategy='MergeKeep')
+        self.assertEqual(os.path.join(self.root_path, 'tools'),
+                         index.get_stack_element('tools').get_path())
+        self.assertTrue(index.remove_element('comm'))
+        self.assertEqual(None, index.get_stack_element('comm'))
+        self.assertEqual(['nostack', 'tools'],
+                         [el.get_local_name() for el in self.config.get_config_elements()])
+
+    def test_index_replace(self):
+        index = StackElementIndex(self.config)
+        old = index.get_stack_element('comm')
+        index.add_path_spec(PathSpec('comm', 'git', 'file:///comm'), merge_strategy='MergeReplace')
+        self.assertEqual(get_stack_element_in_config(self.config, 'comm'),
+                         index.get_stack_element('comm'))
+        self.assertNotEqual(old, index.get_stack_element('comm'))
+
+
+class DistroNameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.old_env = dict(os.environ)
+        os.environ.pop('ROS_DISTRO', None)
+        rosinstall.rosws_stacks_cli._DISTRO_NAMES.clear()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.old_env)
+        rosinstall.rosws_stacks_cli._DISTRO_NAMES.clear()
+        shutil.rmtree(self.root_path)
+
+    def _make_config(self, name, stack_xml, cmakelists=None):
+        ros_path = os.path.join(self.root_path, name, 'ros')
+        os.makedirs(ros_path)
+        with open(os.path.join(ros_path, 'stack.xml'), 'w') as fhand:
+            fhand.write(stack_xml)
+        if cmakelists is not None:
+            with open(os.path.join(ros_path, 'CMakeLists.txt'), 'w') as fhand:
+                fhand.write(cmakelists)
+        return Config([PathSpec('ros')], os.path.join(self.root_path, name), None)
+
+    def test_distro_from_stack_xml(self):
+        config = self._make_config('ws', '<stack><version>1.8.11</version></stack>')
+        self.assertEqual('fuerte', get_ros_distro_name(config))
+
+    def test_distro_from_cmakelists(self):
+        config = self._make_config(
+            'ws', '<stack><description>ros</description></stack>',
+            'cmake_minimum_required(VERSION 2.4.6)\nrosbuild_make_distribution(1.6.5)\n')
+        self.assertEqual('electric', get_ros_distro_name(config))
+
+    def test_distro_from_env_memoized(self):
+        config = Config([PathSpec('foo')], self.root_path, None)
+        os.environ['ROS_DISTRO'] = 'hydro'
+        self.assertEqual('hydro', get_ros_distro_name(config))
+        os.environ['ROS_DISTRO'] = 'indigo'
+        self.assertEqual('hydro', get_ros_distro_name(config))
+
+
+class AddStackInstallTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ws_path = tempfile.mkdtemp()
+        with open(os.path.join(self.ws_path, '.rosinstall'), 'w') as fhand:
+            fhand.write('\n'.join(['- other: {local-name: entry%d}' % i
+                                   for i in range(20)]))
+        self.installs = []
+
+        def fake_cmd_add_stack(config, stackname, released=False, recurse=False):
+            for name in [stackname, stackname + '_dep']:
+                config.add_path_spec(PathSpec(name, 'git', 'file:///%s' % name),
+                                     merge_strategy="MergeKeep")
+            return True
+
+        def fake_cmd_install_or_update(config, **kwargs):
+            self.installs.append(kwargs)
+            return True
+        self.orig_add = rosinstall.rosws_stacks_cli.cmd_add_stack
+        self.orig_install = rosinstall.rosws_stacks_cli.cmd_install_or_update
+        rosinstall.rosws_stacks_cli.cmd_add_stack = fake_cmd_add_stack
+        rosinstall.rosws_stacks_cli.cmd_install_or_update = fake_cmd_install_or_update
+
+    def tearDown(self):
+        rosinstall.rosws_stacks_cli.cmd_add_stack = self.orig_add
+        rosinstall.rosws_stacks_cli.cmd_install_or_update = self.orig_install
+        shutil.rmtree(self.ws_path)
+
+    def test_add_stack_installs_added(self):
+        self.assertEqual(0, RosWsStacksCLI().cmd_add_stack(self.ws_path, ['-j', '3', 'foo']))
+        self.assertEqual(1, len(self.installs))
+        self.assertEqual(['foo', 'foo_dep'], self.installs[0]['localnames'])
+        self.assertEqual(3, self.installs[0]['num_threads'])
+        # already in config, nothing to install
+        self.assertEqual(0, RosWsStacksCLI().cmd_add_stack(self.ws_path, ['foo']))
+        self.assertEqual(1, len(self.installs))
+
+
+class DeleteStackBackgroundTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ws_path = tempfile.mkdtemp()
+        _write_stack_xml(os.path.join(self.ws_path, 'comm'), [])
+        _write_stack_xml(os.path.join(self.ws_path, 'tools'), ['comm'])
+        os.makedirs(os.path.join(self.ws_path, 'other'))
+        with open(os.path.join(self.ws_path, '.rosinstall'), 'w') as fhand:
+            fhand.write('- other: {local-name: comm}\n'
+                        '- other: {local-name: tools}\n'
+                        '- other: {local-name: other}\n')
+        self.old_env = dict(os.environ)
+        os.environ.pop('ROS_ROOT', None)
+        os.environ['ROS_PACKAGE_PATH'] = ''
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.old_env)
+        shutil.rmtree(self.ws_path)
+
+    def test_move_to_trash_and_reap(self):
+        os.symlink(os.path.join(self.ws_path, 'other'), os.path.join(self.ws_path, 'link'))
+        self.assertTrue(move_to_trash(self.ws_path, os.path.join(self.ws_path, 'comm')))
+        self.assertTrue(move_to_trash(self.ws_path, os.path.join(self.ws_path, 'link')))
+        self.assertFalse(os.path.exists(os.path.join(self.ws_path, 'comm')))
+        trash_path = get_workspace_state_path(self.ws_path, 'trash')
+        self.assertEqual(2, len(os.listdir(trash_path)))
+        reap_trash(self.ws_path)
+        self.assertEqual([], os.listdir(trash_path))
+        self.assertTrue(os.path.isdir(os.path.join(self.ws_path, 'other')))
+
+    def test_delete_stack_background(self):
+        self.assertEqual(0, RosWsStacksCLI().cmd_delete_stack(
+            self.ws_path, ['-d', '--background', 'comm']))
+        self.assertFalse(os.path.exists(os.path.join(self.ws_path, 'comm')))
+        self.assertFalse(os.path.exists(os.path.join(self.ws_path, 'tools')))
+        with open(os.path.join(self.ws_path, '.rosinstall')) as fhand:
+            content = fhand.read()
+        self.assertFalse('comm' in content, content)
+        self.assertFalse('tools' in content, content)
+        self.assertTrue('other' in content, content)
+        trash_path = get_workspace_state_path(self.ws_path, 'trash')
+        for _ in range(100):
+            if not os.listdir(trash_path):
+                break
+            time.sleep(0.1)
+        self.assertEqual([], os.listdir(trash_path))
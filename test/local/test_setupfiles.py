@@ -33,6 +33,8 @@
 import os
 import subprocess
 
+import rosinstall.helpers
+import rosinstall.rosinstall_cmd
 import rosinstall.setupfiles
 import wstool.helpers
 from wstool.config import Config
@@ -90,6 +92,55 @@ class GenerateTest(AbstractFakeRosBasedTest):
         self.assertTrue(os.path.isfile(os.path.join(self.test_root_path, 'setup.bash')))
         self.assertTrue(os.path.isfile(os.path.join(self.test_root_path, 'setup.zsh')))
 
+    def test_gen_setup_unchanged(self):
+        test_folder = os.path.join(self.test_root_path, 'unchangedtest')
+        os.makedirs(test_folder)
+        config = Config([PathSpec(self.ros_path),
+                         PathSpec("bar")],
+                        test_folder,
+                        None)
+        written = rosinstall.setupfiles.generate_setup(config)
+        setup_paths = [os.path.join(test_folder, 'setup.%s' % shell)
+                       for shell in ['sh', 'bash', 'zsh']]
+        self.assertEqual(setup_paths, written[:3])
+        os.utime(setup_paths[0], (0, 0))
+        self.assertEqual([], rosinstall.setupfiles.generate_setup(config))
+        self.assertEqual(0, os.path.getmtime(setup_paths[0]))
+        with open(setup_paths[1], 'w') as fhand:
+            fhand.write('modified')
+        self.assertEqual([setup_paths[1]], rosinstall.setupfiles.generate_setup(config))
+        with open(setup_paths[1], 'r') as fhand:
+            self.assertTrue(fhand.read().startswith('#!/usr/bin/env bash'))
+
+    def test_persist_config_unchanged(self):
+        test_folder = os.path.join(self.test_root_path, 'persisttest')
+        os.makedirs(test_folder)
+        config = Config([PathSpec(self.ros_path),
+                         PathSpec("bar")],
+                        test_folder,
+                        None)
+        config_path = os.path.join(test_folder, ROSINSTALL_FILENAME)
+        self.assertTrue(rosinstall.rosinstall_cmd.cmd_persist_config(config, backup=True))
+        self.assertFalse(os.path.exists(config_path + '.bak'))
+        inode = os.stat(config_path).st_ino
+        os.utime(config_path, (0, 0))
+        self.assertFalse(rosinstall.rosinstall_cmd.cmd_persist_config(config, backup=True))
+        self.assertEqual(0, os.path.getmtime(config_path))
+        self.assertFalse(os.path.exists(config_path + '.bak'))
+        with open(config_path, 'r') as fhand:
+            old_content = fhand.read()
+        self.assertTrue('local-name: bar' in old_content, old_content)
+
+        config.add_path_spec(PathSpec("baz"))
+        self.assertTrue(rosinstall.rosinstall_cmd.cmd_persist_config(config, backup=True))
+        # the previous file is kept as hardlink, the new one replaces it
+        self.assertEqual(inode, os.stat(config_path + '.bak').st_ino)
+        self.assertNotEqual(inode, os.stat(config_path).st_ino)
+        with open(config_path + '.bak', 'r') as fhand:
+            self.assertEqual(old_content, fhand.read())
+        with open(config_path, 'r') as fhand:
+            self.assertTrue('local-name: baz' in fhand.read())
+
     def test_gen_setupsh(self):
         config = Config([PathSpec(self.ros_path),
                          PathSpec(os.path.join("test", "example_dirs", "ros_comm")),
@@ -229,6 +280,57 @@ class GenerateTest(AbstractFakeRosBasedTest):
         expected = os.path.join(test_folder4, "ws4sub")
         self.assertEqual(expected, ppath)
 
+    def test_source_setup_sh_cache(self):
+        test_folder = os.path.join(self.test_root_path, 'cachetest')
+        os.makedirs(test_folder)
+        othersetupfile = os.path.join(test_folder, 'othersetup.sh')
+        with open(othersetupfile, 'w') as fhand:
+            fhand.write('export ROS_PACKAGE_PATH=/opt/ros/distro:%s' % self.ros_path)
+        config = Config([PathSpec(self.ros_path),
+                         PathSpec('sub'),
+                         PathSpec(othersetupfile,
+                                  scmtype=None,
+                                  tags=['setup-file'])],
+                        install_path=test_folder,
+                        config_filename=ROSINSTALL_FILENAME)
+        cmd_generate_ros_files(config, test_folder, no_ros_allowed=True)
+        rosinstall.rosinstall_cmd.cmd_persist_config(
+            config, os.path.join(test_folder, ROSINSTALL_FILENAME))
+        cache_path = rosinstall.helpers.get_workspace_state_path(
+            test_folder, rosinstall.setupfiles.SETUP_CACHE_FILENAME)
+        self.assertTrue(os.path.isfile(cache_path))
+        with open(cache_path, 'r') as fhand:
+            cache = fhand.read()
+        self.assertTrue("_ROS_PACKAGE_PATH_ROSINSTALL_NEW='%s:%s'" %
+                        (os.path.join(test_folder, 'sub'), self.ros_path) in cache, cache)
+        self.assertTrue("_SETUPFILES_ROSINSTALL_NEW='%s'" % othersetupfile in cache, cache)
+
+        cmd = ". %s && echo $ROS_PACKAGE_PATH && echo $ROS_ROOT" % os.path.join(test_folder, "setup.sh")
+        # with a broken python in the PATH, setup.sh has to use the cache
+        env = dict(self.new_environ)
+        env.pop('ROS_ROOT', None)
+        bin_path = os.path.join(test_folder, 'bin')
+        os.makedirs(bin_path)
+        with open(os.path.join(bin_path, 'python'), 'w') as fhand:
+            fhand.write('#!/bin/sh\necho ERROR\n')
+        os.chmod(os.path.join(bin_path, 'python'), 0o755)
+        env['PATH'] = bin_path + ':' + os.environ['PATH']
+        po = subprocess.Popen(cmd, shell=True, cwd=test_folder, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, err = po.communicate()
+        output = output.decode('UTF-8').splitlines()
+        self.assertEqual(':'.join([os.path.join(test_folder, 'sub'),
+                                   self.ros_path,
+                                   '/opt/ros/distro']), output[0])
+        self.assertEqual(self.ros_path, output[1])
+
+        # a newer .rosinstall is parsed with python again
+        os.utime(cache_path, (0, 0))
+        po = subprocess.Popen(cmd, shell=True, cwd=test_folder, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, err = po.communicate()
+        self.assertTrue('Could not parse .rosinstall file' in err.decode('UTF-8'), err)
+
     def test_gen_setup_bash(self):
         config = Config([PathSpec(self.ros_path),
                          PathSpec(os.path.join("test", "example_dirs", "ros_comm")),
@@ -0,0 +1,157 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+
+from wstool.common import MultiProjectException
+
+from rosinstall.parallel import iter_parallel
+from rosinstall.simple_checkout import checkout_rosinstall
+
+from test.scm_test_base import AbstractRosinstallCLITest, _create_git_repo
+
+
+class IterParallelTest(unittest.TestCase):
+
+    def test_serial(self):
+        results = list(iter_parallel(lambda x: x * 2, [1, 2, 3]))
+        self.assertEqual([(0, 1, 2, None), (1, 2, 4, None), (2, 3, 6, None)],
+                         results)
+
+    def test_errors_do_not_stop_others(self):
+        def _work(item):
+            if item == 2:
+                raise ValueError(item)
+            return item
+        results = list(iter_parallel(_work, [1, 2, 3, 4], jobs=3))
+        self.assertEqual(4, len(results))
+        errors = [r for r in results if r[3] is not None]
+        self.assertEqual(1, len(errors))
+        self.assertEqual(2, errors[0][1])
+
+    def test_unbounded(self):
+        started = []
+        all_started = threading.Event()
+
+        def _work(item):
+            started.append(item)
+            if len(started) == 5:
+                all_started.set()
+            # only returns True if all items run at the same time
+            return all_started.wait(5)
+        results = list(iter_parallel(_work, range(5), jobs=-1))
+        self.assertEqual([True] * 5, [r[2] for r in results])
+
+    def test_ordered(self):
+        def _work(item):
+            # later items finish first
+            time.sleep(0.01 * (5 - item))
+            return item
+        results = list(iter_parallel(_work, range(5), jobs=5, ordered=True))
+        self.assertEqual(list(range(5)), [r[2] for r in results])
+        results = list(iter_parallel(_work, range(5), jobs=5))
+        self.assertEqual(set(range(5)), set([r[2] for r in results]))
+
+
+class CheckoutRosinstallTest(AbstractRosinstallCLITest):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.remote_path = os.path.join(self.root_path, 'remote')
+        self.local_path = os.path.join(self.root_path, 'ws')
+        os.makedirs(self.local_path)
+        _create_git_repo(self.remote_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def test_checkout_parallel(self):
+        data = [{'git': {'local-name': os.path.join(self.local_path, 'repo%s' % i),
+                         'uri': self.remote_path}} for i in range(4)]
+        checkout_rosinstall(data, jobs=3)
+        for i in range(4):
+            self.assertTrue(os.path.isfile(os.path.join(self.local_path,
+                                                        'repo%s' % i,
+                                                        'gitfixed.txt')))
+
+    def test_checkout_failures_aggregated(self):
+        data = [{'git': {'local-name': os.path.join(self.local_path, 'bad'),
+                         'uri': os.path.join(self.root_path, 'missing')}},
+                {'git': {'local-name': os.path.join(self.local_path, 'good'),
+                         'uri': self.remote_path}}]
+        try:
+            checkout_rosinstall(data, jobs=2)
+            self.fail('expected exception')
+        except MultiProjectException as mpe:
+            self.assertTrue('bad' in str(mpe), mpe)
+        self.assertTrue(os.path.isfile(os.path.join(self.local_path,
+                                                    'good',
+                                                    'gitfixed.txt')))
+
+    def test_checkout_share_clones(self):
+        subprocess.check_call(['git', 'tag', 'release/foo/1.0'], cwd=self.remote_path)
+        subprocess.check_call(['touch', 'newer.txt'], cwd=self.remote_path)
+        subprocess.check_call(['git', 'add', 'newer.txt'], cwd=self.remote_path)
+        subprocess.check_call(['git', 'commit', '-m', 'newer'], cwd=self.remote_path)
+        subprocess.check_call(['git', 'tag', 'release/bar/1.1'], cwd=self.remote_path)
+        data = [{'git': {'local-name': os.path.join(self.local_path, name),
+                         'uri': self.remote_path,
+                         'version': version}}
+                for name, version in [('foo', 'release/foo/1.0'),
+                                      ('bar', 'release/bar/1.1'),
+                                      ('baz', 'master')]]
+        checkout_rosinstall(data, jobs=2, share_clones=True)
+        # first entry is a clone, the others are worktrees of it
+        self.assertTrue(os.path.isdir(os.path.join(self.local_path, 'foo', '.git')))
+        for name in ['bar', 'baz']:
+            self.assertTrue(os.path.isfile(os.path.join(self.local_path, name, '.git')))
+            self.assertTrue(os.path.isfile(os.path.join(self.local_path, name, 'newer.txt')))
+        self.assertFalse(os.path.exists(os.path.join(self.local_path, 'foo', 'newer.txt')))
+
+    def test_checkout_share_clones_bad_version(self):
+        data = [{'git': {'local-name': os.path.join(self.local_path, 'foo'),
+                         'uri': self.remote_path}},
+                {'git': {'local-name': os.path.join(self.local_path, 'bar'),
+                         'uri': self.remote_path,
+                         'version': 'nosuchtag'}}]
+        try:
+            checkout_rosinstall(data, share_clones=True)
+            self.fail('expected exception')
+        except MultiProjectException as mpe:
+            self.assertTrue('bar' in str(mpe), mpe)
+        self.assertTrue(os.path.isfile(os.path.join(self.local_path, 'foo', 'gitfixed.txt')))
@@ -0,0 +1,127 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2009, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Willow Garage, Inc. nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+import rosinstall.status_cache
+from rosinstall.status_cache import cached_cmd_info, get_scm_fingerprint
+from wstool.config import Config
+from wstool.config_yaml import PathSpec
+
+from test.scm_test_base import AbstractRosinstallCLITest, _create_git_repo, \
+    _add_to_file
+
+
+class StatusCacheTest(AbstractRosinstallCLITest):
+
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.remote_path = os.path.join(self.root_path, 'remote')
+        _create_git_repo(self.remote_path)
+        self.ws_path = os.path.join(self.root_path, 'ws')
+        os.makedirs(self.ws_path)
+        for name in ['clone1', 'clone2']:
+            subprocess.check_call(['git', 'clone', '-q', self.remote_path, name],
+                                  cwd=self.ws_path)
+        self.config = Config([PathSpec('clone1', 'git', self.remote_path),
+                              PathSpec('clone2', 'git', self.remote_path),
+                              PathSpec('other')],
+                             self.ws_path,
+                             None)
+        self.original_cmd_info = rosinstall.status_cache.cmd_info
+        self.queried = []
+
+        def counting_cmd_info(config, localnames=None, untracked=False, fetch=False):
+            self.queried.append(localnames)
+            return self.original_cmd_info(config, localnames, untracked, fetch)
+        rosinstall.status_cache.cmd_info = counting_cmd_info
+
+    def tearDown(self):
+        rosinstall.status_cache.cmd_info = self.original_cmd_info
+        shutil.rmtree(self.root_path)
+
+    def test_fingerprint(self):
+        clone = os.path.join(self.ws_path, 'clone1')
+        fingerprint = get_scm_fingerprint(clone, 'git')
+        self.assertTrue('HEAD' in [f[0] for f in fingerprint])
+        self.assertTrue('refs/heads/master' in [f[0] for f in fingerprint] or
+                        'refs/heads/main' in [f[0] for f in fingerprint], fingerprint)
+        self.assertEqual(None, get_scm_fingerprint(clone, 'hg'))
+        self.assertEqual(None, get_scm_fingerprint(os.path.join(self.ws_path, 'other'), 'git'))
+
+    def test_modified_working_tree(self):
+        cached_cmd_info(self.config)
+        self.queried = []
+        # an edit not added to the index leaves the fingerprint unchanged
+        clone1 = os.path.join(self.ws_path, 'clone1')
+        fingerprint = get_scm_fingerprint(clone1, 'git')
+        _add_to_file(os.path.join(clone1, 'gitfixed.txt'), 'foo')
+        self.assertEqual(fingerprint, get_scm_fingerprint(clone1, 'git'))
+        outputs = cached_cmd_info(self.config)
+        self.assertEqual([], self.queried)
+        self.assertEqual([True, ''], [o['modified'] for o in outputs[:2]])
+        # same output as without the cache
+        self.assertEqual([o['modified'] for o in outputs],
+                         [o['modified'] for o in self.original_cmd_info(self.config)])
+
+    def test_cached_info(self):
+        outputs = cached_cmd_info(self.config)
+        self.assertEqual(['clone1', 'clone2', 'other'], [o['localname'] for o in outputs])
+        self.assertEqual([['clone1', 'clone2', 'other']], self.queried)
+        self.queried = []
+
+        outputs2 = cached_cmd_info(self.config)
+        self.assertEqual([], self.queried)
+        for output, output2 in zip(outputs, outputs2):
+            self.assertEqual(output['actualversion'], output2['actualversion'])
+            self.assertEqual(output['modified'], output2['modified'])
+            self.assertEqual(output['entry'].get_local_name(), output2['entry'].get_local_name())
+
+        # a commit changes the fingerprint of one entry only
+        clone1 = os.path.join(self.ws_path, 'clone1')
+        _add_to_file(os.path.join(clone1, 'gitfixed.txt'), 'foo')
+        subprocess.check_call(['git', 'commit', '-q', '-a', '-m', 'change'], cwd=clone1)
+        outputs3 = cached_cmd_info(self.config)
+        self.assertEqual([['clone1']], self.queried)
+        self.assertNotEqual(outputs[0]['actualversion'], outputs3[0]['actualversion'])
+        self.queried = []
+
+        cached_cmd_info(self.config, localnames=['clone2'])
+        self.assertEqual([], self.queried)
+        cached_cmd_info(self.config, localnames=['clone2'], refresh=True)
+        self.assertEqual([['clone2']], self.queried)
+        self.queried = []
+        cached_cmd_info(self.config, fetch=True)
+        self.assertEqual([None], self.queried)